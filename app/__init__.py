@@ -1,14 +1,16 @@
 from flask import Flask, redirect, url_for
 from flask_socketio import SocketIO
 from flask_login import LoginManager
-from flask_session import Session
 from flask_caching import Cache
 from datetime import timedelta
 import os
 from app.utils.logging_utils import setup_logger
+from app.utils.session_utils import init_sessions, SESSION_BACKEND
+from app.utils.async_utils import ASYNC_MODE
+from app.utils.cluster import leader, cache_config, socketio_options, WORKERS, MESSAGE_QUEUE
 
-# Global SocketIO
-socketio = SocketIO(async_mode='threading')
+# Global SocketIO; the async mode is chosen with VPSCOPE_ASYNC_MODE
+socketio = SocketIO(async_mode=ASYNC_MODE)
 
 # Login manager
 login_manager = LoginManager()
@@ -22,35 +24,61 @@ def create_app():
     app.config['LOGIN_VIEW'] = 'index.login'  # Important!
     app.config['LOGIN_MESSAGE'] = "Please log in to access this page."
     app.config['LOGIN_MESSAGE_CATEGORY'] = 'info'
-    app.config['SESSION_TYPE'] = 'filesystem'
     app.config['SESSION_PERMANENT'] = True
     app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=31)
 
-    # Initialize Session
-    Session(app)
+    # Sessions: signed cookies by default, see VPSCOPE_SESSION_BACKEND
+    init_sessions(app, SESSION_BACKEND)
 
     # Initialize LoginManager
     login_manager.init_app(app)
 
     # Initialize Cache
     global cache
-    cache = Cache(app, config={'CACHE_TYPE': 'simple'})
+    cache = Cache(app, config=cache_config())
 
     # Register blueprints
     from app.routes.index import index_bp
     from app.routes.system import system_bp
     from app.routes.files import files_bp
     from app.routes.terminal import terminal_bp
+    from app.routes.agent import agent_bp
+    from app.routes.fleet import fleet_bp
 
     app.register_blueprint(index_bp)
     app.register_blueprint(system_bp, url_prefix='/system')
     app.register_blueprint(files_bp, url_prefix='/files')
     app.register_blueprint(terminal_bp, url_prefix='/terminal')
+    app.register_blueprint(agent_bp, url_prefix='/agent')
+    app.register_blueprint(fleet_bp, url_prefix='/fleet')
 
     @app.errorhandler(401)
     def unauthorized(e):
         return redirect(url_for('index.login'))
 
+    # In a multi-worker cluster only the elected worker collects; the others follow its samples
+    leader.start()
+
+    # Start background metrics collection and feed the history store
+    from app.utils.metrics_sampler import sampler
+    from app.utils.metrics_history import history
+    history.load()
+    sampler.add_listener(history.record)
+    sampler.start()
+
+    # Poll remote agents when running as a fleet hub
+    from app.utils.fleet import hub
+    app.config['FLEET_ENABLED'] = hub.enabled
+    hub.start()
+
+    # Index file names (and optionally contents) under the file manager root
+    from app.utils.search_index import search_index
+    search_index.start(os.getcwd())
+
+    # Remove chunked uploads abandoned before this start
+    from app.utils.upload_utils import uploads
+    uploads.expire()
+
     return app
 
 def run_server(host='0.0.0.0', port=8000):
@@ -60,14 +88,38 @@ def run_server(host='0.0.0.0', port=8000):
     logger = setup_logger()
 
     app = create_app()
-    socketio.init_app(app)
+    socketio.init_app(app, **socketio_options())
 
-    logger.info(f"Starting VPScope server on {host}:{port}")
+    # Only the scheme of the queue URL, it may carry a password
+    cluster = f", worker of {WORKERS} via {MESSAGE_QUEUE.split(':', 1)[0]} message queue" if MESSAGE_QUEUE else ""
+    logger.info(f"Starting VPScope server on {host}:{port} ({ASYNC_MODE} mode{cluster})")
     try:
-        socketio.run(app, host=host, port=port, use_reloader=False)
+        # threading runs the Werkzeug server (also without a TTY: Docker, systemd);
+        # eventlet/gevent run their own WSGI servers with a green thread per connection
+        socketio.run(app, host=host, port=port, use_reloader=False, allow_unsafe_werkzeug=True)
     except KeyboardInterrupt:
         logger.info("Shutting down VPScope immediately...")
         sys.exit(0)
     except Exception as e:
         logger.error(f"Server crashed: {e}")
         sys.exit(1)
+    finally:
+        shutdown()
+
+def shutdown():
+    """Stops the background workers and saves their state"""
+    from app.utils.metrics_sampler import sampler
+    from app.utils.metrics_history import history
+    from app.utils.fleet import hub
+    from app.utils.search_index import search_index
+    from app.utils.thumbnail_utils import thumbnails
+    from app.utils.terminal_utils import terminals
+    from app.utils.session_utils import memory_sessions
+    hub.stop()
+    sampler.stop()
+    history.save()
+    search_index.stop()
+    thumbnails.shutdown()
+    terminals.shutdown()
+    memory_sessions.snapshot()
+    leader.stop()
@@ -0,0 +1,23 @@
+from flask import Blueprint, jsonify, request, abort
+import hmac
+from app.utils.system_utils import get_summary_metrics
+from app.utils.fleet import AGENT_TOKEN, summarize
+
+agent_bp = Blueprint('agent', __name__)
+
+def check_token():
+    """Agents are called by the hub with a shared bearer token, not a login session"""
+    if not AGENT_TOKEN:
+        abort(404)  # Agent mode disabled
+    auth = request.headers.get('Authorization', '')
+    # As bytes: compare_digest raises TypeError for str with non-ASCII characters
+    if not auth.startswith('Bearer ') or not hmac.compare_digest(auth[7:].encode(), AGENT_TOKEN.encode()):
+        abort(401)
+
+@agent_bp.route('/snapshot')
+def snapshot():
+    check_token()
+    metrics_data = get_summary_metrics()
+    if request.args.get('summary'):
+        metrics_data = summarize(metrics_data)
+    return jsonify(metrics_data)
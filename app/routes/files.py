@@ -1,12 +1,34 @@
-from flask import Blueprint, jsonify, request, send_from_directory, send_file, render_template
+from flask import Blueprint, jsonify, request, send_file, render_template, Response
 from flask_login import login_required, current_user
-from app.utils.file_utils import list_dir, save_upload, delete_file, make_dir
+from app.utils.file_utils import (list_dir, iter_dir, save_upload, delete_file, make_dir, file_version,
+                                  write_text, apply_patch, content_hash, VersionConflict)
+from app.utils.dir_cache import dir_cache
+from app.utils.upload_utils import uploads, UploadError
+from app.utils.range_utils import send_ranged
+from app.utils.archive_utils import stream_archive, FORMATS
+from app.utils.text_reader import read_window, EDITOR_MAX_BYTES
+from app.utils.tail_utils import tails, tail_room
+from app.utils.search_index import search_index, SEARCH_ENABLED
+from app.utils.du_scanner import du_scanner
+from app.utils.job_queue import jobs
+from app.utils.thumbnail_utils import thumbnails
+from app.utils.async_utils import run_blocking
+from app.utils.session_utils import read_only_session
 from app import socketio  # Import socketio from __init__.py
+from flask_socketio import join_room, leave_room, emit
 import os
+import re
+import json
+import time
+import itertools
+import threading
 from urllib.parse import unquote
 
 files_bp = Blueprint('files', __name__)
 
+# Room of all authenticated file manager clients
+FILE_UPDATES_ROOM = 'file_updates'
+
 def get_drives():
     """Returns list of available drives in the system"""
     drives = []
@@ -27,20 +49,140 @@ def normalize_path(path):
             return f"{path}\\"
     return os.path.normpath(path)
 
+# Directories we reported ourselves recently, so the watcher doesn't report them twice
+_recent_emits = {}
+_RECENT_EMIT_WINDOW = 1.0  # seconds
+
 def emit_file_change_event(path):
     """Function to send file change event via WebSocket"""
     # Emit to user's room for security
     room = f"user_{current_user.id}" if current_user.is_authenticated else None
+    _emit_file_change(path, room)
+
+def _emit_file_change(path, room):
+    full_path = os.path.abspath(path)
+    now = time.time()
+    _recent_emits[full_path] = _recent_emits[os.path.dirname(full_path)] = now
+    # Don't serve a stale listing before the watcher notices our own change
+    dir_cache.invalidate(full_path)
+    dir_cache.invalidate(os.path.dirname(full_path))
     if room:
         socketio.emit('file_change', {'path': path}, room=room, namespace='/file_updates')
     else:
         socketio.emit('file_change', {'path': path}, namespace='/file_updates')
 
+_pending_external = set()
+_pending_lock = threading.Lock()
+_EXTERNAL_DELAY = 0.3  # seconds; coalesces bursts and lets our own emits land first
+
+def emit_external_change(path):
+    """Pushes changes made by other processes in directories clients have listed"""
+    with _pending_lock:
+        if path in _pending_external:
+            return
+        _pending_external.add(path)
+    timer = threading.Timer(_EXTERNAL_DELAY, _flush_external_change, args=(path,))
+    timer.daemon = True
+    timer.start()
+
+def _flush_external_change(path):
+    with _pending_lock:
+        _pending_external.discard(path)
+    now = time.time()
+    for recent_path, emitted_at in list(_recent_emits.items()):
+        if now - emitted_at > _RECENT_EMIT_WINDOW:
+            _recent_emits.pop(recent_path, None)
+    if path in _recent_emits:
+        return  # We already reported this change ourselves
+    if socketio.server is not None:
+        # Every worker of a cluster watches the directories its own clients listed
+        socketio.emit('file_change', {'path': path, 'external': True}, room=FILE_UPDATES_ROOM,
+                      namespace='/file_updates', ignore_queue=True)
+
+dir_cache.add_listener(emit_external_change)
+
+@socketio.on('connect', namespace='/file_updates')
+def file_updates_connect():
+    if not current_user.is_authenticated:
+        return False
+    join_room(f"user_{current_user.id}")
+    join_room(FILE_UPDATES_ROOM)
+
+@socketio.on('disconnect', namespace='/file_updates')
+def file_updates_disconnect():
+    tails.unsubscribe_all(request.sid)
+
+def _emit_tail(event, data, room):
+    # Followers of a file are always clients of the worker that tails it
+    socketio.emit(event, data, room=room, namespace='/file_updates', ignore_queue=True)
+
+tails.set_emitter(_emit_tail)
+
+def _emit_job(event, data, owner):
+    socketio.emit(event, data, room=f"user_{owner}", namespace='/file_updates')
+
+def _emit_job_changes(directories, owner):
+    # One file_change per directory for the whole batch, not one per item
+    for directory in directories:
+        _emit_file_change(directory, f"user_{owner}")
+
+jobs.set_emitter(_emit_job)
+jobs.set_change_listener(_emit_job_changes)
+
+@socketio.on('job_cancel', namespace='/file_updates')
+def job_cancel(data):
+    if not current_user.is_authenticated:
+        return
+    job = jobs.cancel((data or {}).get('id'), owner=current_user.id)
+    if job is None:
+        emit('job_error', {'id': (data or {}).get('id'), 'error': 'Job not found'})
+
+@socketio.on('tail_subscribe', namespace='/file_updates')
+def tail_subscribe(data):
+    """Sends the last lines of a file, then everything appended to it"""
+    if not current_user.is_authenticated:
+        return
+    path = (data or {}).get('path')
+    if not path:
+        emit('tail_error', {'error': 'Path is required'})
+        return
+    try:
+        safe_full_path = safe_path(os.getcwd(), normalize_path(path))
+        # Join before subscribing so nothing appended meanwhile misses the client;
+        # tail_init is sent under the reader's lock, ahead of any newer tail_data
+        room = tail_room(os.path.abspath(safe_full_path))
+        join_room(room)
+        try:
+            tails.subscribe(safe_full_path, request.sid, data.get('lines', 100),
+                            on_init=lambda init: emit('tail_init', dict(init, request_path=path)))
+        except Exception:
+            leave_room(room)
+            raise
+    except FileNotFoundError:
+        emit('tail_error', {'path': path, 'error': 'File not found'})
+    except Exception as e:
+        emit('tail_error', {'path': path, 'error': str(e)})
+
+@socketio.on('tail_unsubscribe', namespace='/file_updates')
+def tail_unsubscribe(data):
+    path = (data or {}).get('path')
+    if not path:
+        return
+    try:
+        safe_full_path = safe_path(os.getcwd(), normalize_path(path))
+    except ValueError:
+        return
+    leave_room(tail_room(os.path.abspath(safe_full_path)))
+    tails.unsubscribe(safe_full_path, request.sid)
+
 def safe_path(base_dir, path):
     """Secure path joining to prevent directory traversal"""
     # If path is absolute and on an allowed drive, allow it
     if os.path.isabs(path) and os.name == 'nt' and len(path) >= 3 and path[1] == ':' and path[0].isalpha() and (path[:3] in [d + '\\' for d in get_drives()]):
         return os.path.normpath(path)
+    # Absolute paths under base_dir (the listing returns those) are used as they are
+    if os.path.isabs(path) and os.path.commonpath([os.path.normpath(path), base_dir]) == base_dir:
+        return os.path.normpath(path)
     # Normalize and join
     full_path = os.path.normpath(os.path.join(base_dir, path.lstrip('/')))
     # Check if it's within base_dir
@@ -73,13 +215,132 @@ def list_directory():
         else:
             safe_full_path = safe_path(base_dir, normalized_path)
 
-        result = list_dir(safe_full_path)
+        sort = request.args.get('sort', 'name')
+        order = request.args.get('order', 'asc')
+        cursor = request.args.get('cursor')
+        limit = request.args.get('limit', type=int)
+        name_filter = request.args.get('filter')
+
+        # Unsorted NDJSON streams entries as scandir yields them, in constant memory
+        if request.args.get('format') == 'ndjson':
+            return Response(_ndjson_listing(safe_full_path, sort, order, cursor, limit, name_filter),
+                            mimetype='application/x-ndjson')
+
+        result = run_blocking(list_dir, safe_full_path, sort=sort, order=order, cursor=cursor,
+                              limit=limit, name_filter=name_filter)
         # Add info about available drives
         result['drives'] = get_drives()
+        result['thumbnails'] = thumbnails.images_enabled
         return jsonify(result)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def _ndjson_listing(path, sort, order, cursor, limit, name_filter):
+    """Yields a header line, then one JSON line per entry"""
+    yield json.dumps({'path': os.path.abspath(path), 'drives': get_drives()}) + '\n'
+    if sort == 'none':
+        for entry in iter_dir(path, name_filter):
+            yield json.dumps(entry) + '\n'
+        return
+    result = list_dir(path, sort=sort, order=order, cursor=cursor, limit=limit, name_filter=name_filter)
+    for entry in result['entries']:
+        yield json.dumps(entry) + '\n'
+    yield json.dumps({'next_cursor': result['next_cursor'], 'total': result['total']}) + '\n'
+
+@files_bp.route('/search', methods=['GET'])
+@login_required
+def search_files():
+    """Streams indexed name or content matches as NDJSON"""
+    if not SEARCH_ENABLED:
+        return jsonify({'error': 'Search is disabled'}), 503
+    query = request.args.get('q', '')
+    mode = request.args.get('mode', 'name')
+    glob = request.args.get('glob') or None
+    regex = request.args.get('regex') == '1'
+    limit = min(request.args.get('limit', 1000, type=int), 10000)
+    if not query and not glob:
+        return jsonify({'error': 'Query is required'}), 400
+
+    started = time.time()
+    try:
+        subdir = request.args.get('path')
+        if subdir and normalize_path(subdir) not in ('/', '.', ''):
+            # The listing reports absolute paths; accept those as long as they are under the index root
+            subdir = os.path.abspath(normalize_path(subdir))
+            if os.path.commonpath([subdir, search_index.root]) != search_index.root:
+                raise ValueError("Invalid path: outside the search root")
+            subdir = os.path.relpath(subdir, search_index.root)
+        else:
+            subdir = None
+        results = search_index.search(query, mode=mode, regex=regex, glob=glob, subdir=subdir, limit=limit)
+        first = next(results, None)  # surfaces bad regexes before streaming starts
+    except re.error as e:
+        return jsonify({'error': f'Invalid regex: {e}'}), 400
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+    def generate():
+        yield json.dumps(search_index.stats()) + '\n'
+        count = 0
+        for match in itertools.chain([first] if first else [], results):
+            try:
+                match['size'] = None if match['is_dir'] else os.path.getsize(match['path'])
+            except OSError:
+                match['size'] = None
+            count += 1
+            yield json.dumps(match) + '\n'
+        yield json.dumps({'done': True, 'count': count,
+                          'elapsed_ms': round((time.time() - started) * 1000, 1)}) + '\n'
+
+    return Response(generate(), mimetype='application/x-ndjson')
+
+def _du_root(path):
+    base_dir = os.getcwd()
+    normalized_path = normalize_path(unquote(path or '.'))
+    if normalized_path in ('/', '.', ''):
+        return base_dir
+    return safe_path(base_dir, normalized_path)
+
+@files_bp.route('/du/scan', methods=['POST'])
+@login_required
+def du_scan():
+    """Starts a background disk usage scan; progress arrives as du_progress events"""
+    try:
+        root = _du_root((request.json or {}).get('path'))
+        if not os.path.isdir(root):
+            return jsonify({'error': 'Not a directory'}), 400
+        room = f"user_{current_user.id}"
+
+        def progress(state):
+            socketio.emit('du_progress', state, room=room, namespace='/file_updates')
+            if state.get('done'):
+                # Directory sizes in the listing come from the scan results
+                dir_cache.invalidate(state['root'])
+
+        started = du_scanner.start(root, progress)
+        return jsonify({'root': root, 'started': started, 'progress': du_scanner.progress(root)})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@files_bp.route('/du', methods=['GET'])
+@login_required
+@read_only_session
+def du_tree():
+    """Largest subtrees (and directories with the most own data) from the last scan"""
+    try:
+        root = _du_root(request.args.get('path'))
+        depth = min(request.args.get('depth', 2, type=int), 6)
+        top = min(request.args.get('top', 20, type=int), 200)
+        tree = run_blocking(du_scanner.tree, root, depth=depth, top=top)
+        if tree is None:
+            return jsonify({'error': 'Directory has not been scanned', 'progress': du_scanner.progress(root)}), 404
+        return jsonify({'tree': tree, 'largest': du_scanner.largest(root, top),
+                        'progress': du_scanner.progress(root)})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @files_bp.route('/upload', methods=['POST'])
 @login_required
 def upload_file():
@@ -130,6 +391,87 @@ def upload_file():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@files_bp.route('/upload/init', methods=['POST'])
+@login_required
+def upload_init():
+    """Starts a resumable chunked upload into a preallocated part file"""
+    data = request.json or {}
+    filename = data.get('filename')
+    size = data.get('size')
+    if not filename or not isinstance(size, int):
+        return jsonify({'error': 'filename and size are required'}), 400
+
+    base_dir = os.getcwd()
+    try:
+        path = unquote(data.get('path', '.'))
+        safe_path_dir = safe_path(base_dir, normalize_path(path))
+        upload = uploads.create(safe_path_dir, filename, size)
+        return jsonify(upload.status())
+    except UploadError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@files_bp.route('/upload/<upload_id>', methods=['GET'])
+@login_required
+def upload_status(upload_id):
+    """Reports the byte ranges already received so the client can resume"""
+    try:
+        return jsonify(uploads.get(upload_id).status())
+    except UploadError as e:
+        return jsonify({'error': str(e)}), 404
+
+@files_bp.route('/upload/<upload_id>', methods=['PUT'])
+@login_required
+def upload_chunk(upload_id):
+    """Writes the raw request body at ?offset= without spooling it"""
+    offset = request.args.get('offset', type=int)
+    length = request.content_length
+    if offset is None or length is None:
+        return jsonify({'error': 'offset and Content-Length are required'}), 400
+    try:
+        upload = uploads.get(upload_id)
+    except UploadError as e:
+        return jsonify({'error': str(e)}), 404
+    try:
+        status = upload.write_chunk(offset, request.stream, length)
+        return jsonify({'received': status['received'], 'received_bytes': status['received_bytes']})
+    except UploadError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@files_bp.route('/upload/<upload_id>/finalize', methods=['POST'])
+@login_required
+def upload_finalize(upload_id):
+    try:
+        upload = uploads.get(upload_id)
+    except UploadError as e:
+        return jsonify({'error': str(e)}), 404
+    try:
+        final_path = upload.finalize()
+        uploads.discard(upload_id)
+        emit_file_change_event(upload.directory)
+        return jsonify({
+            'message': 'File uploaded successfully',
+            'uploaded_files': [os.path.basename(final_path)]
+        })
+    except UploadError as e:
+        return jsonify({'error': str(e), 'missing': upload.missing()}), 409
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@files_bp.route('/upload/<upload_id>', methods=['DELETE'])
+@login_required
+def upload_abort(upload_id):
+    try:
+        upload = uploads.get(upload_id)
+    except UploadError as e:
+        return jsonify({'error': str(e)}), 404
+    upload.abort()
+    uploads.discard(upload_id)
+    return jsonify({'message': 'Upload cancelled'})
+
 @files_bp.route('/view/<path:filename>')
 @login_required
 def view_file(filename):
@@ -144,20 +486,53 @@ def view_file(filename):
         else:
             safe_full_path = safe_path(base_dir, filename)
 
-        # For Windows full path (e.g., D:\path\to\file.pdf)
-        if ':' in filename and filename[1] == os.sep and filename[0].isalpha():
-            # This is path in format D:\filename, use it directly but validate
-            directory = os.path.dirname(safe_full_path)
-            filename_only = os.path.basename(safe_full_path)
-            return send_from_directory(directory, filename_only, as_attachment=False)
-        else:
-            # Relative path, handle as usual
-            directory = os.path.dirname(safe_full_path)
-            filename_only = os.path.basename(safe_full_path)
-            return send_from_directory(directory, filename_only, as_attachment=False)
+        # Supports Range/If-Range so large files can be resumed and seeked
+        return send_ranged(safe_full_path, as_attachment=False)
+    except FileNotFoundError:
+        return jsonify({'error': 'File not found'}), 404
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# Previews are addressed by the file's mtime (the v parameter), so they never change under a URL
+THUMB_MAX_AGE = 365 * 24 * 3600
+
+@files_bp.route('/thumb')
+@login_required
+@read_only_session
+def thumbnail():
+    """Small cached preview: a scaled image (kind=image) or the first lines of a text file (kind=text)"""
+    path = request.args.get('path')
+    kind = request.args.get('kind', 'image')
+    if not path:
+        return jsonify({'error': 'Path is required'}), 400
+    if kind not in ('image', 'text'):
+        return jsonify({'error': f'Unsupported preview kind: {kind}'}), 400
+    if kind == 'image' and not thumbnails.images_enabled:
+        return jsonify({'error': 'Image thumbnails need Pillow installed'}), 501
+    try:
+        safe_full_path = safe_path(os.getcwd(), normalize_path(unquote(path)))
+        if not os.path.isfile(safe_full_path):
+            return jsonify({'error': 'File not found'}), 404
+        cached, mimetype = run_blocking(thumbnails.get, safe_full_path, kind,
+                                        request.args.get('size', 256, type=int))
+        # The cache file name is its content key; its mtime only tracks LRU order
+        etag = os.path.basename(cached).split('.', 1)[0]
+        response = send_file(cached, mimetype=mimetype, conditional=True, etag=etag)
+        response.headers['Cache-Control'] = f'private, max-age={THUMB_MAX_AGE}, immutable'
+        return response
+    except TimeoutError as e:
+        return jsonify({'error': str(e)}), 504
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 415
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@files_bp.route('/thumb/stats')
+@login_required
+@read_only_session
+def thumbnail_stats():
+    return jsonify(thumbnails.stats())
+
 @files_bp.route('/download/<path:filename>')
 @login_required
 def download_file(filename):
@@ -172,17 +547,38 @@ def download_file(filename):
         else:
             safe_full_path = safe_path(base_dir, filename)
 
-        # For Windows full path (e.g., D:\path\to\file.pdf)
-        if ':' in filename and filename[1] == os.sep and filename[0].isalpha():
-            # This is path in format D:\filename, use it directly but validate
-            directory = os.path.dirname(safe_full_path)
-            filename_only = os.path.basename(safe_full_path)
-            return send_from_directory(directory, filename_only, as_attachment=True)
+        # Supports Range/If-Range so large files can be resumed and seeked
+        return send_ranged(safe_full_path, as_attachment=True)
+    except FileNotFoundError:
+        return jsonify({'error': 'File not found'}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@files_bp.route('/archive')
+@login_required
+def download_archive():
+    """Streams a zip or tar.gz of the given paths without temp files"""
+    paths = request.args.getlist('path')
+    fmt = request.args.get('format', 'zip')
+    if not paths:
+        return jsonify({'error': 'Path is required'}), 400
+    if fmt not in FORMATS:
+        return jsonify({'error': f'Unsupported format: {fmt}'}), 400
+
+    base_dir = os.getcwd()
+    try:
+        safe_paths = [safe_path(base_dir, normalize_path(unquote(p))) for p in paths]
+        for p in safe_paths:
+            if not os.path.exists(p):
+                return jsonify({'error': f'File not found: {p}'}), 404
+        mimetype, extension = FORMATS[fmt]
+        if len(safe_paths) == 1:
+            name = os.path.basename(safe_paths[0].rstrip(os.sep)) or 'root'
         else:
-            # Relative path, handle as usual
-            directory = os.path.dirname(safe_full_path)
-            filename_only = os.path.basename(safe_full_path)
-            return send_from_directory(directory, filename_only, as_attachment=True)
+            name = 'selection'
+        response = Response(stream_archive(safe_paths, fmt), mimetype=mimetype)
+        response.headers.set('Content-Disposition', 'attachment', filename=name + extension)
+        return response
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -206,6 +602,52 @@ def delete_item():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@files_bp.route('/batch', methods=['POST'])
+@login_required
+def batch_operation():
+    """Queues a move/copy/delete/chmod over many paths; progress arrives as job_progress events"""
+    data = request.json or {}
+    paths = data.get('paths') or []
+    if not isinstance(paths, list) or not paths:
+        return jsonify({'error': 'Paths are required'}), 400
+    base_dir = os.getcwd()
+    try:
+        safe_paths = [safe_path(base_dir, normalize_path(p)) for p in paths]
+        if base_dir in safe_paths:
+            return jsonify({'error': 'Cannot operate on the root directory'}), 400
+        dest = data.get('dest')
+        safe_dest = safe_path(base_dir, normalize_path(dest)) if dest else None
+        job = jobs.submit(data.get('op'), safe_paths, current_user.id, dest=safe_dest,
+                          mode=data.get('mode'), recursive=bool(data.get('recursive')))
+        return jsonify({'job': job.to_dict()}), 202
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@files_bp.route('/jobs', methods=['GET'])
+@login_required
+@read_only_session
+def list_jobs():
+    return jsonify({'jobs': jobs.list(owner=current_user.id)})
+
+@files_bp.route('/jobs/<job_id>', methods=['GET'])
+@login_required
+@read_only_session
+def job_status(job_id):
+    job = jobs.get(job_id, owner=current_user.id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify({'job': job.to_dict()})
+
+@files_bp.route('/jobs/<job_id>/cancel', methods=['POST'])
+@login_required
+def cancel_job(job_id):
+    job = jobs.cancel(job_id, owner=current_user.id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify({'job': job.to_dict()})
+
 @files_bp.route('/mkdir', methods=['POST'])
 @login_required
 def create_directory():
@@ -243,9 +685,44 @@ def read_file():
         else:
             safe_full_path = safe_path(base_dir, normalized_path)
 
-        with open(safe_full_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        return content
+        # Large files are paged through /files/lines instead of loaded whole
+        size = os.path.getsize(safe_full_path)
+        if size > EDITOR_MAX_BYTES:
+            return jsonify({'error': 'File is too large to edit', 'size': size}), 413
+
+        # Bytes as they are (like newline=''): the editor's byte offsets count every CR
+        with open(safe_full_path, 'rb') as f:
+            version = file_version(os.fstat(f.fileno()))
+            data = f.read()
+        content = data.decode('utf-8')
+        # The editor sends the version and hash back with its patch to detect concurrent changes
+        return content, 200, {'X-File-Version': version, 'X-File-Sha256': content_hash(data)}
+    except FileNotFoundError:
+        return jsonify({'error': 'File not found'}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@files_bp.route('/lines', methods=['GET'])
+@login_required
+def read_lines():
+    """Returns a window of lines: ?start=&count=, ?tail=N or ?offset=<byte>"""
+    path = request.args.get('path')
+    if not path:
+        return jsonify({'error': 'Path is required'}), 400
+
+    base_dir = os.getcwd()
+    try:
+        safe_full_path = safe_path(base_dir, normalize_path(path))
+        result = run_blocking(
+            read_window,
+            safe_full_path,
+            start=request.args.get('start', type=int),
+            count=request.args.get('count', 200, type=int),
+            tail=request.args.get('tail', type=int),
+            offset=request.args.get('offset', type=int),
+            with_total=request.args.get('total') == '1',
+        )
+        return jsonify(result)
     except FileNotFoundError:
         return jsonify({'error': 'File not found'}), 404
     except Exception as e:
@@ -257,6 +734,8 @@ def write_file():
     data = request.json
     path = data.get('path')
     content = data.get('content', '')
+    version = data.get('version')
+    sha256 = data.get('sha256')
 
     if not path:
         return jsonify({'error': 'Path is required'}), 400
@@ -273,12 +752,42 @@ def write_file():
         if directory and directory != '.' and directory != '' and not os.path.exists(directory):
             os.makedirs(directory, exist_ok=True)
 
-        with open(safe_full_path, 'w', encoding='utf-8') as f:
-            f.write(content)
+        # Temp file + fsync + rename, so a crash never leaves a truncated file
+        new_version, new_hash = write_text(safe_full_path, content, version, sha256)
 
         # Send file change event
         emit_file_change_event(safe_full_path)
-        return jsonify({'message': 'File written successfully'})
+        return jsonify({'message': 'File written successfully', 'version': new_version, 'sha256': new_hash})
+    except VersionConflict as e:
+        return jsonify({'error': str(e), 'version': e.current}), 409
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@files_bp.route('/patch', methods=['POST'])
+@login_required
+def patch_file():
+    """Applies byte or line range edits to the file version the client has"""
+    data = request.json or {}
+    path = data.get('path')
+    version = data.get('version')
+    edits = data.get('edits')
+    sha256 = data.get('sha256')
+
+    if not path or not version or not isinstance(edits, list):
+        return jsonify({'error': 'path, version and edits are required'}), 400
+
+    base_dir = os.getcwd()
+    try:
+        safe_full_path = safe_path(base_dir, normalize_path(path))
+        new_version, new_hash = apply_patch(safe_full_path, version, edits, sha256)
+        emit_file_change_event(safe_full_path)
+        return jsonify({'message': 'File patched successfully', 'version': new_version, 'sha256': new_hash})
+    except VersionConflict as e:
+        return jsonify({'error': str(e), 'version': e.current}), 409
+    except FileNotFoundError:
+        return jsonify({'error': 'File not found'}), 404
+    except (ValueError, KeyError, TypeError) as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -0,0 +1,20 @@
+from flask import Blueprint, jsonify, render_template
+from flask_login import login_required
+from app.utils.system_utils import get_summary_metrics
+from app.utils.fleet import hub, summarize
+from app.utils.session_utils import read_only_session
+
+fleet_bp = Blueprint('fleet', __name__)
+
+@fleet_bp.route('/')
+@login_required
+def index():
+    return render_template('fleet.html')
+
+@fleet_bp.route('/snapshot')
+@login_required
+@read_only_session
+def snapshot():
+    """This host plus the last known state of every agent"""
+    local = {'name': 'local', 'url': None, 'status': 'up', 'data': summarize(get_summary_metrics())}
+    return jsonify({'hosts': [local] + hub.snapshot()})
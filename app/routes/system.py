@@ -1,10 +1,21 @@
-from flask import Blueprint, jsonify, render_template
-from flask_login import login_required
+from flask import Blueprint, jsonify, render_template, request
+from flask_login import login_required, current_user
+from flask_socketio import join_room, leave_room, emit
 from app.utils.system_utils import get_summary_metrics
-from app import cache
+from app.utils.metrics_sampler import sampler
+from app.utils.metrics_delta import MetricsStream
+from app.utils.metrics_history import history
+from app.utils.session_utils import read_only_session
+from app import socketio
+import time
 
 system_bp = Blueprint('system', __name__)
 
+# Room shared by all dashboard viewers, so each snapshot is encoded once
+METRICS_ROOM = 'metrics_viewers'
+_viewers = set()
+_stream = MetricsStream()
+
 @system_bp.route('/')
 @login_required
 def index():
@@ -12,7 +23,67 @@ def index():
 
 @system_bp.route('/metrics')
 @login_required
-@cache.cached(timeout=5, key_prefix='system_metrics')
+@read_only_session
 def metrics():
+    # Served from the sampler snapshot, no psutil calls on the request path
     metrics_data = get_summary_metrics()
     return jsonify(metrics_data)
+
+@system_bp.route('/history')
+@login_required
+@read_only_session
+def metrics_history():
+    """Range query over stored metrics: ?metric=a,b&from=&to=&step= (unix seconds)"""
+    names = [name for name in request.args.get('metric', '').split(',') if name]
+    unknown = [name for name in names if name not in history.series]
+    if not names or unknown:
+        return jsonify({'error': f"Unknown metric: {','.join(unknown)}" if unknown else 'Metric is required',
+                        'available': list(history.series)}), 400
+    try:
+        t_to = float(request.args.get('to') or time.time())
+        t_from = float(request.args.get('from') or t_to - 3600)
+        step = float(request.args['step']) if request.args.get('step') else None
+    except ValueError:
+        return jsonify({'error': 'from, to and step must be numbers'}), 400
+    if t_from >= t_to:
+        return jsonify({'error': 'from must be before to'}), 400
+    return jsonify({'series': [history.query(name, t_from, t_to, step) for name in names]})
+
+@socketio.on('connect', namespace='/metrics')
+def metrics_connect():
+    if not current_user.is_authenticated:
+        return False
+    _viewers.add(request.sid)
+    join_room(METRICS_ROOM)
+    # New viewers get one full snapshot, then only deltas
+    emit('metrics_full', _full_message())
+
+@socketio.on('disconnect', namespace='/metrics')
+def metrics_disconnect():
+    _viewers.discard(request.sid)
+    leave_room(METRICS_ROOM)
+
+@socketio.on('metrics_resync', namespace='/metrics')
+def metrics_resync():
+    """Client missed a delta (sequence gap), send it a full snapshot again"""
+    if not current_user.is_authenticated:
+        return
+    emit('metrics_full', _full_message())
+
+def _full_message():
+    message = _stream.full()
+    if message['data'] is None:
+        # Nothing streamed yet: only this client gets the current sample, the shared stream and
+        # its seq are left to the sampler (its first push goes out as a full message)
+        message = {'seq': message['seq'], 'data': get_summary_metrics()}
+    return message
+
+def broadcast_metrics(snapshot):
+    """Pushes the changes of a new snapshot to every connected dashboard"""
+    message = _stream.push(snapshot)
+    if not _viewers or socketio.server is None:
+        return
+    # Every worker of a cluster streams its own copy of the samples to its own viewers
+    socketio.emit('metrics_delta', message, to=METRICS_ROOM, namespace='/metrics', ignore_queue=True)
+
+sampler.add_listener(broadcast_metrics)
@@ -1,7 +1,9 @@
-from flask import Blueprint, render_template
+from flask import Blueprint, render_template, request
 from flask_login import login_required, current_user
+from flask_socketio import emit, join_room, leave_room
 from app import socketio
-from app.utils.terminal_utils import run_command
+from app.utils.terminal_utils import (run_command, validate_command, terminals, terminal_room,
+                                      PTY_SUPPORTED, CONTROL_KEYS)
 
 terminal_bp = Blueprint('terminal', __name__)
 
@@ -10,13 +12,108 @@ terminal_bp = Blueprint('terminal', __name__)
 def index():
     return render_template('terminal.html')
 
+def _emit_terminal(event, data, room):
+    # The attached client is always connected to the worker that runs the shell
+    socketio.emit(event, data, room=room, namespace='/terminal', ignore_queue=True)
+
+terminals.set_emitter(_emit_terminal)
+
+@socketio.on('disconnect', namespace='/terminal')
+def terminal_disconnect():
+    # The shell keeps running; the next page load attaches to it again
+    terminals.detach(request.sid)
+
+@socketio.on('term_open', namespace='/terminal')
+def term_open(data):
+    """Attaches to an existing session (after a reload) or starts a new shell"""
+    if not current_user.is_authenticated:
+        emit('term_error', {'error': 'Not authenticated.'})
+        return
+    data = data or {}
+    if not PTY_SUPPORTED:
+        emit('term_ready', {'pty': False})
+        return
+    try:
+        session = terminals.get(data.get('id'), current_user.id) if data.get('id') else None
+        reattached = session is not None
+        if session is None:
+            session = terminals.open(current_user.id, data.get('cols', 120), data.get('rows', 32))
+        # Output goes to the session's private room; only the attached client is in it
+        room = terminal_room(session.id)
+        previous = session.sid
+        if previous and previous != request.sid:
+            leave_room(room, sid=previous)
+            socketio.emit('term_detached', {'id': session.id}, to=previous, namespace='/terminal',
+                          ignore_queue=True)
+        join_room(room)
+        emit('term_ready', dict(session.to_dict(), pty=True, reattached=reattached))
+        # offset: what this client already shows (0 after a page reload replays the scrollback)
+        session, _ = terminals.attach(session.id, current_user.id, request.sid, data.get('offset') or 0)
+        if session is None:
+            leave_room(room)
+            emit('term_error', {'error': 'Session not found'})
+            return
+        terminals.replay(session)
+    except Exception as e:
+        emit('term_error', {'error': str(e)})
+
+@socketio.on('term_input', namespace='/terminal')
+def term_input(data):
+    """A command line (ending in a newline) or one of the allowed control keys"""
+    if not current_user.is_authenticated:
+        return
+    data = data or {}
+    text = data.get('data') or ''
+    if text not in CONTROL_KEYS:
+        blocked = validate_command(text)
+        if blocked:
+            emit('term_output', {'id': data.get('id'), 'data': blocked + '\n', 'notice': True})
+            return
+        if '\n' in text.rstrip('\n') or any(ord(char) < 32 and char not in '\t\n' for char in text):
+            emit('term_output', {'id': data.get('id'), 'data': 'Input blocked: one line at a time.\n',
+                                 'notice': True})
+            return
+    if not terminals.write(data.get('id'), current_user.id, text):
+        emit('term_error', {'id': data.get('id'), 'error': 'Session not found'})
+
+@socketio.on('term_ack', namespace='/terminal')
+def term_ack(data):
+    """The client has rendered output up to offset; lets more through"""
+    if not current_user.is_authenticated:
+        return
+    try:
+        terminals.ack(data.get('id'), current_user.id, data.get('offset', 0))
+    except (TypeError, ValueError, AttributeError):
+        pass
+
+@socketio.on('term_resize', namespace='/terminal')
+def term_resize(data):
+    if not current_user.is_authenticated:
+        return
+    session = terminals.get((data or {}).get('id'), current_user.id)
+    if session is None:
+        return
+    try:
+        session.resize(data.get('cols', 120), data.get('rows', 32))
+    except (TypeError, ValueError, OSError):
+        pass
+
+@socketio.on('term_close', namespace='/terminal')
+def term_close(data):
+    if not current_user.is_authenticated:
+        return
+    terminals.close((data or {}).get('id'), current_user.id)
+
 @socketio.on('run_command', namespace='/terminal')
 def handle_command(data):
     if not current_user.is_authenticated:
-        socketio.emit('cmd_output', {'output': 'Not authenticated.'}, namespace='/terminal')
+        emit('cmd_output', {'output': 'Not authenticated.'})
         return
     cmd = data.get('command')
     if not cmd:
-        socketio.emit('cmd_output', {'output': 'No command provided.', 'exit': -1}, namespace='/terminal')
+        emit('cmd_output', {'output': 'No command provided.', 'exit': -1})
         return
-    run_command(cmd, lambda event, data: socketio.emit(event, data, namespace='/terminal'))
+    # Only the client that ran the command gets its output
+    sid = request.sid
+    run_command(cmd, lambda event, data: socketio.emit(event, data, to=sid, namespace='/terminal',
+                                                       ignore_queue=True))
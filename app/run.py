@@ -1,10 +1,81 @@
 import sys
 import os
+import time
+import signal
+import argparse
+import subprocess
 
 # Добавляем корень проекта в PYTHONPATH
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from app import run_server
+
+def monkey_patch(mode):
+    """Cooperative modes have to patch the standard library before anything else imports it"""
+    try:
+        if mode == 'eventlet':
+            # Size of eventlet's real-thread pool used for blocking calls (read when tpool is imported)
+            os.environ.setdefault('EVENTLET_THREADPOOL_SIZE', os.getenv('VPSCOPE_BLOCKING_WORKERS', '16'))
+            import eventlet
+            eventlet.monkey_patch()
+        elif mode == 'gevent':
+            from gevent import monkey
+            monkey.patch_all()
+    except ImportError:
+        sys.exit(f"Async mode '{mode}' needs the {mode} package installed (pip install {mode})")
+
+
+def run_workers(args):
+    """Runs args.workers servers on consecutive ports and restarts any that crash"""
+    env = dict(os.environ, VPSCOPE_WORKERS=str(args.workers), VPSCOPE_ASYNC_MODE=args.async_mode)
+
+    def spawn(index):
+        command = [sys.executable, os.path.abspath(__file__), '--host', args.host,
+                   '--port', str(args.port + index), '--async-mode', args.async_mode]
+        return subprocess.Popen(command, env=dict(env, VPSCOPE_WORKER_INDEX=str(index))), time.time()
+
+    # SIGTERM (docker stop, systemd) stops the workers too
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    workers = {index: spawn(index) for index in range(args.workers)}
+    print(f"VPScope: {args.workers} workers on ports {args.port}-{args.port + args.workers - 1}; "
+          f"serve them through a load balancer with sticky sessions (e.g. nginx ip_hash)", flush=True)
+    try:
+        while True:
+            time.sleep(1)
+            for index, (proc, started) in list(workers.items()):
+                if proc.poll() is None:
+                    continue
+                if time.time() - started < 10:
+                    sys.exit(f"Worker {index} exited with code {proc.returncode} right after start")
+                print(f"VPScope: worker {index} exited with code {proc.returncode}, restarting", flush=True)
+                workers[index] = spawn(index)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # SIGINT lets each worker save its state like Ctrl-C does
+        for proc, _ in workers.values():
+            proc.send_signal(signal.SIGINT)
+        for proc, _ in workers.values():
+            try:
+                proc.wait(10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
 
 if __name__ == '__main__':
-    run_server()
+    parser = argparse.ArgumentParser(description='VPScope server')
+    parser.add_argument('--host', default='0.0.0.0', help='Address to listen on')
+    parser.add_argument('--port', type=int, default=8000, help='Port to listen on')
+    parser.add_argument('--async-mode', choices=['threading', 'eventlet', 'gevent'],
+                        default=os.getenv('VPSCOPE_ASYNC_MODE', 'threading'),
+                        help='Server concurrency model (default: VPSCOPE_ASYNC_MODE or threading)')
+    parser.add_argument('--workers', type=int, default=int(os.getenv('VPSCOPE_WORKERS', '1')),
+                        help='Server processes, on ports PORT..PORT+WORKERS-1 (default: VPSCOPE_WORKERS or 1)')
+    args = parser.parse_args()
+    if args.workers > 1 and 'VPSCOPE_WORKER_INDEX' not in os.environ:
+        run_workers(args)
+        sys.exit(0)
+    os.environ['VPSCOPE_ASYNC_MODE'] = args.async_mode
+    monkey_patch(args.async_mode)
+
+    from app import run_server
+    run_server(host=args.host, port=args.port)
@@ -5,6 +5,16 @@ document.addEventListener('DOMContentLoaded', function() {
     const fileInput = document.getElementById('file-input');
     const newItemNameInput = document.getElementById('new-item-name');
     const createItemBtn = document.getElementById('create-item-btn');
+    const filterInput = document.getElementById('filter-input');
+    const sortSelect = document.getElementById('sort-select');
+    const orderSelect = document.getElementById('order-select');
+    const searchInput = document.getElementById('search-input');
+    const searchMode = document.getElementById('search-mode');
+    const searchRegex = document.getElementById('search-regex');
+    const searchBtn = document.getElementById('search-btn');
+    const duBtn = document.getElementById('du-btn');
+    const duStatus = document.getElementById('du-status');
+    const duPanel = document.getElementById('du-panel');
     const drivesContainer = document.createElement('div');
     drivesContainer.id = 'drives-container';
     drivesContainer.style.marginBottom = '1rem';
@@ -19,50 +29,86 @@ document.addEventListener('DOMContentLoaded', function() {
     let currentPath = '.';
     let pathHistory = []; // История посещенных директорий
     let currentIndex = -1; // Текущий индекс в истории
-    let socket; // Переменная для хранения WebSocket-соединения
 
-    // Подключаемся к WebSocket
-    function connectWebSocket() {
-        // Используем тот же протокол, что и текущая страница
-        const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
-        const wsUrl = `${protocol}//${window.location.host}/file_updates`;
-        
-        try {
-            socket = new WebSocket(wsUrl);
-            
-            socket.onopen = function(event) {
-                console.log('WebSocket connected for file updates');
-            };
-            
-            socket.onmessage = function(event) {
-                const data = JSON.parse(event.data);
-                if (data.path) {
-                    // Обновляем список файлов, если текущая директория совпадает с измененной
-                    if (data.path.startsWith(currentPath) || currentPath.startsWith(data.path)) {
-                        console.log('File change detected, refreshing directory');
-                        listDirectory(currentPath);
-                    }
-                }
-            };
-            
-            socket.onerror = function(error) {
-                console.error('WebSocket error:', error);
-            };
-            
-            socket.onclose = function(event) {
-                console.log('WebSocket disconnected, attempting to reconnect...');
-                // Пытаемся переподключиться через 3 секунды
-                setTimeout(connectWebSocket, 3000);
-            };
-        } catch (e) {
-            console.error('Failed to connect WebSocket:', e);
-            // Пытаемся переподключиться через 3 секунды
-            setTimeout(connectWebSocket, 3000);
+    // Подключаемся к Socket.IO: сервер сообщает об изменениях файлов,
+    // в том числе сделанных другими процессами
+    const socket = io('/file_updates');
+
+    socket.on('connect', () => {
+        console.log('Connected for file updates');
+    });
+
+    // Окна «tail -f»: путь -> окно; данные приходят по общему сокету
+    const tailWindows = {};
+    const TAIL_MAX_CHARS = 2000000; // старые строки выбрасываются из окна
+
+    function appendTail(path, text) {
+        const tailWindow = tailWindows[path];
+        if (!tailWindow || tailWindow.closed) return;
+        const output = tailWindow.document.getElementById('output');
+        if (!output) return;
+        const atBottom = output.scrollTop + output.clientHeight >= output.scrollHeight - 5;
+        output.textContent += text;
+        if (output.textContent.length > TAIL_MAX_CHARS) {
+            output.textContent = output.textContent.slice(-TAIL_MAX_CHARS / 2);
         }
+        if (atBottom) output.scrollTop = output.scrollHeight;
     }
 
-    // Запускаем WebSocket-соединение
-    connectWebSocket();
+    const pendingTails = {}; // запрошенный путь -> окно, пока не пришёл tail_init
+
+    socket.on('tail_init', data => {
+        const tailWindow = pendingTails[data.request_path] || tailWindows[data.path];
+        delete pendingTails[data.request_path];
+        if (!tailWindow || tailWindow.closed) return;
+        tailWindows[data.path] = tailWindow;
+        tailWindow.document.getElementById('output').textContent = '';
+        appendTail(data.path, data.lines.length ? data.lines.join('\n') + '\n' : '');
+    });
+    socket.on('tail_data', data => appendTail(data.path, data.data));
+    socket.on('tail_reset', data => appendTail(data.path, `\n--- file ${data.reason} ---\n`));
+    socket.on('tail_error', data => showNotification('Tail error: ' + data.error, 'error'));
+
+    function openTailViewer(filePath, fileName) {
+        const tailWindow = window.open('', '_blank', 'width=1000,height=700');
+        tailWindow.document.write(`
+            <!DOCTYPE html>
+            <html>
+            <head>
+                <title>Tail ${fileName}</title>
+                <style>
+                    body { font-family: monospace; margin: 0; padding: 0; }
+                    .controls { padding: 10px; background: #f5f5f5; }
+                    #output { height: calc(100vh - 50px); overflow-y: auto; margin: 0; padding: 10px; white-space: pre-wrap; box-sizing: border-box; }
+                </style>
+            </head>
+            <body>
+                <div class="controls"><button onclick="window.close()">Close</button> Following ${fileName}</div>
+                <pre id="output">Loading...</pre>
+            </body>
+            </html>
+        `);
+        tailWindow.document.close();
+        // Сервер отвечает абсолютным путём; до tail_init окно ждёт по запрошенному
+        pendingTails[filePath] = tailWindow;
+        tailWindow.addEventListener('beforeunload', () => {
+            Object.keys(tailWindows).forEach(path => {
+                if (tailWindows[path] === tailWindow) delete tailWindows[path];
+            });
+            socket.emit('tail_unsubscribe', {path: filePath});
+        });
+        socket.emit('tail_subscribe', {path: filePath, lines: 500});
+    }
+
+    socket.on('file_change', data => {
+        if (!data.path) return;
+        const changedPath = data.path.replace(/\\/g, '/');
+        // Обновляем список файлов, если текущая директория совпадает с измененной
+        if (changedPath.startsWith(currentPath) || currentPath.startsWith(changedPath)) {
+            console.log('File change detected, refreshing directory');
+            listDirectory(currentPath, false);
+        }
+    });
 
     // Функция для обновления навигационных кнопок
     function updateNavButtons() {
@@ -250,9 +296,22 @@ document.addEventListener('DOMContentLoaded', function() {
 
     // Функция для открытия редактора
     function openEditor(filePath, fileName) {
+        let version = null;
+        let fileHash = null;
         fetch(`/files/read?path=${encodeURIComponent(filePath)}`)
-            .then(response => response.text())
+            .then(response => {
+                // Большие файлы сервер целиком не отдаёт — открываем постраничный просмотр
+                if (response.status === 413) {
+                    openLargeFileViewer(filePath, fileName);
+                    return null;
+                }
+                version = response.headers.get('X-File-Version');
+                fileHash = response.headers.get('X-File-Sha256');
+                // Без ignoreBOM декодер выбросит BOM и байтовые смещения правок съедут
+                return response.arrayBuffer().then(buffer => new TextDecoder('utf-8', {ignoreBOM: true}).decode(buffer));
+            })
             .then(content => {
+                if (content === null) return;
                 const editorWindow = window.open('', '_blank', 'width=800,height=600');
                 editorWindow.document.write(`
                     <!DOCTYPE html>
@@ -271,27 +330,101 @@ document.addEventListener('DOMContentLoaded', function() {
                             <button onclick="saveFile()">Save</button>
                             <button onclick="window.close()">Close</button>
                         </div>
-                        <textarea id="editor-content">${content.replace(/</g, '<').replace(/>/g, '>')}</textarea>
+                        <textarea id="editor-content"></textarea>
                         <script>
-                            function saveFile() {
-                                const content = document.getElementById('editor-content').value;
-                                fetch('/files/write', {
-                                    method: 'POST',
-                                    headers: {'Content-Type': 'application/json'},
-                                    body: JSON.stringify({
-                                        path: '${filePath.replace(/\\/g, '\\\\').replace(/'/g, "\\'").replace(/"/g, '&quot;')}',
-                                        content: content
-                                    })
-                                }).then(response => {
-                                    if(response.ok) {
-                                        showNotification('File saved successfully!', 'success');
+                            const PATH = ${JSON.stringify(filePath).replace(/</g, '\\u003c')};
+                            let version = ${JSON.stringify(version)};
+                            let fileHash = ${JSON.stringify(fileHash)};
+                            // Точный текст файла на диске. В textarea его кладём из скрипта:
+                            // HTML-разбор съел бы первый перевод строки, а value хранит только \\n
+                            let saved = ${JSON.stringify(content).replace(/</g, '\\u003c')};
+                            const NEWLINE = saved.indexOf('\\r\\n') >= 0 ? '\\r\\n' : '\\n';
+                            document.getElementById('editor-content').value = saved;
+
+                            function notify(message, type) {
+                                if (window.opener && window.opener.showNotification) {
+                                    window.opener.showNotification(message, type);
+                                } else {
+                                    alert(message);
+                                }
+                            }
+
+                            // Индекс в тексте файла для индекса в тексте textarea, где \\r\\n стал \\n
+                            function originalIndex(text, index) {
+                                let i = 0;
+                                for (let n = 0; n < index; n++) {
+                                    i += text.charCodeAt(i) === 13 && text.charCodeAt(i + 1) === 10 ? 2 : 1;
+                                }
+                                return i;
+                            }
+
+                            // Отправляем только изменённый участок: общий префикс и суффикс
+                            // со старым текстом не передаются, смещения считаются в байтах UTF-8
+                            // файла. old — заменяемые байты, сервер сверяет их с диском
+                            function makeEdit(fileText, newText) {
+                                const oldText = fileText.replace(/\\r\\n?/g, '\\n');
+                                let prefix = 0;
+                                const maxPrefix = Math.min(oldText.length, newText.length);
+                                while (prefix < maxPrefix && oldText.charCodeAt(prefix) === newText.charCodeAt(prefix)) prefix++;
+                                let suffix = 0;
+                                const maxSuffix = maxPrefix - prefix;
+                                while (suffix < maxSuffix &&
+                                       oldText.charCodeAt(oldText.length - 1 - suffix) === newText.charCodeAt(newText.length - 1 - suffix)) suffix++;
+                                // Не разрезаем суррогатные пары
+                                if (prefix && (oldText.charCodeAt(prefix - 1) & 0xFC00) === 0xD800) prefix--;
+                                if (suffix && (oldText.charCodeAt(oldText.length - suffix) & 0xFC00) === 0xDC00) suffix--;
+                                const from = originalIndex(fileText, prefix);
+                                const to = originalIndex(fileText, oldText.length - suffix);
+                                const encoder = new TextEncoder();
+                                const start = encoder.encode(fileText.slice(0, from)).length;
+                                const old = fileText.slice(from, to);
+                                const text = newText.slice(prefix, newText.length - suffix).replace(/\\n/g, NEWLINE);
+                                return {
+                                    edit: {start: start, end: start + encoder.encode(old).length, old: old, text: text},
+                                    result: fileText.slice(0, from) + text + fileText.slice(to)
+                                };
+                            }
+
+                            function handleSaved(response) {
+                                return response.json().then(data => {
+                                    if (response.ok) {
+                                        version = data.version;
+                                        fileHash = data.sha256;
+                                        notify('File saved successfully!', 'success');
+                                        return true;
+                                    }
+                                    if (response.status === 409) {
+                                        notify('File was changed on disk since it was opened; reload it before saving', 'error');
                                     } else {
-                                        response.json().then(data => {
-                                            showNotification('Error saving file: ' + data.error, 'error');
-                                        });
+                                        notify('Error saving file: ' + data.error, 'error');
                                     }
+                                    return false;
+                                });
+                            }
+
+                            function saveFile() {
+                                const value = document.getElementById('editor-content').value;
+                                let content, request;
+                                if (version) {
+                                    const patch = makeEdit(saved, value);
+                                    content = patch.result;
+                                    request = fetch('/files/patch', {
+                                        method: 'POST',
+                                        headers: {'Content-Type': 'application/json'},
+                                        body: JSON.stringify({path: PATH, version: version, sha256: fileHash, edits: [patch.edit]})
+                                    });
+                                } else {
+                                    content = value.replace(/\\n/g, NEWLINE);
+                                    request = fetch('/files/write', {
+                                        method: 'POST',
+                                        headers: {'Content-Type': 'application/json'},
+                                        body: JSON.stringify({path: PATH, content: content})
+                                    });
+                                }
+                                request.then(handleSaved).then(ok => {
+                                    if (ok) saved = content;
                                 }).catch(error => {
-                                    showNotification('Network error: ' + error.message, 'error');
+                                    notify('Network error: ' + error.message, 'error');
                                 });
                             }
                         </script>
@@ -301,6 +434,129 @@ document.addEventListener('DOMContentLoaded', function() {
             });
     }
 
+    // Просмотр больших текстовых файлов: строки подгружаются окнами через /files/lines,
+    // в DOM только видимые строки
+    function openLargeFileViewer(filePath, fileName) {
+        const viewerWindow = window.open('', '_blank', 'width=1000,height=700');
+        viewerWindow.document.write(`
+            <!DOCTYPE html>
+            <html>
+            <head>
+                <title>View ${fileName}</title>
+                <style>
+                    body { font-family: monospace; margin: 0; padding: 0; }
+                    .controls { padding: 10px; background: #f5f5f5; display: flex; gap: 10px; align-items: center; }
+                    #viewport { height: calc(100vh - 50px); overflow-y: auto; position: relative; }
+                    #spacer { position: relative; }
+                    #rows { position: absolute; left: 0; right: 0; }
+                    .line { height: 18px; line-height: 18px; white-space: pre; }
+                    .num { display: inline-block; min-width: 80px; color: #999; text-align: right; padding-right: 10px; user-select: none; }
+                </style>
+            </head>
+            <body>
+                <div class="controls">
+                    <button onclick="window.close()">Close</button>
+                    <input id="goto-line" type="number" min="1" placeholder="Line">
+                    <button onclick="goToLine()">Go</button>
+                    <button onclick="goToEnd()">End</button>
+                    <span id="info"></span>
+                </div>
+                <div id="viewport"><div id="spacer"><div id="rows"></div></div></div>
+                <script>
+                    const PATH = ${JSON.stringify(filePath).replace(/</g, '\\u003c')};
+                    const LINE_HEIGHT = 18;
+                    const PAGE = 500;
+                    const MAX_SCROLL = 10000000; // браузеры ограничивают высоту элемента
+                    const viewport = document.getElementById('viewport');
+                    const spacer = document.getElementById('spacer');
+                    const rows = document.getElementById('rows');
+                    let total = 0;
+                    let cache = {start: 0, lines: []};
+                    let requested = -1;
+
+                    function escapeHtml(text) {
+                        return text.replace(/&/g, '&amp;').replace(/</g, '&lt;').replace(/>/g, '&gt;');
+                    }
+
+                    function visibleCount() {
+                        return Math.ceil(viewport.clientHeight / LINE_HEIGHT) + 1;
+                    }
+
+                    // При очень длинных файлах полоса прокрутки масштабируется
+                    function firstVisibleLine() {
+                        const maxTop = Math.max(spacer.offsetHeight - viewport.clientHeight, 1);
+                        const maxLine = Math.max(total - visibleCount() + 1, 0);
+                        return Math.min(Math.floor(viewport.scrollTop / maxTop * maxLine), maxLine);
+                    }
+
+                    function scrollToLine(line) {
+                        const maxTop = Math.max(spacer.offsetHeight - viewport.clientHeight, 1);
+                        const maxLine = Math.max(total - visibleCount() + 1, 1);
+                        viewport.scrollTop = Math.min(line / maxLine, 1) * maxTop;
+                    }
+
+                    function load(start) {
+                        if (requested === start) return;
+                        requested = start;
+                        fetch('/files/lines?path=' + encodeURIComponent(PATH) + '&start=' + start + '&count=' + PAGE)
+                            .then(response => response.json())
+                            .then(data => {
+                                if (data.error || start !== requested) return;
+                                cache = {start: data.start_line, lines: data.lines};
+                                render();
+                            });
+                    }
+
+                    function render() {
+                        const first = firstVisibleLine();
+                        const last = Math.min(first + visibleCount(), total);
+                        const cacheEnd = cache.start + cache.lines.length;
+                        if (first < cache.start || (last > cacheEnd && cacheEnd < total)) {
+                            load(Math.max(first - Math.floor(PAGE / 4), 0));
+                        }
+                        rows.style.top = viewport.scrollTop + 'px';
+                        let html = '';
+                        for (let i = first; i < last; i++) {
+                            const line = cache.lines[i - cache.start];
+                            html += '<div class="line"><span class="num">' + (i + 1) + '</span>' +
+                                (line === undefined ? '' : escapeHtml(line)) + '</div>';
+                        }
+                        rows.innerHTML = html;
+                    }
+
+                    function goToLine() {
+                        const line = parseInt(document.getElementById('goto-line').value, 10);
+                        if (line > 0) scrollToLine(line - 1);
+                    }
+
+                    function goToEnd() {
+                        viewport.scrollTop = viewport.scrollHeight;
+                    }
+
+                    viewport.addEventListener('scroll', render);
+                    window.addEventListener('resize', render);
+
+                    fetch('/files/lines?path=' + encodeURIComponent(PATH) + '&start=0&count=' + PAGE + '&total=1')
+                        .then(response => response.json())
+                        .then(data => {
+                            if (data.error) {
+                                document.getElementById('info').textContent = data.error;
+                                return;
+                            }
+                            total = data.total_lines;
+                            cache = {start: 0, lines: data.lines};
+                            requested = 0;
+                            spacer.style.height = Math.min(total * LINE_HEIGHT, MAX_SCROLL) + 'px';
+                            document.getElementById('info').textContent =
+                                total.toLocaleString() + ' lines, ' + data.size.toLocaleString() + ' bytes (read-only)';
+                            render();
+                        });
+                </script>
+            </body>
+            </html>
+        `);
+    }
+
     // Функция для показа медиа-предпросмотра
     function showMediaPreview(path, name, type) {
         const previewWindow = window.open('', '_blank', 'width=800,height=600');
@@ -401,6 +657,222 @@ document.addEventListener('DOMContentLoaded', function() {
             });
     }
 
+    function escapeHtml(text) {
+        return String(text).replace(/&/g, '&amp;').replace(/</g, '&lt;').replace(/>/g, '&gt;');
+    }
+
+    // Миниатюры берутся из серверного кэша; v меняется вместе с файлом, поэтому браузер кэширует их надолго
+    function previewUrl(entry, kind, size) {
+        const params = new URLSearchParams({path: entry.path, kind: kind, size: size, v: entry.mtime || 0});
+        return `/files/thumb?${params}`;
+    }
+
+    function thumbnailHtml(entry, icon) {
+        if (entry.is_dir || !listing.thumbnails || getFileType(entry.name) !== 'image') return icon;
+        return `<img src="${previewUrl(entry, 'image', 64)}" loading="lazy" width="40" height="40"
+            style="object-fit: cover; border-radius: 4px;" alt="${icon}"
+            onerror="this.replaceWith(document.createTextNode(this.alt))">`;
+    }
+
+    // Начало текстового файла показываем подсказкой при наведении
+    function attachTextPeek(itemDiv, entry) {
+        if (entry.is_dir || getFileType(entry.name) !== 'text') return;
+        itemDiv.addEventListener('mouseenter', () => {
+            if (itemDiv.dataset.peeked) return;
+            itemDiv.dataset.peeked = '1';
+            fetch(previewUrl(entry, 'text', 64))
+                .then(response => response.ok ? response.text() : '')
+                .then(text => { if (text) itemDiv.title = text; })
+                .catch(() => {});
+        });
+    }
+
+    // Создаёт строку списка для одного элемента директории
+    function createEntryRow(entry) {
+        entry.path = entry.path.replace(/\\/g, '/'); // Normalize paths
+        const itemDiv = document.createElement('div');
+        itemDiv.className = `file-item ${entry.is_dir ? 'directory' : 'file'}`;
+        itemDiv.style.height = `${ROW_HEIGHT}px`;
+        itemDiv.style.boxSizing = 'border-box';
+        
+        // Определяем иконку в зависимости от типа файла
+        let icon = entry.is_dir ? '📁' : '📄';
+        const ext = entry.name.split('.').pop().toLowerCase();
+        if (!entry.is_dir) {
+            if (['pdf'].includes(ext)) icon = '📋';
+            else if (['doc', 'docx'].includes(ext)) icon = '📝';
+            else if (['xls', 'xlsx'].includes(ext)) icon = '📊';
+            else if (['ppt', 'pptx'].includes(ext)) icon = '📽️';
+            else if (['jpg', 'jpeg', 'png', 'gif', 'bmp'].includes(ext)) icon = '🖼️';
+            else if (['mp3', 'wav', 'ogg'].includes(ext)) icon = '🎵';
+            else if (['mp4', 'avi', 'mov'].includes(ext)) icon = '🎬';
+        }
+        
+        // Создаем HTML элемент в виде строки
+        const itemHTML = `
+            <input type="checkbox" class="select-box" ${selectedPaths.has(entry.path) ? 'checked' : ''}>
+            <span class="file-icon">${thumbnailHtml(entry, icon)}</span>
+            <span class="file-name">${entry.name}${entry.detail ? ` <small class="file-detail">${escapeHtml(entry.detail)}</small>` : ''}</span>
+            <span class="file-type">${entry.is_dir ? 'Directory' : ext.toUpperCase() || 'File'}</span>
+            <span class="file-size">${entry.size === null || entry.size === undefined ? '-' : entry.size + ' bytes'}</span>
+            <span class="file-actions">
+                ${!entry.is_dir ? `<button class="download-btn" data-path="${entry.path}">Download</button>` : `<button class="archive-btn" data-path="${entry.path}">Zip</button>`}
+                ${!entry.is_dir && getFileType(entry.name) === 'text' ? `<button class="tail-btn" data-path="${entry.path}">Tail</button>` : ''}
+                <button class="rename-btn" data-path="${entry.path}" data-name="${entry.name}">Rename</button>
+                <button class="delete-btn" data-path="${entry.path}">Delete</button>
+            </span>
+        `;
+        
+        itemDiv.innerHTML = itemHTML;
+
+        // Обработчик клика на элемент (для перехода в папку или открытия файла)
+        itemDiv.addEventListener('click', () => {
+            showPreview(entry.path, entry.name, entry.is_dir);
+        });
+
+        attachTextPeek(itemDiv, entry);
+
+        // Выбор нескольких элементов для пакетных операций
+        const selectBox = itemDiv.querySelector('.select-box');
+        selectBox.addEventListener('click', e => e.stopPropagation());
+        selectBox.addEventListener('change', () => {
+            if (selectBox.checked) selectedPaths.add(entry.path);
+            else selectedPaths.delete(entry.path);
+            updateSelectionCount();
+        });
+
+        // Обработчик для скачивания
+        itemDiv.querySelector('.download-btn')?.addEventListener('click', (e) => {
+            e.stopPropagation();
+            window.location.href = `/files/download/${encodeURIComponent(entry.path)}`;
+        });
+
+        // Скачивание папки архивом, который сервер собирает на лету
+        itemDiv.querySelector('.archive-btn')?.addEventListener('click', (e) => {
+            e.stopPropagation();
+            window.location.href = `/files/archive?format=zip&path=${encodeURIComponent(entry.path)}`;
+        });
+
+        // Слежение за дописываемым файлом (логи)
+        itemDiv.querySelector('.tail-btn')?.addEventListener('click', (e) => {
+            e.stopPropagation();
+            openTailViewer(entry.path, entry.name);
+        });
+
+        // Обработчик для переименования
+        itemDiv.querySelector('.rename-btn').addEventListener('click', (e) => {
+            e.stopPropagation();
+            const newName = prompt('Enter new name:', entry.name);
+            if (newName && newName.trim()) {
+                renameItem(entry.path, newName.trim());
+            }
+        });
+
+        // Обработчик для удаления
+        itemDiv.querySelector('.delete-btn').addEventListener('click', (e) => {
+            e.stopPropagation();
+            if (confirm(`Are you sure you want to delete "${entry.name}"?`)) {
+                // Большие деревья удаляются фоновой задачей, список обновит file_change
+                startBatch({op: 'delete', paths: [entry.path]});
+            }
+        });
+        return itemDiv;
+    }
+
+    // Виртуализированный список: в DOM только видимые строки,
+    // следующие страницы догружаются с сервера по курсору при прокрутке
+    const ROW_HEIGHT = 56;
+    const PAGE_SIZE = 500;
+    const OVERSCAN = 10;
+    const listing = {entries: [], nextCursor: null, loading: false, token: 0, first: -1, last: -1, thumbnails: false};
+    let viewport = null;
+    let spacer = null;
+    let rowsWindow = null;
+
+    function listingParams(path, cursor) {
+        const params = new URLSearchParams({
+            path: path,
+            limit: PAGE_SIZE,
+            sort: sortSelect ? sortSelect.value : 'name',
+            order: orderSelect ? orderSelect.value : 'asc'
+        });
+        if (filterInput && filterInput.value.trim()) params.set('filter', filterInput.value.trim());
+        if (cursor) params.set('cursor', cursor);
+        return params;
+    }
+
+    function renderListing(data) {
+        listing.entries = data.entries;
+        listing.nextCursor = data.next_cursor;
+        listing.loading = false;
+        listing.first = listing.last = -1;
+        listing.thumbnails = !!data.thumbnails;
+
+        viewport = document.createElement('div');
+        viewport.className = 'file-list-viewport';
+        viewport.style.maxHeight = '70vh';
+        viewport.style.overflowY = 'auto';
+        spacer = document.createElement('div');
+        spacer.style.position = 'relative';
+        rowsWindow = document.createElement('div');
+        rowsWindow.style.position = 'absolute';
+        rowsWindow.style.left = '0';
+        rowsWindow.style.right = '0';
+        spacer.appendChild(rowsWindow);
+        viewport.appendChild(spacer);
+        fileList.appendChild(viewport);
+
+        viewport.addEventListener('scroll', () => renderVisibleRows());
+        renderVisibleRows(true);
+    }
+
+    function renderVisibleRows(force = false) {
+        const total = listing.entries.length;
+        spacer.style.height = `${total * ROW_HEIGHT}px`;
+        const height = viewport.clientHeight || window.innerHeight;
+        const first = Math.max(Math.floor(viewport.scrollTop / ROW_HEIGHT) - OVERSCAN, 0);
+        const last = Math.min(Math.ceil((viewport.scrollTop + height) / ROW_HEIGHT) + OVERSCAN, total);
+
+        if (force || first !== listing.first || last !== listing.last) {
+            listing.first = first;
+            listing.last = last;
+            rowsWindow.style.top = `${first * ROW_HEIGHT}px`;
+            const fragment = document.createDocumentFragment();
+            for (let i = first; i < last; i++) {
+                fragment.appendChild(createEntryRow(listing.entries[i]));
+            }
+            rowsWindow.innerHTML = '';
+            rowsWindow.appendChild(fragment);
+        }
+
+        // Близко к концу загруженного — просим следующую страницу
+        if (last >= total - OVERSCAN && listing.nextCursor && !listing.loading) {
+            loadNextPage();
+        }
+    }
+
+    function loadNextPage() {
+        const token = listing.token;
+        listing.loading = true;
+        fetch(`/files/list?${listingParams(currentPath, listing.nextCursor)}`)
+            .then(response => response.json())
+            .then(data => {
+                if (token !== listing.token) return;
+                listing.loading = false;
+                if (data.error) {
+                    showNotification('Error loading directory: ' + data.error, 'error');
+                    return;
+                }
+                listing.entries = listing.entries.concat(data.entries || []);
+                listing.nextCursor = data.next_cursor;
+                renderVisibleRows(true);
+            })
+            .catch(error => {
+                listing.loading = false;
+                console.error('Error loading directory page:', error);
+            });
+    }
+
     // Основная функция для отображения содержимого директории
     function listDirectory(path, addToHist = true) {
         if (addToHist && (pathHistory[currentIndex] !== path)) {
@@ -410,10 +882,13 @@ document.addEventListener('DOMContentLoaded', function() {
             currentPath = path;
             updateNavButtons();
         }
-        
-        fetch(`/files/list?path=${encodeURIComponent(path)}`)
+
+        // Ответы на устаревшие запросы (пользователь уже ушёл в другую папку) игнорируем
+        const token = ++listing.token;
+        fetch(`/files/list?${listingParams(path, null)}`)
             .then(response => response.json())
             .then(data => {
+                if (token !== listing.token) return;
                 if (data.error) {
                     console.error('API Error:', data.error);
                     showNotification('Error loading directory: ' + data.error, 'error');
@@ -466,108 +941,95 @@ document.addEventListener('DOMContentLoaded', function() {
                 `;
                 fileList.appendChild(headerDiv);
 
-                data.entries.forEach(entry => {
-                    entry.path = entry.path.replace(/\\/g, '/'); // Normalize paths
-                    const itemDiv = document.createElement('div');
-                    itemDiv.className = `file-item ${entry.is_dir ? 'directory' : 'file'}`;
-                    
-                    // Определяем иконку в зависимости от типа файла
-                    let icon = entry.is_dir ? '📁' : '📄';
-                    const ext = entry.name.split('.').pop().toLowerCase();
-                    if (!entry.is_dir) {
-                        if (['pdf'].includes(ext)) icon = '📋';
-                        else if (['doc', 'docx'].includes(ext)) icon = '📝';
-                        else if (['xls', 'xlsx'].includes(ext)) icon = '📊';
-                        else if (['ppt', 'pptx'].includes(ext)) icon = '📽️';
-                        else if (['jpg', 'jpeg', 'png', 'gif', 'bmp'].includes(ext)) icon = '🖼️';
-                        else if (['mp3', 'wav', 'ogg'].includes(ext)) icon = '🎵';
-                        else if (['mp4', 'avi', 'mov'].includes(ext)) icon = '🎬';
-                    }
-                    
-                    // Создаем HTML элемент в виде строки
-                    const itemHTML = `
-                        <span class="file-icon">${icon}</span>
-                        <span class="file-name">${entry.name}</span>
-                        <span class="file-type">${entry.is_dir ? 'Directory' : ext.toUpperCase() || 'File'}</span>
-                        <span class="file-size">${entry.is_dir ? '-' : entry.size + ' bytes'}</span>
-                        <span class="file-actions">
-                            ${!entry.is_dir ? `<button class="download-btn" data-path="${entry.path}">Download</button>` : ''}
-                            <button class="rename-btn" data-path="${entry.path}" data-name="${entry.name}">Rename</button>
-                            <button class="delete-btn" data-path="${entry.path}">Delete</button>
-                        </span>
-                    `;
-                    
-                    itemDiv.innerHTML = itemHTML;
-                    fileList.appendChild(itemDiv);
-
-                    // Обработчик клика на элемент (для перехода в папку или открытия файла)
-                    itemDiv.addEventListener('click', () => {
-                        showPreview(entry.path, entry.name, entry.is_dir);
-                    });
-
-                    // Обработчик для скачивания
-                    itemDiv.querySelector('.download-btn')?.addEventListener('click', (e) => {
-                        e.stopPropagation();
-                        window.location.href = `/files/download/${encodeURIComponent(entry.path)}`;
-                    });
-
-                    // Обработчик для переименования
-                    itemDiv.querySelector('.rename-btn').addEventListener('click', (e) => {
-                        e.stopPropagation();
-                        const newName = prompt('Enter new name:', entry.name);
-                        if (newName && newName.trim()) {
-                            renameItem(entry.path, newName.trim());
-                        }
-                    });
-
-                    // Обработчик для удаления
-                    itemDiv.querySelector('.delete-btn').addEventListener('click', (e) => {
-                        e.stopPropagation();
-                        if (confirm(`Are you sure you want to delete "${entry.name}"?`)) {
-                            fetch('/files/delete', {
-                                method: 'POST',
-                                headers: {'Content-Type': 'application/json'},
-                                body: JSON.stringify({path: entry.path})
-                            }).then(response => {
-                                if(response.ok) {
-                                    listDirectory(currentPath, false);
-                                } else {
-                                    showNotification('Error deleting item', 'error');
-                                }
-                            }).catch(error => {
-                                alert('Network error: ' + error.message);
-                            });
-                        }
-                    });
-                });
+                renderListing(data);
             }).catch(error => {
                 console.error('Error loading directory:', error);
                 alert('Error loading directory: ' + error.message);
             });
     }
 
-    // Обработчик загрузки файлов
-    uploadBtn.addEventListener('click', () => fileInput.click());
-    fileInput.addEventListener('change', (e) => {
-        const formData = new FormData();
-        for (let file of e.target.files) {
-            formData.append('file', file);
-        }
-        formData.append('path', currentPath);
+    // Загрузка файлов по частям: несколько частей параллельно,
+    // после обрыва загрузка продолжается с уже полученных сервером диапазонов
+    const UPLOAD_PARALLEL = 4;
+
+    function uploadKey(file, path) {
+        return `vpscope-upload:${path}:${file.name}:${file.size}:${file.lastModified}`;
+    }
 
-        fetch('/files/upload', {
+    async function startOrResumeUpload(file, path) {
+        const key = uploadKey(file, path);
+        const savedId = localStorage.getItem(key);
+        if (savedId) {
+            const response = await fetch(`/files/upload/${savedId}`);
+            if (response.ok) return response.json();
+            localStorage.removeItem(key);
+        }
+        const response = await fetch('/files/upload/init', {
             method: 'POST',
-            body: formData
-        }).then(response => {
-            if(response.ok) {
-                fileInput.value = '';
-                listDirectory(currentPath, false);
-            } else {
-                showNotification('Error uploading file', 'error');
-            }
-        }).catch(error => {
-            showNotification('Network error: ' + error.message, 'error');
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({path: path, filename: file.name, size: file.size})
         });
+        const status = await response.json();
+        if (!response.ok) throw new Error(status.error);
+        localStorage.setItem(key, status.upload_id);
+        return status;
+    }
+
+    async function uploadFileChunked(file, path) {
+        const status = await startOrResumeUpload(file, path);
+        const chunkSize = status.chunk_size;
+
+        // Делим недостающие диапазоны на части не больше chunk_size
+        const chunks = [];
+        for (const [start, end] of status.missing) {
+            for (let offset = start; offset < end; offset += chunkSize) {
+                chunks.push([offset, Math.min(offset + chunkSize, end)]);
+            }
+        }
+
+        let sent = status.received_bytes;
+        const worker = async () => {
+            while (chunks.length) {
+                const [start, end] = chunks.shift();
+                const response = await fetch(`/files/upload/${status.upload_id}?offset=${start}`, {
+                    method: 'PUT',
+                    headers: {'Content-Type': 'application/octet-stream'},
+                    body: file.slice(start, end)
+                });
+                if (!response.ok) {
+                    const data = await response.json().catch(() => ({}));
+                    throw new Error(data.error || `HTTP ${response.status}`);
+                }
+                sent += end - start;
+                uploadBtn.textContent = `${file.name}: ${Math.floor(sent * 100 / (file.size || 1))}%`;
+            }
+        };
+        await Promise.all(Array.from({length: UPLOAD_PARALLEL}, worker));
+
+        const response = await fetch(`/files/upload/${status.upload_id}/finalize`, {method: 'POST'});
+        const data = await response.json();
+        if (!response.ok) throw new Error(data.error);
+        localStorage.removeItem(uploadKey(file, path));
+        return data;
+    }
+
+    // Обработчик загрузки файлов
+    uploadBtn.addEventListener('click', () => fileInput.click());
+    fileInput.addEventListener('change', async (e) => {
+        const path = currentPath;
+        const uploadLabel = uploadBtn.textContent;
+        uploadBtn.disabled = true;
+        for (const file of Array.from(e.target.files)) {
+            try {
+                await uploadFileChunked(file, path);
+            } catch (error) {
+                showNotification(`Error uploading ${file.name}: ${error.message}`, 'error');
+            }
+        }
+        uploadBtn.textContent = uploadLabel;
+        uploadBtn.disabled = false;
+        fileInput.value = '';
+        listDirectory(currentPath, false);
     });
 
     // Обработчик создания нового файла или папки
@@ -617,6 +1079,256 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     });
 
+    // Поиск по индексу: результаты приходят потоком NDJSON и показываются по мере поступления
+    function searchFiles() {
+        const query = searchInput.value.trim();
+        if (!query) {
+            listDirectory(currentPath, false);
+            return;
+        }
+        const params = new URLSearchParams({
+            q: query,
+            mode: searchMode.value,
+            regex: searchRegex.checked ? '1' : '0',
+            path: currentPath
+        });
+        if (filterInput && filterInput.value.trim()) params.set('glob', filterInput.value.trim());
+
+        const token = ++listing.token;
+        fileList.innerHTML = '';
+        const headerDiv = document.createElement('div');
+        headerDiv.className = 'file-list-header';
+        headerDiv.textContent = 'Searching...';
+        fileList.appendChild(headerDiv);
+        renderListing({entries: [], next_cursor: null});
+
+        fetch(`/files/search?${params}`).then(response => {
+            if (!response.ok) {
+                return response.json().then(data => { throw new Error(data.error); });
+            }
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            let header = null;
+            const pump = () => reader.read().then(({done, value}) => {
+                if (token !== listing.token) {
+                    reader.cancel();
+                    return;
+                }
+                buffer += decoder.decode(value || new Uint8Array(), {stream: !done});
+                const lines = buffer.split('\n');
+                buffer = lines.pop();
+                for (const line of lines) {
+                    if (!line) continue;
+                    const item = JSON.parse(line);
+                    if (!header) {
+                        header = item;
+                        if (item.building) headerDiv.textContent = 'Searching (index is still being built)...';
+                    } else if (item.done) {
+                        headerDiv.textContent = `${item.count} result(s) for "${query}" in ${item.elapsed_ms} ms`;
+                    } else {
+                        if (item.line) item.detail = `:${item.line}  ${item.text}`;
+                        listing.entries.push(item);
+                    }
+                }
+                renderVisibleRows(true);
+                if (!done) return pump();
+            });
+            return pump();
+        }).catch(error => {
+            headerDiv.textContent = '';
+            showNotification('Search error: ' + error.message, 'error');
+        });
+    }
+
+    if (searchBtn) {
+        searchBtn.addEventListener('click', searchFiles);
+        searchInput.addEventListener('keydown', e => {
+            if (e.key === 'Enter') searchFiles();
+        });
+    }
+
+    // Пакетные операции над выбранными элементами выполняются на сервере фоновыми задачами
+    const selectedPaths = new Set();
+    const selectionCount = document.getElementById('selection-count');
+    const jobStatus = document.getElementById('job-status');
+    const jobCancelBtn = document.getElementById('job-cancel-btn');
+    let activeJobId = null;
+
+    function updateSelectionCount() {
+        if (selectionCount) selectionCount.textContent = `${selectedPaths.size} selected`;
+    }
+
+    function startBatch(payload) {
+        fetch('/files/batch', {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify(payload)
+        }).then(response => response.json()).then(data => {
+            if (data.error) {
+                showNotification('Error: ' + data.error, 'error');
+                return;
+            }
+            activeJobId = data.job.id;
+            showJob(data.job);
+        }).catch(error => {
+            showNotification('Network error: ' + error.message, 'error');
+        });
+    }
+
+    function showJob(job) {
+        if (!jobStatus) return;
+        let text = `${job.op}: ${job.items_done}/${job.items_total} items, ${job.entries} entries`;
+        if (job.bytes) text += `, ${formatSize(job.bytes)}`;
+        if (job.error_count) text += `, ${job.error_count} errors`;
+        jobStatus.textContent = `${text} (${job.state})`;
+        const running = job.state === 'queued' || job.state === 'running';
+        jobCancelBtn.style.display = running && job.id === activeJobId ? '' : 'none';
+    }
+
+    socket.on('job_progress', job => {
+        showJob(job);
+        if (['done', 'failed', 'cancelled'].includes(job.state)) {
+            if (job.error_count) {
+                showNotification(`${job.op} finished with ${job.error_count} errors: ` +
+                    job.errors.map(e => `${e.path}: ${e.error}`).slice(0, 3).join('; '), 'error');
+            } else if (job.state === 'done') {
+                showNotification(`${job.op} finished`, 'success');
+            }
+            if (job.id === activeJobId) activeJobId = null;
+        }
+    });
+
+    socket.on('job_error', data => showNotification('Job error: ' + data.error, 'error'));
+
+    if (jobCancelBtn) {
+        jobCancelBtn.addEventListener('click', () => {
+            if (activeJobId) socket.emit('job_cancel', {id: activeJobId});
+        });
+    }
+
+    function batchSelection(op, extra = {}) {
+        if (!selectedPaths.size) {
+            showNotification('Nothing selected', 'error');
+            return;
+        }
+        startBatch(Object.assign({op: op, paths: Array.from(selectedPaths)}, extra));
+        selectedPaths.clear();
+        updateSelectionCount();
+    }
+
+    const batchButtons = {
+        'batch-move-btn': () => {
+            const dest = prompt('Move to directory:', currentPath);
+            if (dest) batchSelection('move', {dest: dest});
+        },
+        'batch-copy-btn': () => {
+            const dest = prompt('Copy to directory:', currentPath);
+            if (dest) batchSelection('copy', {dest: dest});
+        },
+        'batch-chmod-btn': () => {
+            const mode = prompt('Mode (octal):', '644');
+            if (mode) batchSelection('chmod', {mode: mode, recursive: confirm('Apply to directory contents too?')});
+        },
+        'batch-delete-btn': () => {
+            if (selectedPaths.size && confirm(`Delete ${selectedPaths.size} selected items?`)) batchSelection('delete');
+        },
+        'batch-archive-btn': () => {
+            if (!selectedPaths.size) return;
+            const params = new URLSearchParams({format: 'zip'});
+            selectedPaths.forEach(path => params.append('path', path));
+            window.location.href = `/files/archive?${params}`;
+        }
+    };
+    Object.entries(batchButtons).forEach(([id, handler]) => {
+        const btn = document.getElementById(id);
+        if (btn) btn.addEventListener('click', handler);
+    });
+
+    // Анализ занятого места: сканирование идёт в фоне, прогресс приходит по сокету
+    function formatSize(bytes) {
+        const units = ['B', 'KB', 'MB', 'GB', 'TB'];
+        let i = 0;
+        while (bytes >= 1024 && i < units.length - 1) {
+            bytes /= 1024;
+            i++;
+        }
+        return `${bytes.toFixed(i ? 1 : 0)} ${units[i]}`;
+    }
+
+    function renderDuNode(node, parentSize) {
+        const percent = parentSize ? (node.size * 100 / parentSize) : 100;
+        const item = document.createElement('li');
+        item.innerHTML = `
+            <div style="display: flex; gap: 0.5rem; align-items: center; cursor: pointer;">
+                <div style="width: 120px; background: #ecf0f1; height: 10px; border-radius: 4px;">
+                    <div style="width: ${percent.toFixed(1)}%; background: #e67e22; height: 10px; border-radius: 4px;"></div>
+                </div>
+                <span>${escapeHtml(node.name)}</span>
+                <small>${formatSize(node.size)} · ${node.files} files</small>
+            </div>`;
+        item.firstElementChild.addEventListener('click', () => {
+            addToHistory(node.path.replace(/\\/g, '/'));
+            listDirectory(node.path.replace(/\\/g, '/'), false);
+        });
+        if (node.children && node.children.length) {
+            const list = document.createElement('ul');
+            node.children.forEach(child => list.appendChild(renderDuNode(child, node.size)));
+            item.appendChild(list);
+        }
+        return item;
+    }
+
+    function showDiskUsage(path) {
+        fetch(`/files/du?path=${encodeURIComponent(path)}&depth=2&top=10`)
+            .then(response => response.json())
+            .then(data => {
+                if (data.error) return;
+                duPanel.innerHTML = '';
+                const tree = document.createElement('ul');
+                tree.appendChild(renderDuNode(data.tree, 0));
+                duPanel.appendChild(tree);
+            });
+    }
+
+    socket.on('du_progress', data => {
+        if (data.error) {
+            duStatus.textContent = 'Scan failed: ' + data.error;
+            return;
+        }
+        duStatus.textContent = `${data.done ? 'Scanned' : 'Scanning'}: ${data.dirs} dirs, ` +
+            `${data.files} files, ${formatSize(data.bytes)} (${data.elapsed}s)`;
+        if (data.done) {
+            showDiskUsage(data.root);
+            listDirectory(currentPath, false); // размеры папок появятся в списке
+        }
+    });
+
+    if (duBtn) {
+        duBtn.addEventListener('click', () => {
+            duStatus.textContent = 'Scanning...';
+            fetch('/files/du/scan', {
+                method: 'POST',
+                headers: {'Content-Type': 'application/json'},
+                body: JSON.stringify({path: currentPath})
+            }).then(response => response.json()).then(data => {
+                if (data.error) showNotification('Disk usage error: ' + data.error, 'error');
+            });
+        });
+    }
+
+    // Сортировка и фильтр выполняются на сервере
+    let filterTimer = null;
+    if (filterInput) {
+        filterInput.addEventListener('input', () => {
+            clearTimeout(filterTimer);
+            filterTimer = setTimeout(() => listDirectory(currentPath, false), 300);
+        });
+    }
+    [sortSelect, orderSelect].forEach(select => {
+        if (select) select.addEventListener('change', () => listDirectory(currentPath, false));
+    });
+
     // Инициализация: показываем содержимое корневой директории и диски
     updateNavButtons(); // Инициализируем кнопки навигации
     showDrives();
@@ -0,0 +1,50 @@
+document.addEventListener('DOMContentLoaded', function() {
+    const fleetList = document.getElementById('fleet-list');
+
+    function formatUptime(seconds) {
+        const days = Math.floor(seconds / (3600 * 24));
+        const hours = Math.floor((seconds % (3600 * 24)) / 3600);
+        const minutes = Math.floor((seconds % 3600) / 60);
+        return `${days}d ${hours}h ${minutes}m`;
+    }
+
+    function percent(value) {
+        return typeof value === 'number' ? `${value.toFixed(1)}%` : '-';
+    }
+
+    function renderFleet(data) {
+        fleetList.innerHTML = '';
+        data.hosts.forEach(host => {
+            const metrics = host.data || {};
+            let status = host.status;
+            if (host.error) status += ` (${host.error})`;
+            if (host.age !== undefined && host.status !== 'up') status += `, last seen ${host.age}s ago`;
+
+            const row = document.createElement('tr');
+            row.innerHTML = `
+                <td>${host.name}</td>
+                <td>${metrics.hostname || '-'}</td>
+                <td>${status}</td>
+                <td>${percent(metrics.cpu_percent)}</td>
+                <td>${percent(metrics.ram_percent)}</td>
+                <td>${percent(metrics.disk_percent)}</td>
+                <td>${metrics.load_avg ? metrics.load_avg.map(v => v.toFixed(2)).join(' ') : '-'}</td>
+                <td>${metrics.uptime_seconds !== undefined ? formatUptime(metrics.uptime_seconds) : '-'}</td>
+                <td>${host.latency_ms !== undefined ? host.latency_ms + ' ms' : '-'}</td>
+            `;
+            fleetList.appendChild(row);
+        });
+    }
+
+    function fetchFleet() {
+        fetch('/fleet/snapshot')
+            .then(response => response.json())
+            .then(renderFleet)
+            .catch(error => {
+                console.error('Error fetching fleet:', error);
+            });
+    }
+
+    fetchFleet();
+    setInterval(fetchFleet, 5000);
+});
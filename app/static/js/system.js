@@ -105,115 +105,117 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
 
-    function fetchMetrics() {
-        fetch('/system/metrics')
-            .then(response => response.json())
-            .then(data => {
-                // Обновляем основные метрики
-                cpuValue.textContent = `${data.total_cpu_processes.toFixed(1)}%`;  // ← Исправлено
-                ramValue.textContent = `${data.ram_percent.toFixed(1)}%`;
-                diskValue.textContent = `${data.disk_percent.toFixed(1)}%`;
-
-                // Обновляем прогресс-бары
-                cpuBar.style.width = `${data.total_cpu_processes}%`;  // ← Исправлено
-                ramBar.style.width = `${data.ram_percent}%`;
-                diskBar.style.width = `${data.disk_percent}%`;
-
-                // Обновляем дополнительные метрики
-                if (cpuCount) cpuCount.textContent = data.cpu_count;
-                if (cpuFreq) cpuFreq.textContent = `${data.cpu_freq_current} MHz`;
-                if (ramUsed) ramUsed.textContent = formatBytes(data.ram_used);
-                if (ramTotal) ramTotal.textContent = formatBytes(data.ram_total);
-                if (diskUsed) diskUsed.textContent = formatBytes(data.disk_used);
-                if (diskTotal) diskTotal.textContent = formatBytes(data.disk_total);
-                if (uptime) uptime.textContent = formatUptime(data.uptime_seconds);
-
-                // Обновляем процессы
-                if (processesList) {
-                    processesList.innerHTML = '';
-                    data.processes.forEach(proc => {
-                        const row = document.createElement('tr');
-                        row.innerHTML = `
-                            <td>${proc.pid}</td>
-                            <td>${proc.name}</td>
-                            <td>${proc.cpu_percent.toFixed(1)}%</td>
-                            <td>${proc.memory_percent.toFixed(1)}%</td>
-                        `;
-                        processesList.appendChild(row);
-                    });
-                    // Применяем фильтр после обновления
-                    if (processSearchValue) {
-                        filterProcesses(processSearchValue);
-                    }
-                }
+    function renderMetrics(data) {
+        // Обновляем основные метрики
+        cpuValue.textContent = `${data.total_cpu_processes.toFixed(1)}%`;  // ← Исправлено
+        ramValue.textContent = `${data.ram_percent.toFixed(1)}%`;
+        diskValue.textContent = `${data.disk_percent.toFixed(1)}%`;
 
-                // Обновляем диски
-                if (disksList) {
-                    disksList.innerHTML = '';
-                    data.all_disks.forEach(disk => {
-                        const row = document.createElement('tr');
-                        row.innerHTML = `
-                            <td>${disk.device}</td>
-                            <td>${disk.mountpoint}</td>
-                            <td>${formatBytes(disk.used)}</td>
-                            <td>${formatBytes(disk.total)}</td>
-                            <td>${disk.percent}%</td>
-                        `;
-                        disksList.appendChild(row);
-                    });
-                }
+        // Обновляем прогресс-бары
+        cpuBar.style.width = `${data.total_cpu_processes}%`;  // ← Исправлено
+        ramBar.style.width = `${data.ram_percent}%`;
+        diskBar.style.width = `${data.disk_percent}%`;
 
-                // Обновляем сеть (в байтах/с)
-                const currentTime = Date.now();
-                let sentRate = 0;
-                let recvRate = 0;
-
-                if (!firstFetch) {
-                    const timeDiff = (currentTime - lastTime) / 1000; // в секундах
-                    if (timeDiff > 0) {
-                        sentRate = (data.net_sent - lastNetSent) / timeDiff;
-                        recvRate = (data.net_recv - lastNetRecv) / timeDiff;
-                    }
-                } else {
-                    firstFetch = false;
-                }
+        // Обновляем дополнительные метрики
+        if (cpuCount) cpuCount.textContent = data.cpu_count;
+        if (cpuFreq) cpuFreq.textContent = `${data.cpu_freq_current} MHz`;
+        if (ramUsed) ramUsed.textContent = formatBytes(data.ram_used);
+        if (ramTotal) ramTotal.textContent = formatBytes(data.ram_total);
+        if (diskUsed) diskUsed.textContent = formatBytes(data.disk_used);
+        if (diskTotal) diskTotal.textContent = formatBytes(data.disk_total);
+        if (uptime) uptime.textContent = formatUptime(data.uptime_seconds);
 
-                if (netSent) netSent.textContent = formatBytes(sentRate) + '/s';
-                if (netRecv) netRecv.textContent = formatBytes(recvRate) + '/s';
-
-                lastNetSent = data.net_sent;
-                lastNetRecv = data.net_recv;
-                lastTime = currentTime;
-
-                // Температура
-                if (tempDisplay && Object.keys(data.temperatures).length > 0) {
-                    tempDisplay.innerHTML = '';
-                    for (const [name, sensors] of Object.entries(data.temperatures)) {
-                        sensors.forEach(sensor => {
-                            const div = document.createElement('div');
-                            div.textContent = `${sensor.label}: ${sensor.current.toFixed(1)}°C`;
-                            tempDisplay.appendChild(div);
-                        });
-                    }
-                } else if (tempDisplay) {
-                    tempDisplay.textContent = 'N/A';
-                }
+        // Обновляем процессы
+        if (processesList) {
+            processesList.innerHTML = '';
+            data.processes.forEach(proc => {
+                const row = document.createElement('tr');
+                row.innerHTML = `
+                    <td>${proc.pid}</td>
+                    <td>${proc.name}</td>
+                    <td>${proc.cpu_percent.toFixed(1)}%</td>
+                    <td>${proc.memory_percent.toFixed(1)}%</td>
+                `;
+                processesList.appendChild(row);
+            });
+            // Применяем фильтр после обновления
+            if (processSearchValue) {
+                filterProcesses(processSearchValue);
+            }
+        }
 
-                // Обновляем график — используем сумму CPU процессов
-                chart.data.datasets[0].data.push(data.total_cpu_processes);
-                chart.data.datasets[1].data.push(data.ram_percent);
-                chart.data.datasets[2].data.push(data.disk_percent);
-
-                chart.data.labels.push('');
-                if (chart.data.datasets[0].data.length > 10) {
-                    chart.data.datasets[0].data.shift();
-                    chart.data.datasets[1].data.shift();
-                    chart.data.datasets[2].data.shift();
-                    chart.data.labels.shift();
-                }
+        // Обновляем диски
+        if (disksList) {
+            disksList.innerHTML = '';
+            data.all_disks.forEach(disk => {
+                const row = document.createElement('tr');
+                row.innerHTML = `
+                    <td>${disk.device}</td>
+                    <td>${disk.mountpoint}</td>
+                    <td>${formatBytes(disk.used)}</td>
+                    <td>${formatBytes(disk.total)}</td>
+                    <td>${disk.percent}%</td>
+                `;
+                disksList.appendChild(row);
+            });
+        }
 
-                chart.update();
-            })
+        // Обновляем сеть (в байтах/с)
+        const currentTime = Date.now();
+        let sentRate = 0;
+        let recvRate = 0;
+
+        if (!firstFetch) {
+            const timeDiff = (currentTime - lastTime) / 1000; // в секундах
+            if (timeDiff > 0) {
+                sentRate = (data.net_sent - lastNetSent) / timeDiff;
+                recvRate = (data.net_recv - lastNetRecv) / timeDiff;
+            }
+        } else {
+            firstFetch = false;
+        }
+
+        if (netSent) netSent.textContent = formatBytes(sentRate) + '/s';
+        if (netRecv) netRecv.textContent = formatBytes(recvRate) + '/s';
+
+        lastNetSent = data.net_sent;
+        lastNetRecv = data.net_recv;
+        lastTime = currentTime;
+
+        // Температура
+        if (tempDisplay && Object.keys(data.temperatures).length > 0) {
+            tempDisplay.innerHTML = '';
+            for (const [name, sensors] of Object.entries(data.temperatures)) {
+                sensors.forEach(sensor => {
+                    const div = document.createElement('div');
+                    div.textContent = `${sensor.label}: ${sensor.current.toFixed(1)}°C`;
+                    tempDisplay.appendChild(div);
+                });
+            }
+        } else if (tempDisplay) {
+            tempDisplay.textContent = 'N/A';
+        }
+
+        // Обновляем график — используем сумму CPU процессов
+        chart.data.datasets[0].data.push(data.total_cpu_processes);
+        chart.data.datasets[1].data.push(data.ram_percent);
+        chart.data.datasets[2].data.push(data.disk_percent);
+
+        chart.data.labels.push('');
+        if (chart.data.datasets[0].data.length > 10) {
+            chart.data.datasets[0].data.shift();
+            chart.data.datasets[1].data.shift();
+            chart.data.datasets[2].data.shift();
+            chart.data.labels.shift();
+        }
+
+        chart.update();
+    }
+
+    function fetchMetrics() {
+        fetch('/system/metrics')
+            .then(response => response.json())
+            .then(renderMetrics)
             .catch(error => {
                 console.error('Error fetching metrics:', error);
             });
@@ -226,6 +228,86 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
 
-    fetchMetrics();
-    setInterval(fetchMetrics, 3000); // Обновлять каждые 3 секунды
+    // Заполняем график сохранённой историей, чтобы он не был пустым после перезагрузки
+    function loadHistory() {
+        const now = Date.now() / 1000;
+        const params = new URLSearchParams({
+            metric: 'total_cpu_processes,ram_percent,disk_percent',
+            from: now - 60,
+            to: now,
+            step: 3
+        });
+        fetch(`/system/history?${params}`)
+            .then(response => response.json())
+            .then(data => {
+                if (!data.series) return;
+                data.series.forEach((series, i) => {
+                    const values = series.points.slice(-10).map(point => point[2]);
+                    if (values.length === 0) return;
+                    const padding = Array(Math.max(10 - values.length, 0)).fill(0);
+                    chart.data.datasets[i].data = padding.concat(values);
+                });
+                chart.update();
+            })
+            .catch(error => {
+                console.error('Error loading metrics history:', error);
+            });
+    }
+
+    loadHistory();
+
+    // Сервер сам присылает новые снимки метрик через Socket.IO:
+    // один полный снимок, затем только изменения (дельты)
+    let pollTimer = null;
+    let metricsState = null;
+    let metricsSeq = 0;
+    const socket = io('/metrics');
+
+    function applyDelta(delta) {
+        Object.assign(metricsState, delta.changed);
+        delta.removed.forEach(key => delete metricsState[key]);
+
+        if (delta.processes) {
+            const byPid = new Map(metricsState.processes.map(proc => [proc.pid, proc]));
+            delta.processes.removed.forEach(pid => byPid.delete(pid));
+            delta.processes.upsert.forEach(proc => byPid.set(proc.pid, proc));
+            const order = delta.processes.order || metricsState.processes.map(proc => proc.pid);
+            metricsState.processes = order.filter(pid => byPid.has(pid)).map(pid => byPid.get(pid));
+        }
+    }
+
+    socket.on('metrics_full', message => {
+        if (!message.data) return;
+        metricsState = message.data;
+        metricsSeq = message.seq;
+        renderMetrics(metricsState);
+    });
+
+    socket.on('metrics_delta', delta => {
+        if (delta.full) {
+            metricsState = delta.data;
+        } else if (!metricsState || delta.seq !== metricsSeq + 1) {
+            // Пропустили обновление — просим полный снимок
+            metricsState = null;
+            socket.emit('metrics_resync');
+            return;
+        } else {
+            applyDelta(delta);
+        }
+        metricsSeq = delta.seq;
+        renderMetrics(metricsState);
+    });
+    socket.on('connect', () => {
+        if (pollTimer) {
+            clearInterval(pollTimer);
+            pollTimer = null;
+        }
+    });
+    socket.on('connect_error', () => {
+        // Запасной вариант: опрос по HTTP, пока сокет недоступен
+        if (!pollTimer) {
+            fetchMetrics();
+            pollTimer = setInterval(fetchMetrics, 3000);
+        }
+    });
 });
\ No newline at end of file
@@ -3,35 +3,148 @@ document.addEventListener('DOMContentLoaded', function() {
     const input = document.getElementById('terminal-input');
     const socket = io('http://' + document.domain + ':' + location.port + '/terminal');
 
+    // Сессия с PTY живёт на сервере, после перезагрузки страницы подключаемся к ней снова
+    const SESSION_KEY = 'terminalSession';
+    const MAX_OUTPUT_CHARS = 500000;
+    let sessionId = localStorage.getItem(SESSION_KEY);
+    let ptyMode = false;
+    let exited = false;
+    let queued = '';
+    let ackOffset = 0;
+    let renderScheduled = false;
+
+    // Вывод копится и дорисовывается раз в кадр; подтверждение (ack) отправляем после отрисовки
+    function write(text) {
+        queued += text;
+        if (!renderScheduled) {
+            renderScheduled = true;
+            requestAnimationFrame(render);
+        }
+    }
+
+    function render() {
+        renderScheduled = false;
+        if (queued) {
+            output.appendChild(document.createTextNode(queued));
+            queued = '';
+            output.normalize();
+            const text = output.textContent;
+            if (text.length > MAX_OUTPUT_CHARS) output.textContent = text.slice(-MAX_OUTPUT_CHARS);
+            output.scrollTop = output.scrollHeight;
+        }
+        if (ptyMode && sessionId && ackOffset) socket.emit('term_ack', {id: sessionId, offset: ackOffset});
+    }
+
+    function terminalSize() {
+        const style = getComputedStyle(output);
+        const charWidth = parseFloat(style.fontSize) * 0.6 || 8;
+        const lineHeight = parseFloat(style.lineHeight) || 16;
+        return {
+            cols: Math.max(20, Math.floor(output.clientWidth / charWidth)),
+            rows: Math.max(5, Math.floor(output.clientHeight / lineHeight))
+        };
+    }
+
+    // После обрыва связи сервер досылает вывод с последнего показанного смещения,
+    // после перезагрузки страницы (offset 0) — всю сохранённую историю
+    function openSession() {
+        exited = false;
+        socket.emit('term_open', Object.assign({id: sessionId, offset: sessionId ? ackOffset : 0}, terminalSize()));
+    }
+
     socket.on('connect', function() {
-        output.innerHTML += '$ Connected to server\n';
+        write('$ Connected to server\n');
+        openSession();
     });
 
     socket.on('connect_error', function(err) {
-        output.innerHTML += 'Connection error: ' + err.message + '\n';
-        output.scrollTop = output.scrollHeight;
+        write('Connection error: ' + err.message + '\n');
     });
 
     socket.on('disconnect', function() {
-        output.innerHTML += 'Disconnected from server\n';
-        output.scrollTop = output.scrollHeight;
+        write('Disconnected from server\n');
+    });
+
+    socket.on('term_ready', function(data) {
+        ptyMode = data.pty;
+        if (!ptyMode) return; // Нет PTY (Windows): команды выполняются по одной через run_command
+        if (data.id !== sessionId) ackOffset = 0;
+        sessionId = data.id;
+        localStorage.setItem(SESSION_KEY, sessionId);
+        if (data.reattached && !ackOffset) write('[Reattached to running session]\n');
+    });
+
+    socket.on('term_output', function(data) {
+        if (data.id && data.id !== sessionId) return;
+        if (data.dropped) write(`\n[${data.dropped} bytes of output were dropped from the scrollback]\n`);
+        write(data.data);
+        if (data.offset) ackOffset = data.offset;
+    });
+
+    socket.on('term_exit', function(data) {
+        if (data.id !== sessionId) return;
+        write(`\n[Shell exited with code ${data.code}; press Enter to start a new one]\n`);
+        exited = true;
+        sessionId = null;
+        ackOffset = 0;
+        localStorage.removeItem(SESSION_KEY);
+    });
+
+    socket.on('term_detached', function() {
+        write('\n[Session was opened in another window]\n');
+        ptyMode = false;
+    });
+
+    socket.on('term_error', function(data) {
+        write('Error: ' + data.error + '\n');
+        if (data.error === 'Session not found') {
+            sessionId = null;
+            localStorage.removeItem(SESSION_KEY);
+            openSession();
+        }
     });
 
     socket.on('cmd_output', function(data) {
-        if (data.output) output.innerHTML += data.output + '\n';
-        if (data.exit !== undefined) output.innerHTML += `[Process finished with code ${data.exit}]\n`;
-        output.scrollTop = output.scrollHeight;
+        if (data.output) write(data.output + '\n');
+        if (data.exit !== undefined) write(`[Process finished with code ${data.exit}]\n`);
     });
 
-    input.addEventListener('keypress', function(e) {
+    input.addEventListener('keydown', function(e) {
+        // Ctrl-C / Ctrl-D / Ctrl-Z уходят в оболочку, если нет выделенного текста
+        if (ptyMode && sessionId && e.ctrlKey && !window.getSelection().toString()) {
+            const keys = {c: '\x03', d: '\x04', z: '\x1a'};
+            const key = keys[e.key.toLowerCase()];
+            if (key) {
+                e.preventDefault();
+                socket.emit('term_input', {id: sessionId, data: key});
+                return;
+            }
+        }
         if (e.key === 'Enter') {
             const command = input.value;
-            output.innerHTML += '$ ' + command + '\n';
-            socket.emit('run_command', {command: command});
             input.value = '';
+            if (exited) {
+                openSession();
+                return;
+            }
+            if (ptyMode && sessionId) {
+                // Оболочка сама выводит эхо введённой строки
+                socket.emit('term_input', {id: sessionId, data: command + '\n'});
+            } else {
+                write('$ ' + command + '\n');
+                socket.emit('run_command', {command: command});
+            }
         }
     });
 
+    let resizeTimer = null;
+    window.addEventListener('resize', () => {
+        clearTimeout(resizeTimer);
+        resizeTimer = setTimeout(() => {
+            if (ptyMode && sessionId) socket.emit('term_resize', Object.assign({id: sessionId}, terminalSize()));
+        }, 200);
+    });
+
     // Focus on input when clicking on output
     output.addEventListener('click', () => input.focus());
 });
@@ -0,0 +1,221 @@
+import os
+import stat
+import zlib
+import tarfile
+import zipfile
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Worker threads used to gzip tar.gz blocks; zlib releases the GIL while compressing
+ARCHIVE_WORKERS = int(os.getenv('VPSCOPE_ARCHIVE_WORKERS', str(min(4, os.cpu_count() or 1))))
+COMPRESS_LEVEL = int(os.getenv('VPSCOPE_ARCHIVE_LEVEL', '6'))
+
+READ_SIZE = 1024 * 1024
+GZIP_BLOCK = 1024 * 1024  # each block becomes one gzip member
+
+# Content that won't shrink; stored as-is in zip, gzipped at level 0 in tar.gz
+COMPRESSED_EXTENSIONS = {
+    '.zip', '.gz', '.tgz', '.bz2', '.xz', '.7z', '.rar', '.zst', '.lz4',
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.avif', '.heic',
+    '.mp3', '.aac', '.ogg', '.flac', '.mp4', '.mkv', '.avi', '.mov', '.webm',
+    '.pdf', '.docx', '.xlsx', '.pptx', '.jar', '.apk', '.whl',
+}
+
+FORMATS = {
+    'zip': ('application/zip', '.zip'),
+    'tar.gz': ('application/gzip', '.tar.gz'),
+}
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=ARCHIVE_WORKERS, thread_name_prefix='archive')
+    return _executor
+
+
+def is_compressible(name):
+    return os.path.splitext(name)[1].lower() not in COMPRESSED_EXTENSIONS
+
+
+def walk_paths(paths):
+    """Yields (full_path, arcname, stat_result) for each path and everything below it"""
+    for path in paths:
+        path = os.path.abspath(path)
+        root_name = os.path.basename(path.rstrip(os.sep)) or 'root'
+        st = os.lstat(path)
+        yield path, root_name, st
+        if not stat.S_ISDIR(st.st_mode):
+            continue
+        stack = [(path, root_name)]
+        while stack:
+            directory, arc_dir = stack.pop()
+            try:
+                entries = sorted(os.scandir(directory), key=lambda e: e.name)
+            except OSError:
+                continue
+            for entry in entries:
+                arcname = f"{arc_dir}/{entry.name}"
+                try:
+                    entry_stat = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                yield entry.path, arcname, entry_stat
+                if stat.S_ISDIR(entry_stat.st_mode):
+                    stack.append((entry.path, arcname))
+
+
+def _read_exactly(path, size):
+    """Yields exactly size bytes of the file, zero-padded if it shrank meanwhile"""
+    remaining = size
+    try:
+        with open(path, 'rb') as f:
+            while remaining:
+                data = f.read(min(READ_SIZE, remaining))
+                if not data:
+                    break
+                remaining -= len(data)
+                yield data
+    except OSError:
+        pass
+    while remaining:
+        pad = min(READ_SIZE, remaining)
+        remaining -= pad
+        yield b'\0' * pad
+
+
+class _StreamSink:
+    """Unseekable file object for zipfile; collected bytes are drained by the generator"""
+
+    def __init__(self):
+        self._parts = []
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+
+def stream_zip(paths):
+    """Generates a zip archive; ZipFile writes data descriptors since the sink can't seek"""
+    sink = _StreamSink()
+    with zipfile.ZipFile(sink, 'w', allowZip64=True) as zf:
+        for full_path, arcname, st in walk_paths(paths):
+            mtime = time.localtime(max(st.st_mtime, 315532800))[:6]  # zip can't go before 1980
+            if stat.S_ISDIR(st.st_mode):
+                info = zipfile.ZipInfo(arcname + '/', mtime)
+                info.external_attr = (st.st_mode & 0xFFFF) << 16 | 0x10
+                zf.writestr(info, b'')
+            elif stat.S_ISREG(st.st_mode):
+                info = zipfile.ZipInfo(arcname, mtime)
+                info.external_attr = (st.st_mode & 0xFFFF) << 16
+                if is_compressible(arcname):
+                    info.compress_type = zipfile.ZIP_DEFLATED
+                    info._compresslevel = COMPRESS_LEVEL
+                else:
+                    info.compress_type = zipfile.ZIP_STORED
+                with zf.open(info, 'w', force_zip64=st.st_size > zipfile.ZIP64_LIMIT // 2) as dest:
+                    for data in _read_exactly(full_path, st.st_size):
+                        dest.write(data)
+                        chunk = sink.drain()
+                        if chunk:
+                            yield chunk
+            else:
+                continue  # symlinks and special files are not archived
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    yield sink.drain()
+
+
+def _tar_pieces(paths):
+    """Yields (bytes, compressible) pieces of an uncompressed POSIX tar stream"""
+    for full_path, arcname, st in walk_paths(paths):
+        info = tarfile.TarInfo(arcname)
+        info.mode = stat.S_IMODE(st.st_mode)
+        info.mtime = int(st.st_mtime)
+        info.uid, info.gid = st.st_uid, st.st_gid
+        if stat.S_ISDIR(st.st_mode):
+            info.type = tarfile.DIRTYPE
+        elif stat.S_ISLNK(st.st_mode):
+            info.type = tarfile.SYMTYPE
+            try:
+                info.linkname = os.readlink(full_path)
+            except OSError:
+                continue
+        elif stat.S_ISREG(st.st_mode):
+            info.size = st.st_size
+        else:
+            continue
+        yield info.tobuf(tarfile.PAX_FORMAT), True
+        if info.size:
+            compressible = is_compressible(arcname)
+            for data in _read_exactly(full_path, info.size):
+                yield data, compressible
+            padding = -info.size % tarfile.BLOCKSIZE
+            if padding:
+                yield b'\0' * padding, True
+    yield b'\0' * (tarfile.BLOCKSIZE * 2), True
+
+
+def _gzip_member(data, level):
+    """One complete gzip member; concatenated members form a valid .gz stream"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _tar_blocks(paths):
+    """Groups tar pieces into blocks of up to GZIP_BLOCK with a single compress level"""
+    block = []
+    block_size = 0
+    block_level = None
+    for data, compressible in _tar_pieces(paths):
+        level = COMPRESS_LEVEL if compressible else 0
+        if block and (level != block_level or block_size >= GZIP_BLOCK):
+            yield b''.join(block), block_level
+            block, block_size = [], 0
+        block.append(data)
+        block_size += len(data)
+        block_level = level
+    if block:
+        yield b''.join(block), block_level
+
+
+def stream_tar_gz(paths, workers=None):
+    """Generates a multi-member tar.gz, compressing blocks in parallel but yielding them in order"""
+    workers = ARCHIVE_WORKERS if workers is None else workers
+    if workers <= 1:
+        for data, level in _tar_blocks(paths):
+            yield _gzip_member(data, level)
+        return
+    executor = _get_executor()
+    pending = deque()
+    try:
+        for data, level in _tar_blocks(paths):
+            pending.append(executor.submit(_gzip_member, data, level))
+            # Bounded look-ahead keeps memory at a few blocks per worker
+            while len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def stream_archive(paths, fmt):
+    if fmt == 'zip':
+        return stream_zip(paths)
+    if fmt == 'tar.gz':
+        return stream_tar_gz(paths)
+    raise ValueError(f"Unsupported archive format: {fmt}")
@@ -0,0 +1,38 @@
+import os
+
+# Server concurrency model: 'threading' (a thread per connection on the Werkzeug server),
+# or 'eventlet'/'gevent' (cooperative green threads; app/run.py monkey-patches for them)
+ASYNC_MODES = ('threading', 'eventlet', 'gevent')
+ASYNC_MODE = os.getenv('VPSCOPE_ASYNC_MODE', 'threading')
+# Real OS threads that run blocking psutil and filesystem calls in the cooperative modes
+BLOCKING_WORKERS = int(os.getenv('VPSCOPE_BLOCKING_WORKERS', '16'))
+
+if ASYNC_MODE not in ASYNC_MODES:
+    raise ValueError(f"VPSCOPE_ASYNC_MODE must be one of {', '.join(ASYNC_MODES)}, not {ASYNC_MODE!r}")
+
+_pool = None
+
+
+def _gevent_pool():
+    global _pool
+    if _pool is None:
+        import gevent
+        _pool = gevent.get_hub().threadpool
+        _pool.maxsize = BLOCKING_WORKERS
+    return _pool
+
+
+def run_blocking(func, *args, **kwargs):
+    """Calls func so that it doesn't stall other connections.
+
+    psutil and os calls block the whole process under eventlet/gevent, so
+    there they run on a bounded pool of real threads while the calling
+    green thread waits. With threading every request has its own thread
+    already and func is simply called.
+    """
+    if ASYNC_MODE == 'eventlet':
+        from eventlet import tpool
+        return tpool.execute(func, *args, **kwargs)
+    if ASYNC_MODE == 'gevent':
+        return _gevent_pool().apply(func, args, kwargs)
+    return func(*args, **kwargs)
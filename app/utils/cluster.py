@@ -0,0 +1,174 @@
+import os
+import socket
+import atexit
+import logging
+import threading
+
+import socketio
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger('VPScope')
+
+# Server processes started by app/run.py, one per port behind a load balancer with sticky sessions
+WORKERS = int(os.getenv('VPSCOPE_WORKERS', '1'))
+# Socket.IO message queue between the workers: 'local' (Unix sockets between the processes of
+# this host, no broker) or a redis://, amqp://, kafka:// or zmq+ URL handled by python-socketio
+MESSAGE_QUEUE = os.getenv('VPSCOPE_MESSAGE_QUEUE', 'local' if WORKERS > 1 else '')
+CLUSTERED = bool(MESSAGE_QUEUE)
+# State the workers of one host share: queue sockets, leader lock, metrics snapshot, cache
+CLUSTER_DIR = os.getenv('VPSCOPE_CLUSTER_DIR', os.path.join('data', 'cluster'))
+CHANNEL = 'vpscope'
+ELECTION_INTERVAL = 1.0  # seconds between attempts of a follower to take over
+SEND_TIMEOUT = 1.0  # seconds a publisher waits for a worker whose queue is full
+RECV_BUFFER = 1024 * 1024
+
+
+class LocalSocketManager(socketio.PubSubManager):
+    """Socket.IO message queue between the worker processes of one host.
+
+    Every worker binds a Unix datagram socket in CLUSTER_DIR and publishes
+    by sending each message to the sockets of all the other workers, so no
+    broker process is needed.
+    """
+    name = 'local'
+
+    def __init__(self, channel=CHANNEL, directory=CLUSTER_DIR, write_only=False, logger=None, json=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger, json=json)
+        self.directory = directory
+        self.path = os.path.join(directory, f"{channel}-{os.getpid()}.sock")
+        self._send_sock = None
+        self._send_lock = threading.Lock()
+
+    def _peers(self):
+        prefix = f"{self.channel}-"
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        paths = (os.path.join(self.directory, name) for name in names
+                 if name.startswith(prefix) and name.endswith('.sock'))
+        return [path for path in paths if path != self.path]
+
+    def _publish(self, data):
+        payload = self.json.dumps(data).encode()
+        with self._send_lock:
+            if self._send_sock is None:
+                self._send_sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+                self._send_sock.settimeout(SEND_TIMEOUT)
+        for peer in self._peers():
+            try:
+                self._send_sock.sendto(payload, peer)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # The worker exited without removing its socket
+                try:
+                    os.unlink(peer)
+                except OSError:
+                    pass
+            except OSError as e:
+                self._get_logger().warning(f"Message queue: dropped a message for {peer}: {e}")
+
+    def _listen(self):
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+        sock.bind(self.path)
+        os.chmod(self.path, 0o600)
+        atexit.register(self._unlink)
+        buffer = bytearray(RECV_BUFFER)
+        while True:
+            size = sock.recv_into(buffer)
+            yield bytes(buffer[:size])
+
+    def _unlink(self):
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+
+class LeaderElection:
+    """Elects the one worker of a host that collects metrics and owns the data files.
+
+    The leader holds an exclusive flock on CLUSTER_DIR/leader.lock. The kernel
+    releases it when that process dies and the next follower to retry takes over.
+    Without a cluster the only process is always the leader.
+    """
+
+    def __init__(self, clustered=CLUSTERED, directory=CLUSTER_DIR):
+        self.clustered = clustered
+        self.path = os.path.join(directory, 'leader.lock')
+        self.is_leader = not clustered
+        self._file = None
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    def start(self):
+        if not self.clustered or self._file is not None:
+            return
+        if fcntl is None:
+            logger.warning("No flock on this platform, every worker collects metrics itself")
+            self.is_leader = True
+            return
+        os.makedirs(os.path.dirname(self.path), mode=0o700, exist_ok=True)
+        self._file = open(self.path, 'a+')
+        if self._try_acquire():
+            return
+        logger.info(f"Worker {os.getpid()} follows the metrics of the elected worker")
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='leader-election')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._file is not None:
+            self._file.close()  # Releases the lock
+            self._file = None
+        self.is_leader = not self.clustered
+
+    def _try_acquire(self):
+        try:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return False
+        self._file.seek(0)
+        self._file.truncate()
+        self._file.write(str(os.getpid()))
+        self._file.flush()
+        self.is_leader = True
+        logger.info(f"Worker {os.getpid()} elected to collect metrics")
+        return True
+
+    def _run(self):
+        while not self._stop_event.wait(ELECTION_INTERVAL):
+            if self._file is None or self._try_acquire():
+                return
+
+
+def socketio_options():
+    """Arguments for socketio.init_app() that connect the workers through MESSAGE_QUEUE"""
+    if not MESSAGE_QUEUE:
+        return {}
+    if MESSAGE_QUEUE == 'local':
+        return {'client_manager': LocalSocketManager()}
+    return {'message_queue': MESSAGE_QUEUE, 'channel': CHANNEL}
+
+
+def cache_config():
+    """Flask-Caching backend: in-process alone, shared by the workers of a cluster"""
+    if MESSAGE_QUEUE.startswith(('redis://', 'rediss://')):
+        return {'CACHE_TYPE': 'RedisCache', 'CACHE_REDIS_URL': MESSAGE_QUEUE, 'CACHE_KEY_PREFIX': 'vpscope:'}
+    if CLUSTERED:
+        return {'CACHE_TYPE': 'FileSystemCache', 'CACHE_DIR': os.path.join(CLUSTER_DIR, 'cache')}
+    return {'CACHE_TYPE': 'SimpleCache'}
+
+
+# Global leader election of this worker
+leader = LeaderElection()
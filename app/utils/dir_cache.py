@@ -0,0 +1,113 @@
+import os
+import threading
+from collections import OrderedDict
+from app.utils.fs_watcher import watcher
+
+# Bounds of the listing cache: number of directories and total entries across them
+MAX_DIRS = int(os.getenv('VPSCOPE_DIR_CACHE_DIRS', '64'))
+MAX_ENTRIES = int(os.getenv('VPSCOPE_DIR_CACHE_ENTRIES', '300000'))
+
+
+def _scan(path):
+    entries = []
+    with os.scandir(path) as it:
+        for entry in it:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            entries.append((entry, is_dir))
+    return entries
+
+
+class DirCache:
+    """LRU cache of scandir results, invalidated by file watcher events"""
+
+    def __init__(self, max_dirs=MAX_DIRS, max_entries=MAX_ENTRIES):
+        self.max_dirs = max_dirs
+        self.max_entries = max_entries
+        self._cache = OrderedDict()  # path -> [(DirEntry, is_dir)]
+        self._size = 0
+        self._scanning = {}  # path -> [scans running, changes seen while they ran]
+        self._lock = threading.Lock()
+        self._listeners = []
+        self.hits = 0
+        self.misses = 0
+
+    def add_listener(self, callback):
+        """Registers callback(path) called when a cached directory changes on disk"""
+        self._listeners.append(callback)
+
+    def entries(self, path):
+        """Returns [(DirEntry, is_dir)] for path; DirEntry keeps its stat() result cached"""
+        path = os.path.abspath(path)
+        with self._lock:
+            cached = self._cache.get(path)
+            if cached is not None:
+                self._cache.move_to_end(path)
+                self.hits += 1
+                return cached
+            self.misses += 1
+            scan = self._scanning.setdefault(path, [0, 0])
+            scan[0] += 1
+            generation = scan[1]
+
+        evicted = []
+        try:
+            # Watch before scanning so a change during the scan is not missed
+            watched = watcher.watch(path, self._on_change)
+            entries = _scan(path)
+            with self._lock:
+                # A change during the scan may be missing from entries, and it dropped the watch
+                cache = watched and scan[1] == generation and len(entries) <= self.max_entries
+                if cache:
+                    old = self._cache.pop(path, None)
+                    if old is not None:
+                        self._size -= len(old)
+                    self._cache[path] = entries
+                    self._size += len(entries)
+                    evicted = self._evict()
+                unwatch = watched and not cache and path not in self._cache
+        finally:
+            with self._lock:
+                scan[0] -= 1
+                if not scan[0]:
+                    del self._scanning[path]
+        if unwatch:
+            watcher.unwatch(path, self._on_change)
+        for evicted_path in evicted:
+            watcher.unwatch(evicted_path, self._on_change)
+        return entries
+
+    def _evict(self):
+        evicted = []
+        while self._cache and (len(self._cache) > self.max_dirs or self._size > self.max_entries):
+            path, entries = self._cache.popitem(last=False)
+            self._size -= len(entries)
+            evicted.append(path)
+        return evicted
+
+    def invalidate(self, path):
+        path = os.path.abspath(path)
+        with self._lock:
+            scan = self._scanning.get(path)
+            if scan is not None:
+                scan[1] += 1
+            entries = self._cache.pop(path, None)
+            if entries is not None:
+                self._size -= len(entries)
+        return entries is not None
+
+    def _on_change(self, path, event, name):
+        was_cached = self.invalidate(path)
+        watcher.unwatch(path, self._on_change)
+        if event == 'delete_self':
+            parent = os.path.dirname(path)
+            self.invalidate(parent)
+        if was_cached:
+            for callback in list(self._listeners):
+                callback(path)
+
+
+# Global listing cache
+dir_cache = DirCache()
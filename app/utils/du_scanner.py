@@ -0,0 +1,252 @@
+import os
+import stat
+import time
+import threading
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+logger = logging.getLogger('VPScope')
+
+DU_WORKERS = int(os.getenv('VPSCOPE_DU_WORKERS', '8'))
+# A directory whose mtime is unchanged reuses its cached file sizes for this long;
+# file growth doesn't touch the directory mtime, so it is picked up after this age
+MAX_AGE = float(os.getenv('VPSCOPE_DU_MAX_AGE', '300'))
+# Directories whose sizes are kept; the least recently scanned are dropped beyond it
+MAX_DIRS = int(os.getenv('VPSCOPE_DU_CACHE_DIRS', '500000'))
+# Sizes not refreshed by a scan for this long are dropped
+CACHE_TTL = float(os.getenv('VPSCOPE_DU_CACHE_TTL', str(24 * 3600)))
+PROGRESS_INTERVAL = 0.5  # seconds between progress callbacks
+
+
+class DirUsage:
+    """Sizes of one directory: own files plus the totals of its subdirectories"""
+    __slots__ = ('mtime_ns', 'scanned_at', 'seen_at', 'own_size', 'own_disk', 'own_files', 'subdirs',
+                 'total_size', 'total_disk', 'total_files')
+
+    def __init__(self, mtime_ns, own_size, own_disk, own_files, subdirs):
+        self.mtime_ns = mtime_ns
+        self.scanned_at = time.time()
+        self.seen_at = self.scanned_at  # last scan that included it, reused or not
+        self.own_size = own_size
+        self.own_disk = own_disk
+        self.own_files = own_files
+        self.subdirs = subdirs  # names of child directories (symlinks not followed)
+        self.total_size = own_size
+        self.total_disk = own_disk
+        self.total_files = own_files
+
+    def copy(self):
+        usage = DirUsage(self.mtime_ns, self.own_size, self.own_disk, self.own_files, self.subdirs)
+        usage.scanned_at = self.scanned_at  # reuse still expires MAX_AGE after the real scan
+        return usage
+
+
+class DuScanner:
+    """du-style background scanner with per-directory results cached by mtime"""
+
+    def __init__(self, workers=DU_WORKERS, max_dirs=MAX_DIRS, ttl=CACHE_TTL):
+        self.workers = workers
+        self.max_dirs = max_dirs
+        self.ttl = ttl
+        self._cache = OrderedDict()  # absolute dir -> DirUsage, least recently scanned first
+        self._lock = threading.Lock()
+        self._jobs = {}   # root -> progress dict of the running scan
+        self._executor = None
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='du')
+        return self._executor
+
+    def _scan_dir(self, path, dev):
+        """Returns (DirUsage, reused) for one directory, reusing the cache when still valid"""
+        st = os.lstat(path)
+        with self._lock:
+            cached = self._cache.get(path)
+        if (cached is not None and cached.mtime_ns == st.st_mtime_ns
+                and time.time() - cached.scanned_at < MAX_AGE):
+            return cached, True
+        own_size = own_disk = own_files = 0
+        subdirs = []
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    entry_stat = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                if stat.S_ISDIR(entry_stat.st_mode):
+                    if entry_stat.st_dev == dev:  # stay on one filesystem, like du -x
+                        subdirs.append(entry.name)
+                    continue
+                own_files += 1
+                own_size += entry_stat.st_size
+                own_disk += getattr(entry_stat, 'st_blocks', 0) * 512 or entry_stat.st_size
+        return DirUsage(st.st_mtime_ns, own_size, own_disk, own_files, subdirs), False
+
+    def _new_job(self, root):
+        # Caller holds self._lock
+        state = {'root': root, 'dirs': 0, 'reused': 0, 'files': 0, 'bytes': 0,
+                 'errors': 0, 'elapsed': 0.0, 'done': False}
+        self._jobs[root] = state
+        return state
+
+    def scan(self, root, progress=None, state=None):
+        """Walks root with parallel scandir calls, then aggregates totals bottom-up"""
+        root = os.path.abspath(root)
+        started = time.time()
+        if state is None:
+            with self._lock:
+                if root in self._jobs:
+                    return self._jobs[root]
+                state = self._new_job(root)
+
+        executor = self._get_executor()
+        results = {}
+        try:
+            dev = os.lstat(root).st_dev
+            pending = {executor.submit(self._scan_dir, root, dev): root}
+            last_report = 0
+            while pending:
+                # Collect whatever finished and queue its subdirectories
+                done, _ = wait(pending, timeout=PROGRESS_INTERVAL, return_when=FIRST_COMPLETED)
+                for future in done:
+                    path = pending.pop(future)
+                    try:
+                        usage, reused = future.result()
+                    except OSError:
+                        state['errors'] += 1
+                        continue
+                    results[path] = usage
+                    state['dirs'] += 1
+                    state['reused'] += reused
+                    state['files'] += usage.own_files
+                    state['bytes'] += usage.own_size
+                    for name in usage.subdirs:
+                        child = os.path.join(path, name)
+                        pending[executor.submit(self._scan_dir, child, dev)] = child
+                now = time.time()
+                if progress and now - last_report >= PROGRESS_INTERVAL:
+                    last_report = now
+                    state['elapsed'] = round(now - started, 2)
+                    progress(dict(state))
+
+            # Deepest directories first, so children are complete before their parents.
+            # Totals go into copies: reused entries are still read by other requests
+            ordered = sorted(results, key=lambda p: p.count(os.sep), reverse=True)
+            for path in ordered:
+                usage = results[path] = results[path].copy()
+                usage.total_size, usage.total_disk, usage.total_files = (
+                    usage.own_size, usage.own_disk, usage.own_files)
+                for name in usage.subdirs:
+                    child = results.get(os.path.join(path, name))
+                    if child is not None:
+                        usage.total_size += child.total_size
+                        usage.total_disk += child.total_disk
+                        usage.total_files += child.total_files
+            with self._lock:
+                # Forget directories under root that no longer exist
+                prefix = root.rstrip(os.sep) + os.sep
+                for path in [p for p in self._cache if p.startswith(prefix) and p not in results]:
+                    del self._cache[path]
+                # Deepest first, so the top of this tree is evicted last
+                for path in ordered:
+                    self._cache[path] = results[path]
+                    self._cache.move_to_end(path)
+                self._evict()
+        finally:
+            with self._lock:
+                self._jobs.pop(root, None)
+        state['elapsed'] = round(time.time() - started, 2)
+        state['done'] = True
+        if progress:
+            progress(dict(state))
+        logger.info(f"Disk usage scan of {root}: {state['dirs']} dirs ({state['reused']} cached), "
+                    f"{state['files']} files in {state['elapsed']}s")
+        return state
+
+    def _evict(self):
+        # Caller holds self._lock
+        expired = time.time() - self.ttl
+        for path in [p for p, usage in self._cache.items() if usage.seen_at < expired]:
+            del self._cache[path]
+        while len(self._cache) > self.max_dirs:
+            self._cache.popitem(last=False)
+
+    def start(self, root, progress=None):
+        """Runs scan() in a background thread; returns False if root is already being scanned"""
+        root = os.path.abspath(root)
+        # The check and the registration happen under one lock, so two requests can't both start
+        with self._lock:
+            if root in self._jobs:
+                return False
+            state = self._new_job(root)
+        thread = threading.Thread(target=self._scan_safely, args=(root, progress, state), name='du-scan')
+        thread.daemon = True
+        try:
+            thread.start()
+        except RuntimeError:
+            with self._lock:
+                self._jobs.pop(root, None)
+            raise
+        return True
+
+    def _scan_safely(self, root, progress, state=None):
+        try:
+            self.scan(root, progress, state)
+        except Exception as e:
+            logger.error(f"Disk usage scan of {root} failed: {e}")
+            if progress:
+                progress({'root': root, 'done': True, 'error': str(e)})
+
+    def progress(self, root):
+        with self._lock:
+            state = self._jobs.get(os.path.abspath(root))
+            return dict(state) if state else None
+
+    def cached_size(self, path):
+        """Total size of a directory from the last scan, or None if it wasn't scanned"""
+        usage = self._cache.get(path)
+        return usage.total_size if usage is not None else None
+
+    def tree(self, root, depth=2, top=20):
+        """Largest subtrees of root down to depth levels, top entries per level"""
+        root = os.path.abspath(root)
+        with self._lock:
+            if root not in self._cache:
+                return None
+            return self._node(root, depth, top)
+
+    def _node(self, path, depth, top):
+        usage = self._cache[path]
+        node = {
+            'path': path,
+            'name': os.path.basename(path) or path,
+            'size': usage.total_size,
+            'disk': usage.total_disk,
+            'files': usage.total_files,
+            'own_size': usage.own_size,
+            'scanned_at': usage.scanned_at,
+        }
+        if depth > 0:
+            children = [os.path.join(path, name) for name in usage.subdirs]
+            children = [child for child in children if child in self._cache]
+            children.sort(key=lambda child: self._cache[child].total_size, reverse=True)
+            node['children'] = [self._node(child, depth - 1, top) for child in children[:top]]
+            node['other_dirs'] = max(len(children) - top, 0)
+        return node
+
+    def largest(self, root, top=20):
+        """Directories below root holding the most bytes directly (not via subdirectories)"""
+        root = os.path.abspath(root)
+        prefix = root.rstrip(os.sep) + os.sep
+        with self._lock:
+            items = [(path, usage) for path, usage in self._cache.items()
+                     if path == root or path.startswith(prefix)]
+        items.sort(key=lambda item: item[1].own_size, reverse=True)
+        return [{'path': path, 'own_size': usage.own_size, 'own_files': usage.own_files,
+                 'size': usage.total_size} for path, usage in items[:top]]
+
+
+# Global scanner
+du_scanner = DuScanner()
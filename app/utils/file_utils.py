@@ -1,20 +1,143 @@
 import os
+import json
+import uuid
+import hashlib
+import threading
+import base64
+import heapq
+import fnmatch
 from werkzeug.utils import secure_filename
 import shutil
+from app.utils.dir_cache import dir_cache
+from app.utils.text_reader import get_line_index, FileView
+from app.utils.io_utils import pread
+from app.utils.du_scanner import du_scanner
 
-def list_dir(path='.'):
-    entries = []
-    for name in os.listdir(path):
-        full = os.path.join(path, name)
-        is_dir = os.path.isdir(full)
-        entries.append({
-            'name': name,
-            'path': full,
-            'is_dir': is_dir,
-            'size': os.path.getsize(full) if not is_dir else None
-        })
-    entries.sort(key=lambda x: (not x['is_dir'], x['name']))
-    return {'path': os.path.abspath(path), 'entries': entries}
+# Sort keys for directory listings; directories always come first
+SORT_FIELDS = ('name', 'size', 'mtime')
+
+class _Desc:
+    """Wraps a value so it sorts in reverse order"""
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+def _entry_size(entry, is_dir):
+    if is_dir:
+        # Known only after a disk usage scan covered this directory
+        return du_scanner.cached_size(entry.path)
+    try:
+        return entry.stat().st_size
+    except OSError:
+        return None
+
+def _entry_mtime(entry):
+    try:
+        return entry.stat().st_mtime
+    except OSError:
+        return 0
+
+def _entry_is_dir(entry):
+    try:
+        return entry.is_dir()
+    except OSError:
+        return False
+
+def _sort_key(entry, is_dir, sort):
+    if sort == 'size':
+        return (not is_dir, _entry_size(entry, is_dir) or 0, entry.name)
+    if sort == 'mtime':
+        return (not is_dir, _entry_mtime(entry), entry.name)
+    return (not is_dir, entry.name)
+
+def _entry_dict(entry, is_dir):
+    return {
+        'name': entry.name,
+        'path': entry.path,
+        'is_dir': is_dir,
+        'size': _entry_size(entry, is_dir),
+        'mtime': _entry_mtime(entry)
+    }
+
+def encode_cursor(key):
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode()).decode()
+
+def decode_cursor(cursor):
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        raise ValueError("Invalid cursor")
+    return tuple(key)
+
+def _matcher(pattern):
+    """Glob when the filter has wildcards, else case-insensitive substring"""
+    if not pattern:
+        return None
+    pattern = pattern.lower()
+    if any(c in pattern for c in '*?['):
+        return lambda name: fnmatch.fnmatchcase(name.lower(), pattern)
+    return lambda name: pattern in name.lower()
+
+def list_dir(path='.', sort='name', order='asc', cursor=None, limit=None, name_filter=None):
+    """Lists a directory page by page using scandir's cached d_type.
+
+    Only the returned page is stat()ed when sorting by name, so large
+    directories cost one scandir pass plus O(limit) stat calls. Scans are
+    kept in the listing cache until the directory changes on disk.
+    """
+    if sort not in SORT_FIELDS:
+        raise ValueError(f"Unknown sort field: {sort}")
+    match = _matcher(name_filter)
+    after = decode_cursor(cursor) if cursor else None
+    if after is not None and len(after) > 1:
+        after = (bool(after[0]),) + after[1:]
+    descending = order == 'desc'
+
+    def rank(key):
+        # Directories stay first in both orders
+        return (key[0], _Desc(key[1:])) if descending else key
+
+    candidates = []
+    total = 0
+    for entry, is_dir in dir_cache.entries(path):
+        if match and not match(entry.name):
+            continue
+        total += 1
+        key = _sort_key(entry, is_dir, sort)
+        if after is not None and not rank(after) < rank(key):
+            continue
+        candidates.append((key, entry, is_dir))
+
+    if limit is None:
+        candidates.sort(key=lambda c: rank(c[0]))
+        page, has_more = candidates, False
+    else:
+        page = heapq.nsmallest(limit + 1, candidates, key=lambda c: rank(c[0]))
+        has_more = len(page) > limit
+        page = page[:limit]
+
+    return {
+        'path': os.path.abspath(path),
+        'entries': [_entry_dict(entry, is_dir) for _, entry, is_dir in page],
+        'total': total,
+        'next_cursor': encode_cursor(page[-1][0]) if has_more else None
+    }
+
+def iter_dir(path='.', name_filter=None):
+    """Yields entries in directory order without building the whole listing"""
+    match = _matcher(name_filter)
+    with os.scandir(path) as it:
+        for entry in it:
+            if match and not match(entry.name):
+                continue
+            yield _entry_dict(entry, _entry_is_dir(entry))
 
 def save_upload(file_storage, target_path='.'):
     filename = secure_filename(file_storage.filename)
@@ -30,3 +153,204 @@ def delete_file(path):
 
 def make_dir(path):
     os.makedirs(path, exist_ok=True)
+
+# Serializes VPScope's own saves of a file between the version check and the rename
+_save_locks = {}
+_save_locks_guard = threading.Lock()
+
+def _save_lock(path):
+    with _save_locks_guard:
+        return _save_locks.setdefault(os.path.realpath(path), threading.Lock())
+
+class VersionConflict(Exception):
+    """The file changed since the client read it"""
+    def __init__(self, current, message="File changed on disk"):
+        super().__init__(message)
+        self.current = current
+
+def file_version(st):
+    """Version token of a file; changes whenever its content can"""
+    return f"{st.st_mtime_ns:x}-{st.st_size:x}-{st.st_ino:x}"
+
+def content_hash(data):
+    """SHA-256 hex digest the editor sends back to prove which bytes it edited"""
+    return hashlib.sha256(data).hexdigest()
+
+def _hash_fd(fd, size):
+    digest = hashlib.sha256()
+    position = 0
+    while position < size:
+        data = pread(fd, min(size - position, 1024 * 1024), position)
+        if not data:
+            break
+        digest.update(data)
+        position += len(data)
+    return digest.hexdigest()
+
+def _write_all(fd, data):
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+def _copy_range(src_fd, dst_fd, start, end):
+    """Copies [start, end) of src to the current position of dst, in-kernel when possible"""
+    position = start
+    in_kernel = hasattr(os, 'copy_file_range')
+    while position < end:
+        if in_kernel:
+            try:
+                copied = os.copy_file_range(src_fd, dst_fd, end - position, position)
+            except OSError:
+                copied = 0
+            if copied:
+                position += copied
+                continue
+            in_kernel = False
+        data = pread(src_fd, min(end - position, 1024 * 1024), position)
+        if not data:
+            break
+        _write_all(dst_fd, data)
+        position += len(data)
+
+def atomic_write(path, build, mode=None):
+    """Writes path via a temp file in the same directory: build(fd), fsync, rename.
+
+    A symlink is followed and its target replaced; the new file keeps the
+    owner and mode of the old one. A file with other hard links is rewritten
+    in place from the temp file instead, so that the links keep sharing it.
+    """
+    path = os.path.realpath(path)
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        st = None
+    directory = os.path.dirname(path) or '.'
+    tmp_path = os.path.join(directory, f".{os.path.basename(path)}.{uuid.uuid4().hex[:8]}.tmp")
+    fd = os.open(tmp_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0), 0o644)
+    try:
+        build(fd)
+        if st is not None:
+            if mode is None:
+                mode = st.st_mode & 0o7777
+            if hasattr(os, 'fchown'):
+                try:
+                    os.fchown(fd, st.st_uid, st.st_gid)
+                except PermissionError:
+                    pass  # Only root can give a file away; it stays ours
+        if mode is not None:
+            os.chmod(tmp_path, mode)
+        os.fsync(fd)
+        if st is not None and st.st_nlink > 1:
+            _rewrite_in_place(fd, path)
+    except BaseException:
+        os.close(fd)
+        os.remove(tmp_path)
+        raise
+    os.close(fd)
+    if st is not None and st.st_nlink > 1:
+        os.remove(tmp_path)
+        return file_version(os.stat(path))
+    os.replace(tmp_path, path)
+    if hasattr(os, 'O_DIRECTORY'):
+        # Make the rename itself durable
+        dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+    return file_version(os.stat(path))
+
+def _rewrite_in_place(tmp_fd, path):
+    # Not atomic: a crash midway leaves a mix, but every hard link sees the new content
+    size = os.fstat(tmp_fd).st_size
+    fd = os.open(path, os.O_WRONLY | getattr(os, 'O_BINARY', 0))
+    try:
+        _copy_range(tmp_fd, fd, 0, size)
+        os.ftruncate(fd, size)
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def write_text(path, content, version=None, sha256=None):
+    """Atomically replaces the whole file, optionally only if it is still at version.
+
+    Returns (version, sha256) of the new content.
+    """
+    with _save_lock(path):
+        return _write_text(path, content, version, sha256)
+
+def _write_text(path, content, version, sha256):
+    try:
+        with open(path, 'rb') as f:
+            st = os.fstat(f.fileno())
+            if version is not None and file_version(st) != version:
+                raise VersionConflict(file_version(st))
+            if sha256 is not None and _hash_fd(f.fileno(), st.st_size) != sha256:
+                raise VersionConflict(file_version(st))
+    except FileNotFoundError:
+        if version is not None or sha256 is not None:
+            raise VersionConflict(None)
+    data = content.encode('utf-8')
+    return atomic_write(path, lambda fd: _write_all(fd, data)), content_hash(data)
+
+def _edit_offsets(view, index, edit, size):
+    """Byte range [start, end) of an edit given as bytes (start/end) or lines (start_line/end_line)"""
+    if 'start_line' in edit:
+        start = index.line_offset(view, int(edit['start_line']))
+        end_line = int(edit.get('end_line', edit['start_line']))
+        end = index.line_offset(view, end_line)
+        start = size if start is None else start
+        end = size if end is None else end
+    else:
+        start = int(edit['start'])
+        end = int(edit.get('end', start))
+    if not 0 <= start <= end <= size:
+        raise ValueError(f"Edit range {start}-{end} is outside the file")
+    return start, end
+
+def apply_patch(path, version, edits, sha256=None):
+    """Applies non-overlapping edits to the file at version and writes the result atomically.
+
+    Unchanged ranges are copied file-to-file, so the cost follows the size of the
+    edits. An edit carrying 'old' and a sha256 of the whole file are checked
+    against the bytes on disk first. Returns (version, sha256 or None).
+    """
+    with _save_lock(path):
+        return _apply_patch(path, version, edits, sha256)
+
+def _apply_patch(path, version, edits, sha256):
+    with open(path, 'rb') as f:
+        st = os.fstat(f.fileno())
+        current = file_version(st)
+        if current != version:
+            raise VersionConflict(current)
+        size = st.st_size
+        if sha256 is not None and _hash_fd(f.fileno(), size) != sha256:
+            raise VersionConflict(current)
+        index = get_line_index(os.path.abspath(path), st)
+        view = FileView(f.fileno(), size)
+        ranges = []
+        for edit in edits:
+            start, end = _edit_offsets(view, index, edit, size)
+            # The client names what it replaces: a mismatch means its offsets are off
+            if 'old' in edit and view[start:end] != edit['old'].encode('utf-8'):
+                raise VersionConflict(current, "Edit does not match the file content")
+            ranges.append((start, end, edit.get('text', '')))
+        ranges.sort(key=lambda r: r[:2])
+        for (_, prev_end, _), (start, _, _) in zip(ranges, ranges[1:]):
+            if start < prev_end:
+                raise ValueError("Edits overlap")
+        digest = []
+
+        def build(fd):
+            position = 0
+            for start, end, text in ranges:
+                _copy_range(f.fileno(), fd, position, start)
+                _write_all(fd, text.encode('utf-8'))
+                position = end
+            _copy_range(f.fileno(), fd, position, size)
+            if sha256 is not None:
+                digest.append(_hash_fd(fd, os.fstat(fd).st_size))
+
+        new_version = atomic_write(path, build, st.st_mode & 0o7777)
+        return new_version, digest[0] if digest else None
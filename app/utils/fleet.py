@@ -0,0 +1,179 @@
+import os
+import json
+import threading
+import time
+import logging
+import http.client
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+logger = logging.getLogger('VPScope')
+
+# Shared secret between the hub and its agents
+AGENT_TOKEN = os.getenv('VPSCOPE_AGENT_TOKEN', '')
+# Agents polled by the hub: "name=http://host:port,name2=https://host2:port"
+AGENTS = os.getenv('VPSCOPE_AGENTS', '')
+POLL_INTERVAL = float(os.getenv('VPSCOPE_FLEET_INTERVAL', '5'))
+AGENT_TIMEOUT = float(os.getenv('VPSCOPE_AGENT_TIMEOUT', '3'))
+
+# Fields of the local snapshot that agents expose to the hub
+SUMMARY_FIELDS = (
+    'hostname', 'os', 'cpu_count', 'cpu_percent', 'total_cpu_processes',
+    'ram_used', 'ram_total', 'ram_percent', 'disk_used', 'disk_total', 'disk_percent',
+    'net_sent', 'net_recv', 'uptime_seconds', 'load_avg', 'sample_age',
+)
+
+
+def parse_agents(spec):
+    """Parses VPSCOPE_AGENTS into a {name: url} dict"""
+    agents = {}
+    for item in spec.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        name, sep, url = item.partition('=')
+        if not sep:
+            name, url = urlsplit(item).netloc, item
+        agents[name.strip()] = url.strip().rstrip('/')
+    return agents
+
+
+def summarize(snapshot):
+    return {key: snapshot.get(key) for key in SUMMARY_FIELDS}
+
+
+class AgentClient:
+    """Persistent keep-alive connection to one agent, used by one fetch at a time"""
+
+    def __init__(self, name, url, token, timeout):
+        self.name = name
+        self.url = url
+        self.token = token
+        self.timeout = timeout
+        parts = urlsplit(url)
+        self._scheme = parts.scheme or 'http'
+        self._netloc = parts.netloc
+        self._path = (parts.path or '') + '/agent/snapshot?summary=1'
+        self._conn = None
+        self.busy = threading.Lock()
+
+    def _connection(self):
+        if self._conn is None:
+            cls = http.client.HTTPSConnection if self._scheme == 'https' else http.client.HTTPConnection
+            self._conn = cls(self._netloc, timeout=self.timeout)
+        return self._conn
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def fetch(self):
+        headers = {'Authorization': f'Bearer {self.token}', 'Connection': 'keep-alive'}
+        for attempt in range(2):
+            conn = self._connection()
+            try:
+                conn.request('GET', self._path, headers=headers)
+                response = conn.getresponse()
+                body = response.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # Agent closed the idle keep-alive connection; reconnect once
+                self.close()
+                if attempt:
+                    raise
+                continue
+            except Exception:
+                self.close()
+                raise
+            if response.status != 200:
+                raise RuntimeError(f"HTTP {response.status}")
+            return json.loads(body)
+
+
+class FleetHub:
+    """Polls every agent concurrently; slow or dead agents never delay the others"""
+
+    def __init__(self, agents, token=AGENT_TOKEN, interval=POLL_INTERVAL, timeout=AGENT_TIMEOUT):
+        self.interval = interval
+        self.clients = {name: AgentClient(name, url, token, timeout) for name, url in agents.items()}
+        self._status = {name: {'name': name, 'url': url, 'status': 'pending'} for name, url in agents.items()}
+        self._executor = None
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    @property
+    def enabled(self):
+        return bool(self.clients)
+
+    def start(self):
+        if not self.enabled or self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._executor = ThreadPoolExecutor(max_workers=min(32, len(self.clients)),
+                                            thread_name_prefix='fleet')
+        self._thread = threading.Thread(target=self._run, name='fleet-hub')
+        self._thread.daemon = True
+        self._thread.start()
+        logger.info(f"Fleet hub polling {len(self.clients)} agents every {self.interval}s")
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(self.interval + 1)
+            self._thread = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        for client in self.clients.values():
+            client.close()
+
+    def snapshot(self):
+        """Latest known state of every agent"""
+        now = time.time()
+        hosts = []
+        for name in self.clients:
+            status = dict(self._status[name])
+            if 'last_ok' in status:
+                status['age'] = round(now - status['last_ok'], 1)
+            hosts.append(status)
+        return hosts
+
+    def _poll(self, client):
+        started = time.time()
+        try:
+            data = client.fetch()
+        except Exception as e:
+            status = dict(self._status[client.name])
+            status.update({'status': 'down', 'error': str(e) or e.__class__.__name__})
+            self._status[client.name] = status
+        else:
+            self._status[client.name] = {
+                'name': client.name,
+                'url': client.url,
+                'status': 'up',
+                'data': data,
+                'latency_ms': round((time.time() - started) * 1000, 1),
+                'last_ok': time.time(),
+            }
+        finally:
+            client.busy.release()
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            for client in self.clients.values():
+                # A host still answering the previous round is skipped, not waited on
+                if client.busy.acquire(blocking=False):
+                    try:
+                        self._executor.submit(self._poll, client)
+                    except RuntimeError:
+                        client.busy.release()
+                        return
+                elif self._status[client.name].get('status') != 'down':
+                    status = dict(self._status[client.name])
+                    status['status'] = 'slow'
+                    self._status[client.name] = status
+            self._stop_event.wait(self.interval)
+
+
+# Global hub (enabled only when VPSCOPE_AGENTS is set)
+hub = FleetHub(parse_agents(AGENTS))
@@ -0,0 +1,226 @@
+import os
+import ctypes
+import ctypes.util
+import select
+import struct
+import threading
+import logging
+
+logger = logging.getLogger('VPScope')
+
+# Polling fallback interval (seconds) when inotify is unavailable
+POLL_INTERVAL = float(os.getenv('VPSCOPE_WATCH_POLL_INTERVAL', '2'))
+
+# inotify(7) constants
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_IGNORED = 0x00008000
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+              IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+
+_EVENT_HEADER = struct.Struct('iIII')
+
+# Event names passed to callbacks
+_EVENT_NAMES = (
+    (IN_CREATE, 'create'),
+    (IN_DELETE, 'delete'),
+    (IN_MOVED_FROM, 'move'),
+    (IN_MOVED_TO, 'move'),
+    (IN_MODIFY, 'modify'),
+    (IN_CLOSE_WRITE, 'modify'),
+    (IN_ATTRIB, 'attrib'),
+    (IN_DELETE_SELF, 'delete_self'),
+    (IN_MOVE_SELF, 'delete_self'),
+)
+
+
+def _event_name(mask):
+    for flag, name in _EVENT_NAMES:
+        if mask & flag:
+            return name
+    return 'modify'
+
+
+class InotifyBackend:
+    """Kernel change notifications through libc's inotify_* calls"""
+
+    def __init__(self, dispatch):
+        libc_name = ctypes.util.find_library('c')
+        if not libc_name:
+            raise OSError("libc not found")
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self._libc, 'inotify_init1'):
+            raise OSError("inotify is not supported")
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._dispatch = dispatch
+        self._paths = {}  # wd -> path
+        self._wds = {}    # path -> wd
+        self._stop = False
+
+    def add(self, path):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {path}")
+        self._paths[wd] = path
+        self._wds[path] = wd
+
+    def remove(self, path):
+        wd = self._wds.pop(path, None)
+        if wd is not None:
+            self._paths.pop(wd, None)
+            self._libc.inotify_rm_watch(self._fd, wd)
+
+    def run(self):
+        while not self._stop:
+            ready, _, _ = select.select([self._fd], [], [], 1.0)
+            if not ready:
+                continue
+            try:
+                data = os.read(self._fd, 65536)
+            except BlockingIOError:
+                continue
+            offset = 0
+            while offset + _EVENT_HEADER.size <= len(data):
+                wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b'\0').decode('utf-8', 'surrogateescape')
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    # Events were lost, tell everyone their path may have changed
+                    for path in list(self._wds):
+                        self._dispatch(path, 'overflow', '')
+                    continue
+                path = self._paths.get(wd)
+                if path is None or mask & IN_IGNORED:
+                    continue
+                self._dispatch(path, _event_name(mask), name)
+
+    def stop(self):
+        self._stop = True
+
+
+class PollingBackend:
+    """Fallback that compares stat() results of watched paths periodically"""
+
+    def __init__(self, dispatch, interval=POLL_INTERVAL):
+        self._dispatch = dispatch
+        self._interval = interval
+        self._stats = {}
+        self._stop_event = threading.Event()
+
+    @staticmethod
+    def _stat(path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+    def add(self, path):
+        self._stats[path] = self._stat(path)
+
+    def remove(self, path):
+        self._stats.pop(path, None)
+
+    def run(self):
+        while not self._stop_event.wait(self._interval):
+            for path, old in list(self._stats.items()):
+                new = self._stat(path)
+                if new == old:
+                    continue
+                self._stats[path] = new
+                if new is None or (old is not None and new[0] != old[0]):
+                    self._dispatch(path, 'delete_self', '')
+                else:
+                    self._dispatch(path, 'modify', '')
+
+    def stop(self):
+        self._stop_event.set()
+
+
+class FileWatcher:
+    """Calls callback(path, event, name) when a watched file or directory changes"""
+
+    def __init__(self):
+        self._callbacks = {}  # path -> list of callbacks
+        self._lock = threading.Lock()
+        self._backend = None
+        self._thread = None
+
+    def _ensure_started(self):
+        if self._backend is not None:
+            return
+        try:
+            self._backend = InotifyBackend(self._dispatch)
+            kind = 'inotify'
+        except (OSError, AttributeError) as e:
+            logger.info(f"inotify unavailable ({e}), watching files by polling")
+            self._backend = PollingBackend(self._dispatch)
+            kind = 'polling'
+        self._thread = threading.Thread(target=self._run, name=f'fs-watcher-{kind}')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        try:
+            self._backend.run()
+        except Exception as e:
+            logger.error(f"File watcher stopped: {e}")
+
+    def watch(self, path, callback):
+        """Starts delivering events for path to callback; returns False if path can't be watched"""
+        path = os.path.abspath(path)
+        with self._lock:
+            self._ensure_started()
+            callbacks = self._callbacks.get(path)
+            if callbacks is None:
+                try:
+                    self._backend.add(path)
+                except OSError as e:
+                    logger.warning(f"Cannot watch {path}: {e}")
+                    return False
+                callbacks = self._callbacks[path] = []
+            if callback not in callbacks:
+                callbacks.append(callback)
+        return True
+
+    def unwatch(self, path, callback):
+        path = os.path.abspath(path)
+        with self._lock:
+            callbacks = self._callbacks.get(path)
+            if not callbacks or callback not in callbacks:
+                return
+            callbacks.remove(callback)
+            if not callbacks:
+                del self._callbacks[path]
+                self._backend.remove(path)
+
+    def _dispatch(self, path, event, name):
+        with self._lock:
+            callbacks = list(self._callbacks.get(path, ()))
+        for callback in callbacks:
+            try:
+                callback(path, event, name)
+            except Exception as e:
+                logger.error(f"File watch callback failed for {path}: {e}")
+
+    def stop(self):
+        if self._backend is not None:
+            self._backend.stop()
+
+
+# Global watcher shared by the listing cache and other subsystems
+watcher = FileWatcher()
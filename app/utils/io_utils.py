@@ -0,0 +1,26 @@
+import os
+import threading
+
+# os.pread/os.pwrite are POSIX only. Elsewhere (Windows) the same calls go through
+# lseek + read/write, one at a time, so no two of them move a file offset concurrently.
+HAVE_PREAD = hasattr(os, 'pread')
+
+_offset_lock = threading.Lock()
+
+
+def pread(fd, size, offset):
+    """Reads up to size bytes at offset without using the file position"""
+    if HAVE_PREAD:
+        return os.pread(fd, size, offset)
+    with _offset_lock:
+        os.lseek(fd, offset, os.SEEK_SET)
+        return os.read(fd, size)
+
+
+def pwrite(fd, data, offset):
+    """Writes data at offset without using the file position; returns the bytes written"""
+    if HAVE_PREAD:
+        return os.pwrite(fd, data, offset)
+    with _offset_lock:
+        os.lseek(fd, offset, os.SEEK_SET)
+        return os.write(fd, data)
@@ -0,0 +1,362 @@
+import os
+import stat
+import time
+import uuid
+import errno
+import shutil
+import threading
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from app.utils.upload_utils import unique_path
+
+logger = logging.getLogger('VPScope')
+
+# Jobs run at the same time; the rest wait in the queue
+JOB_WORKERS = int(os.getenv('VPSCOPE_JOB_WORKERS', '2'))
+MAX_FINISHED = 100          # finished jobs kept for status requests
+MAX_PATHS = 10000           # paths accepted by one job
+PROGRESS_INTERVAL = 0.25    # seconds between progress events of a job
+CHANGE_INTERVAL = 0.5       # seconds between coalesced directory change notifications
+COPY_BUFFER = 1024 * 1024
+
+OPERATIONS = ('move', 'copy', 'delete', 'chmod')
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    """One batch operation over many paths, run by the job queue"""
+
+    def __init__(self, op, paths, owner, dest=None, mode=None, recursive=False):
+        self.id = uuid.uuid4().hex
+        self.op = op
+        self.paths = paths
+        self.owner = owner
+        self.dest = dest
+        self.mode = mode
+        self.recursive = recursive
+        self.state = 'queued'
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.items_done = 0      # top-level paths finished
+        self.entries = 0         # files and directories processed, including nested ones
+        self.bytes = 0           # bytes copied
+        self.current = None
+        self.errors = []
+        self.cancel_event = threading.Event()
+        self._changed = set()    # directories changed since the last notification
+        self._last_progress = 0
+        self._last_changes = 0
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'op': self.op,
+            'state': self.state,
+            'dest': self.dest,
+            'items_total': len(self.paths),
+            'items_done': self.items_done,
+            'entries': self.entries,
+            'bytes': self.bytes,
+            'current': self.current,
+            'errors': self.errors[-20:],
+            'error_count': len(self.errors),
+            'created': self.created,
+            'elapsed': round((self.finished or time.time()) - (self.started or self.created), 2),
+        }
+
+    def check_cancelled(self):
+        if self.cancel_event.is_set():
+            raise JobCancelled()
+
+
+def _is_within(path, parent):
+    try:
+        return os.path.commonpath([path, parent]) == parent
+    except ValueError:
+        return False  # different drives
+
+
+class JobQueue:
+    """Bounded pool running batch move/copy/delete/chmod jobs with progress reporting"""
+
+    def __init__(self, workers=JOB_WORKERS):
+        self.workers = workers
+        self._jobs = OrderedDict()  # id -> Job
+        self._lock = threading.Lock()
+        self._executor = None
+        self._emit = None
+        self._notify_changes = None
+
+    def set_emitter(self, emit):
+        """emit(event, data, owner) used to deliver job events to the job's owner"""
+        self._emit = emit
+
+    def set_change_listener(self, callback):
+        """callback(directories, owner) called with directories whose contents changed"""
+        self._notify_changes = callback
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='job')
+        return self._executor
+
+    def submit(self, op, paths, owner, dest=None, mode=None, recursive=False):
+        """Validates and queues a job; raises ValueError for a bad request"""
+        if op not in OPERATIONS:
+            raise ValueError(f'Unsupported operation: {op}')
+        if not paths:
+            raise ValueError('Paths are required')
+        if len(paths) > MAX_PATHS:
+            raise ValueError(f'At most {MAX_PATHS} paths per job')
+        if op in ('move', 'copy'):
+            if not dest or not os.path.isdir(dest):
+                raise ValueError('Destination must be an existing directory')
+            for path in paths:
+                if _is_within(dest, path):
+                    raise ValueError(f'Cannot {op} a directory into itself: {path}')
+        if op == 'chmod':
+            try:
+                mode = int(str(mode), 8)
+            except (TypeError, ValueError):
+                raise ValueError('Mode must be an octal number like 644')
+            if not 0 <= mode <= 0o7777:
+                raise ValueError('Mode must be an octal number like 644')
+
+        job = Job(op, paths, owner, dest=dest, mode=mode, recursive=recursive)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        self._get_executor().submit(self._run, job)
+        return job
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(len(finished) - MAX_FINISHED, 0)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id, owner=None):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None or (owner is not None and job.owner != owner):
+            return None
+        return job
+
+    def list(self, owner=None):
+        with self._lock:
+            return [job.to_dict() for job in self._jobs.values() if owner is None or job.owner == owner]
+
+    def cancel(self, job_id, owner=None):
+        job = self.get(job_id, owner)
+        if job is None:
+            return None
+        job.cancel_event.set()
+        return job
+
+    def _run(self, job):
+        if job.cancel_event.is_set():
+            self._finish(job, 'cancelled')
+            return
+        job.state = 'running'
+        job.started = time.time()
+        self._send(job, force=True)
+        handler = getattr(self, f'_{job.op}')
+        state = 'done'
+        try:
+            for path in job.paths:
+                job.check_cancelled()
+                job.current = path
+                try:
+                    handler(job, path)
+                except JobCancelled:
+                    raise
+                except OSError as e:
+                    job.errors.append({'path': path, 'error': e.strerror or str(e)})
+                job._changed.add(os.path.dirname(path))
+                job.items_done += 1
+                self._send(job)
+        except JobCancelled:
+            state = 'cancelled'
+        except Exception as e:
+            logger.error(f"Job {job.id} ({job.op}) failed: {e}")
+            job.errors.append({'path': job.current, 'error': str(e)})
+            state = 'failed'
+        self._finish(job, state)
+
+    def _finish(self, job, state):
+        job.state = state
+        job.current = None
+        job.finished = time.time()
+        self._flush_changes(job)
+        self._send(job, force=True)
+        logger.info(f"Job {job.id} ({job.op}) {state}: {job.items_done}/{len(job.paths)} items, "
+                    f"{job.entries} entries, {len(job.errors)} errors")
+
+    def _send(self, job, force=False):
+        """Throttled job_progress event plus coalesced directory changes"""
+        now = time.time()
+        if job._changed and now - job._last_changes >= CHANGE_INTERVAL:
+            self._flush_changes(job)
+        if not force and now - job._last_progress < PROGRESS_INTERVAL:
+            return
+        job._last_progress = now
+        if self._emit:
+            self._emit('job_progress', job.to_dict(), job.owner)
+
+    def _flush_changes(self, job):
+        job._last_changes = time.time()
+        changed, job._changed = job._changed, set()
+        if changed and self._notify_changes:
+            self._notify_changes(sorted(changed), job.owner)
+
+    def _entry_done(self, job, path):
+        job.entries += 1
+        job.current = path
+        job.check_cancelled()
+        self._send(job)
+
+    # Operations; each handles one top-level path
+
+    def _delete(self, job, path):
+        st = os.lstat(path)
+        if not stat.S_ISDIR(st.st_mode):
+            os.remove(path)
+            self._entry_done(job, path)
+            return
+        # Bottom-up walk so every directory is empty when it is removed; checks for
+        # cancellation between entries instead of running one uninterruptible rmtree
+        for root, dirs, files in os.walk(path, topdown=False, onerror=self._walk_error(job)):
+            for name in files:
+                self._remove_entry(job, os.path.join(root, name), os.remove)
+            for name in dirs:
+                child = os.path.join(root, name)
+                self._remove_entry(job, child, os.remove if os.path.islink(child) else os.rmdir)
+        os.rmdir(path)
+        self._entry_done(job, path)
+
+    def _remove_entry(self, job, path, remove):
+        try:
+            remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            job.errors.append({'path': path, 'error': e.strerror or str(e)})
+        self._entry_done(job, path)
+
+    def _walk_error(self, job):
+        def onerror(e):
+            job.errors.append({'path': e.filename, 'error': e.strerror or str(e)})
+        return onerror
+
+    def _move(self, job, path):
+        target = os.path.join(job.dest, os.path.basename(path.rstrip(os.sep)))
+        if os.path.lexists(target):
+            raise FileExistsError(errno.EEXIST, 'Target already exists', target)
+        try:
+            os.rename(path, target)
+            self._entry_done(job, target)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            # Another filesystem: copy, then delete the source once the copy is complete
+            errors = len(job.errors)
+            self._copy_tree(job, path, target)
+            if len(job.errors) > errors:
+                # Some entry wasn't copied; deleting the source would lose it
+                raise OSError(errno.EIO, 'Copy incomplete, source kept', path)
+            self._delete(job, path)
+        job._changed.add(job.dest)
+
+    def _copy(self, job, path):
+        target = unique_path(job.dest, os.path.basename(path.rstrip(os.sep)))
+        self._copy_tree(job, path, target)
+        job._changed.add(job.dest)
+
+    def _copy_tree(self, job, source, target):
+        if not os.path.isdir(source) or os.path.islink(source):
+            self._copy_file(job, source, target)
+            return
+        copied_dirs = []
+        for root, dirs, files in os.walk(source, onerror=self._walk_error(job)):
+            target_root = os.path.join(target, os.path.relpath(root, source))
+            os.makedirs(target_root, exist_ok=True)
+            for name in list(dirs):
+                if os.path.islink(os.path.join(root, name)):
+                    # os.walk doesn't descend into symlinked dirs; copy the link itself
+                    self._copy_file(job, os.path.join(root, name), os.path.join(target_root, name))
+            for name in files:
+                self._copy_file(job, os.path.join(root, name), os.path.join(target_root, name))
+            copied_dirs.append((root, target_root))
+            self._entry_done(job, target_root)
+        # Once nothing more is created inside them, deepest first: a subdirectory created after
+        # its parent's copystat would reset the parent's mtime, and a read-only mode would block it
+        for root, target_root in reversed(copied_dirs):
+            try:
+                shutil.copystat(root, target_root)
+            except OSError as e:
+                job.errors.append({'path': root, 'error': e.strerror or str(e)})
+
+    def _copy_file(self, job, source, target):
+        try:
+            if os.path.islink(source):
+                os.symlink(os.readlink(source), target)
+            else:
+                self._copy_data(job, source, target)
+                shutil.copystat(source, target)
+        except JobCancelled:
+            # Don't leave a truncated copy behind
+            try:
+                os.remove(target)
+            except OSError:
+                pass
+            raise
+        except OSError as e:
+            job.errors.append({'path': source, 'error': e.strerror or str(e)})
+        self._entry_done(job, target)
+
+    def _copy_data(self, job, source, target):
+        """Copies in pieces so a large file can be cancelled and reports bytes as it goes"""
+        with open(source, 'rb') as src, open(target, 'wb') as dst:
+            in_fd, out_fd = src.fileno(), dst.fileno()
+            copy_range = getattr(os, 'copy_file_range', None)
+            while True:
+                job.check_cancelled()
+                copied = 0
+                if copy_range is not None:
+                    try:
+                        copied = copy_range(in_fd, out_fd, COPY_BUFFER)
+                    except OSError:
+                        copy_range = None  # not supported between these filesystems
+                        continue
+                else:
+                    data = src.read(COPY_BUFFER)
+                    copied = len(data)
+                    dst.write(data)
+                if not copied:
+                    break
+                job.bytes += copied
+                self._send(job)
+
+    def _chmod(self, job, path):
+        os.chmod(path, job.mode)
+        self._entry_done(job, path)
+        if not job.recursive or not os.path.isdir(path) or os.path.islink(path):
+            return
+        for root, dirs, files in os.walk(path, onerror=self._walk_error(job)):
+            for name in dirs + files:
+                child = os.path.join(root, name)
+                if os.path.islink(child):
+                    continue  # chmod would change the link target
+                try:
+                    os.chmod(child, job.mode)
+                except OSError as e:
+                    job.errors.append({'path': child, 'error': e.strerror or str(e)})
+                self._entry_done(job, child)
+
+
+# Global job queue
+jobs = JobQueue()
@@ -0,0 +1,54 @@
+import threading
+
+
+def diff_processes(prev, cur):
+    """Returns changed/new process rows, removed PIDs and the new order (if it changed)"""
+    prev_by_pid = {p['pid']: p for p in prev}
+    cur_pids = [p['pid'] for p in cur]
+    upsert = [p for p in cur if prev_by_pid.get(p['pid']) != p]
+    cur_set = set(cur_pids)
+    removed = [pid for pid in prev_by_pid if pid not in cur_set]
+    order = cur_pids if cur_pids != [p['pid'] for p in prev] else None
+    return {'upsert': upsert, 'removed': removed, 'order': order}
+
+
+def compute_delta(prev, cur):
+    """Returns only the fields of cur that differ from prev"""
+    changed = {}
+    for key, value in cur.items():
+        if key == 'processes':
+            continue
+        if key not in prev or prev[key] != value:
+            changed[key] = value
+    removed = [key for key in prev if key not in cur]
+    delta = {'changed': changed, 'removed': removed}
+    if 'processes' in cur:
+        procs = diff_processes(prev.get('processes', []), cur['processes'])
+        if procs['upsert'] or procs['removed'] or procs['order'] is not None:
+            delta['processes'] = procs
+    return delta
+
+
+class MetricsStream:
+    """Turns consecutive snapshots into sequence-numbered deltas"""
+
+    def __init__(self):
+        self._state = (0, None)  # (seq, last snapshot)
+        self._lock = threading.Lock()
+
+    def full(self):
+        """Returns the full message used for (re)synchronizing a client"""
+        seq, snapshot = self._state
+        return {'seq': seq, 'data': snapshot}
+
+    def push(self, snapshot):
+        """Records a new snapshot and returns the delta message against the previous one"""
+        with self._lock:
+            seq, prev = self._state
+            seq += 1
+            self._state = (seq, snapshot)
+        if prev is None:
+            return {'seq': seq, 'full': True, 'data': snapshot}
+        delta = compute_delta(prev, snapshot)
+        delta['seq'] = seq
+        return delta
@@ -0,0 +1,331 @@
+import os
+import struct
+import threading
+import time
+import logging
+from array import array
+from app.utils.cluster import leader
+
+logger = logging.getLogger('VPScope')
+
+# Where history is persisted between restarts
+HISTORY_PATH = os.getenv('VPSCOPE_HISTORY_PATH', os.path.join('data', 'history.bin'))
+SAVE_INTERVAL = float(os.getenv('VPSCOPE_HISTORY_SAVE_INTERVAL', '300'))  # seconds
+
+# Metrics kept in history (rates are derived from the cumulative network counters)
+HISTORY_METRICS = (
+    'cpu_percent', 'total_cpu_processes', 'ram_percent', 'disk_percent',
+    'load_1', 'net_sent_rate', 'net_recv_rate',
+)
+
+# Tiers: (name, resolution in seconds, capacity). Raw samples keep their own timestamps
+TIERS = (
+    ('raw', 0, 3600),         # ~2 hours at a 2s sample interval
+    ('minute', 60, 7 * 1440), # 7 days
+    ('hour', 3600, 366 * 24), # 1 year
+)
+
+# Longest answer a single query may return
+MAX_POINTS = 2000
+
+_MAGIC = b'VPSH1\n'
+
+
+class RingBuffer:
+    """Fixed-size ring of timestamped rows stored in flat typed arrays"""
+
+    def __init__(self, capacity, fields):
+        self.capacity = capacity
+        self.fields = fields
+        self.ts = array('d', bytes(8 * capacity))
+        self.columns = [array('f', bytes(4 * capacity)) for _ in fields]
+        self.head = 0   # physical index of the next write
+        self.count = 0
+
+    def append(self, ts, values):
+        i = self.head
+        self.ts[i] = ts
+        for column, value in zip(self.columns, values):
+            column[i] = value
+        self.head = (i + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+    def _physical(self, i):
+        # Logical index 0 is the oldest row
+        return (self.head - self.count + i) % self.capacity
+
+    def timestamp(self, i):
+        return self.ts[self._physical(i)]
+
+    def row(self, i):
+        p = self._physical(i)
+        return self.ts[p], [column[p] for column in self.columns]
+
+    def bisect(self, ts):
+        """First logical index with timestamp >= ts"""
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.timestamp(mid) < ts:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def oldest(self):
+        return self.timestamp(0) if self.count else None
+
+    def dump(self):
+        header = struct.pack('<III', self.capacity, self.head, self.count)
+        return header + self.ts.tobytes() + b''.join(c.tobytes() for c in self.columns)
+
+    def load(self, data, offset):
+        """Reads a ring written by dump(); ValueError if it is truncated or inconsistent"""
+        capacity, head, count = struct.unpack_from('<III', data, offset)
+        offset += 12
+        size = 8 * capacity + 4 * capacity * len(self.columns)
+        if offset + size > len(data):
+            raise ValueError(f"ring of {capacity} rows is truncated")
+        if capacity and (head >= capacity or count > capacity):
+            raise ValueError(f"ring position {head}/{count} is outside its {capacity} rows")
+        if capacity != self.capacity:
+            # Capacity changed between versions, skip the stored ring
+            return offset + size
+        self.ts = array('d', data[offset:offset + 8 * capacity])
+        offset += 8 * capacity
+        for i in range(len(self.columns)):
+            self.columns[i] = array('f', data[offset:offset + 4 * capacity])
+            offset += 4 * capacity
+        self.head, self.count = head, count
+        return offset
+
+
+class _Rollup:
+    """Accumulates min/avg/max of one bucket before it is written to a tier"""
+
+    __slots__ = ('bucket', 'min', 'sum', 'max', 'count')
+
+    def __init__(self, bucket):
+        self.bucket = bucket
+        self.min = float('inf')
+        self.sum = 0.0
+        self.max = float('-inf')
+        self.count = 0
+
+    def add(self, vmin, vavg, vmax, count=1):
+        self.min = min(self.min, vmin)
+        self.max = max(self.max, vmax)
+        self.sum += vavg * count
+        self.count += count
+
+    def values(self):
+        return (self.min, self.sum / self.count, self.max, self.count)
+
+
+class MetricSeries:
+    """Raw samples plus minute and hour rollups of a single metric"""
+
+    def __init__(self):
+        self.tiers = {
+            'raw': RingBuffer(TIERS[0][2], ('value',)),
+            'minute': RingBuffer(TIERS[1][2], ('min', 'avg', 'max', 'count')),
+            'hour': RingBuffer(TIERS[2][2], ('min', 'avg', 'max', 'count')),
+        }
+        self._minute = None
+        self._hour = None
+
+    def add(self, ts, value):
+        self.tiers['raw'].append(ts, (value,))
+
+        minute = int(ts // 60) * 60
+        if self._minute is not None and self._minute.bucket != minute:
+            self._flush_minute()
+        if self._minute is None:
+            self._minute = _Rollup(minute)
+        self._minute.add(value, value, value)
+
+    def _flush_minute(self):
+        rollup = self._minute
+        self._minute = None
+        vmin, vavg, vmax, count = rollup.values()
+        self.tiers['minute'].append(rollup.bucket, (vmin, vavg, vmax, count))
+
+        hour = int(rollup.bucket // 3600) * 3600
+        if self._hour is not None and self._hour.bucket != hour:
+            h = self._hour.values()
+            self.tiers['hour'].append(self._hour.bucket, h)
+            self._hour = None
+        if self._hour is None:
+            self._hour = _Rollup(hour)
+        self._hour.add(vmin, vavg, vmax, count)
+
+    def query(self, tier, t_from, t_to, step):
+        """Returns [ts, min, avg, max] rows aggregated into step-sized buckets"""
+        ring = self.tiers[tier]
+        start = ring.bisect(t_from)
+        end = ring.bisect(t_to)
+        rows = (ring.row(i) for i in range(start, end))
+        # Include the rollup still being accumulated so recent data is not missing
+        pending = {'minute': self._minute, 'hour': self._hour}.get(tier)
+        if pending is not None and pending.count and t_from <= pending.bucket < t_to:
+            rows = list(rows) + [(pending.bucket, pending.values())]
+
+        points = []
+        current = None
+        for ts, values in rows:
+            if tier == 'raw':
+                vmin = vavg = vmax = values[0]
+                count = 1
+            else:
+                vmin, vavg, vmax, count = values
+            bucket = t_from + int((ts - t_from) // step) * step
+            if current is None or current.bucket != bucket:
+                if current is not None:
+                    points.append(_point(current))
+                current = _Rollup(bucket)
+            current.add(vmin, vavg, vmax, int(count))
+        if current is not None:
+            points.append(_point(current))
+        return points
+
+
+def _pick_tier(series, t_from, step):
+    # Coarsest tier still at least as fine as step that reaches back to t_from
+    for name, resolution, _ in reversed(TIERS):
+        ring = series.tiers[name]
+        if resolution <= step and ring.count and ring.oldest() <= t_from:
+            return name
+    # Nothing covers the whole range, use whichever reaches back furthest
+    filled = [(series.tiers[name].oldest(), name) for name, _, _ in TIERS if series.tiers[name].count]
+    return min(filled)[1] if filled else 'raw'
+
+
+def _point(rollup):
+    vmin, vavg, vmax, _ = rollup.values()
+    return [rollup.bucket, round(vmin, 2), round(vavg, 2), round(vmax, 2)]
+
+
+class MetricsHistory:
+    """Bounded in-memory time series of dashboard metrics, persisted to disk"""
+
+    def __init__(self, path=HISTORY_PATH, metrics=HISTORY_METRICS):
+        self.path = path
+        self.series = {name: MetricSeries() for name in metrics}
+        self._lock = threading.Lock()
+        self._last_ts = 0
+        self._last_net = None
+        self._last_save = time.time()
+
+    def record(self, snapshot):
+        """Adds a sample from a sampler snapshot (registered as a sampler listener)"""
+        ts = time.time() - snapshot.get('group_ages', {}).get('fast', 0)
+        if ts - self._last_ts < 0.5:
+            return  # Only slow groups changed since the last sample
+        values = {
+            'cpu_percent': snapshot.get('cpu_percent'),
+            'total_cpu_processes': snapshot.get('total_cpu_processes'),
+            'ram_percent': snapshot.get('ram_percent'),
+            'disk_percent': snapshot.get('disk_percent'),
+            'load_1': snapshot['load_avg'][0] if snapshot.get('load_avg') else None,
+        }
+        net = (ts, snapshot.get('net_sent', 0), snapshot.get('net_recv', 0))
+        if self._last_net is not None and ts > self._last_net[0]:
+            elapsed = ts - self._last_net[0]
+            values['net_sent_rate'] = max(net[1] - self._last_net[1], 0) / elapsed
+            values['net_recv_rate'] = max(net[2] - self._last_net[2], 0) / elapsed
+        self._last_net = net
+
+        with self._lock:
+            self._last_ts = ts
+            for name, value in values.items():
+                if value is not None and name in self.series:
+                    self.series[name].add(ts, value)
+
+        if time.time() - self._last_save >= SAVE_INTERVAL:
+            self.save()
+
+    def query(self, metric, t_from, t_to, step=None):
+        """Range query answered from the finest tier that covers the range"""
+        if metric not in self.series:
+            raise KeyError(metric)
+        if step is None:
+            step = max((t_to - t_from) / 300, 1)
+        step = max(step, (t_to - t_from) / MAX_POINTS, 1)
+
+        series = self.series[metric]
+        with self._lock:
+            tier = _pick_tier(series, t_from, step)
+            return {
+                'metric': metric,
+                'tier': tier,
+                'step': step,
+                'from': t_from,
+                'to': t_to,
+                'points': series.query(tier, t_from, t_to, step),
+            }
+
+    def save(self):
+        """Writes all rings to disk atomically"""
+        if not leader.is_leader:
+            return  # The other workers of a cluster keep the same rings in memory only
+        with self._lock:
+            chunks = [_MAGIC, struct.pack('<I', len(self.series))]
+            for name, series in self.series.items():
+                encoded = name.encode()
+                chunks.append(struct.pack('<H', len(encoded)) + encoded)
+                for tier, _, _ in TIERS:
+                    chunks.append(series.tiers[tier].dump())
+            self._last_save = time.time()
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.error(f"Failed to save metrics history: {e}")
+
+    def load(self):
+        """Restores rings saved by a previous run, if any"""
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            logger.error(f"Failed to load metrics history: {e}")
+            return
+        if not data.startswith(_MAGIC):
+            logger.error("Metrics history file has unknown format, ignoring it")
+            return
+        # Everything is parsed into new series first, so a bad file leaves the history empty
+        loaded = {}
+        try:
+            offset = len(_MAGIC)
+            (count,) = struct.unpack_from('<I', data, offset)
+            offset += 4
+            for _ in range(count):
+                (length,) = struct.unpack_from('<H', data, offset)
+                offset += 2
+                if offset + length > len(data):
+                    raise ValueError('metric name is truncated')
+                name = data[offset:offset + length].decode()
+                offset += length
+                series = loaded[name] = MetricSeries()
+                for tier, _, _ in TIERS:
+                    offset = series.tiers[tier].load(data, offset)
+        except (struct.error, UnicodeDecodeError, ValueError) as e:
+            logger.error(f"Metrics history file is corrupted, starting with empty history: {e}")
+            return
+        with self._lock:
+            for name, series in loaded.items():
+                if name in self.series:
+                    self.series[name] = series
+
+
+# Global history store
+history = MetricsHistory()
@@ -0,0 +1,166 @@
+import os
+import json
+import threading
+import time
+import logging
+from types import MappingProxyType
+from app.utils.cluster import leader, CLUSTER_DIR
+
+logger = logging.getLogger('VPScope')
+
+# Shortest sleep between scheduler wakeups (seconds)
+MIN_WAIT = 0.2
+# Where the elected worker of a cluster publishes samples for the other workers
+SHARED_PATH = os.path.join(CLUSTER_DIR, 'metrics.json')
+
+
+class MetricsSampler:
+    """Collects metric groups in a background thread, each at its own interval"""
+
+    def __init__(self, intervals=None):
+        from app.utils.system_utils import GROUP_INTERVALS
+        self.intervals = dict(intervals or GROUP_INTERVALS)
+        self._groups = {}  # group -> (data, timestamp)
+        self._shared_mtime = None
+        self._state = None  # (snapshot, timestamp), replaced atomically
+        self._listeners = []
+        self._thread = None
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Starts the sampler thread (no-op if already running)"""
+        with self._lock:
+            if self.running:
+                return
+            self._stop_event.clear()
+            # Take the first sample right away so requests never see an empty snapshot
+            if leader.is_leader or not self._follow():
+                self._sample(list(self.intervals))
+            self._thread = threading.Thread(target=self._run, name='metrics-sampler')
+            self._thread.daemon = True
+            self._thread.start()
+        logger.info(f"Metrics sampler started (intervals {self.intervals})")
+
+    def stop(self, timeout=5):
+        """Stops the sampler thread and waits for it to finish"""
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+            self._stop_event.set()
+        if thread is not None:
+            thread.join(timeout)
+            logger.info("Metrics sampler stopped")
+
+    def add_listener(self, callback):
+        """Registers callback(snapshot) called from the sampler thread after each sample"""
+        if callback not in self._listeners:
+            self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def get_snapshot(self):
+        """Returns the latest snapshot with its age, or None before the first sample"""
+        state = self._state
+        if state is None:
+            return None
+        snapshot, timestamp = state
+        result = dict(snapshot)
+        now = time.time()
+        result['sample_age'] = round(now - timestamp, 3)
+        result['group_ages'] = {group: round(now - ts, 3) for group, ts in snapshot['_group_times'].items()}
+        del result['_group_times']
+        return result
+
+    def _due_groups(self, now):
+        due = []
+        for group, interval in self.intervals.items():
+            last = self._groups.get(group)
+            if last is None or (interval is not None and now - last[1] >= interval):
+                due.append(group)
+        return due
+
+    def _next_wait(self, now):
+        if not leader.is_leader:
+            return MIN_WAIT
+        waits = [last[1] + self.intervals[group] - now
+                 for group, last in self._groups.items()
+                 if self.intervals.get(group) is not None]
+        return max(min(waits, default=MIN_WAIT), MIN_WAIT)
+
+    def _sample(self, groups):
+        from app.utils.system_utils import GROUP_COLLECTORS
+        from app.utils.async_utils import run_blocking
+        for group in groups:
+            try:
+                data = run_blocking(GROUP_COLLECTORS[group])
+            except Exception as e:
+                logger.error(f"Metrics group '{group}' failed: {e}")
+                continue
+            self._groups[group] = (data, time.time())
+        self._assemble()
+        if leader.clustered and leader.is_leader:
+            self._publish()
+
+    def _assemble(self):
+        # Assemble the freshest data of every group into one read-only view
+        snapshot = {}
+        for data, _ in self._groups.values():
+            snapshot.update(data)
+        snapshot['_group_times'] = {group: ts for group, (_, ts) in self._groups.items()}
+        self._state = (MappingProxyType(snapshot), time.time())
+
+    def _publish(self):
+        """Writes the groups for the followers; they only stat the file until it changes"""
+        tmp_path = f"{SHARED_PATH}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump({group: [data, ts] for group, (data, ts) in self._groups.items()}, f)
+            os.replace(tmp_path, SHARED_PATH)
+        except (OSError, TypeError, ValueError) as e:
+            logger.error(f"Failed to publish metrics: {e}")
+
+    def _follow(self):
+        """Takes over the groups published by the leader; returns True if they changed"""
+        try:
+            mtime = os.stat(SHARED_PATH).st_mtime_ns
+            if mtime == self._shared_mtime:
+                return False
+            with open(SHARED_PATH) as f:
+                groups = json.load(f)
+        except (OSError, ValueError):
+            return False
+        self._shared_mtime = mtime
+        self._groups = {group: (data, ts) for group, (data, ts) in groups.items()}
+        self._assemble()
+        return True
+
+    def _notify(self):
+        snapshot = self.get_snapshot()
+        for callback in list(self._listeners):
+            try:
+                callback(snapshot)
+            except Exception as e:
+                logger.error(f"Metrics listener failed: {e}")
+
+    def _run(self):
+        while not self._stop_event.wait(self._next_wait(time.time())):
+            if not leader.is_leader:
+                # Another worker collects; pick up its samples
+                if self._follow():
+                    self._notify()
+                continue
+            due = self._due_groups(time.time())
+            if due:
+                self._sample(due)
+                self._notify()
+
+
+# Global sampler
+sampler = MetricsSampler()
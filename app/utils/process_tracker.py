@@ -0,0 +1,135 @@
+import os
+import heapq
+import threading
+import psutil
+
+# Number of processes reported and the key they are ranked by
+PROCESS_LIMIT = int(os.getenv('VPSCOPE_PROCESS_LIMIT', '20'))
+PROCESS_SORT = os.getenv('VPSCOPE_PROCESS_SORT', 'cpu')
+
+_IGNORED_NAMES = ('System Idle Process', '')
+
+
+class _Tracked:
+    """A psutil.Process kept across cycles, plus what we remember about it"""
+
+    __slots__ = ('proc', 'name', 'io_total', 'io_rate', 'cpu')
+
+    def __init__(self, proc, name):
+        self.proc = proc
+        self.name = name
+        self.io_total = None
+        self.io_rate = 0
+        self.cpu = 0.0
+
+
+def _score_cpu(tracked):
+    return tracked.cpu
+
+def _score_rss(tracked):
+    return tracked.proc.memory_info().rss
+
+def _score_io(tracked):
+    try:
+        io = tracked.proc.io_counters()
+    except (psutil.AccessDenied, AttributeError):
+        return 0
+    total = io.read_bytes + io.write_bytes
+    if tracked.io_total is not None:
+        tracked.io_rate = max(total - tracked.io_total, 0)
+    tracked.io_total = total
+    return tracked.io_rate
+
+def _score_fds(tracked):
+    if hasattr(tracked.proc, 'num_fds'):
+        return tracked.proc.num_fds()
+    return tracked.proc.num_handles()  # Windows
+
+# Available ranking keys
+SORT_KEYS = {
+    'cpu': _score_cpu,
+    'rss': _score_rss,
+    'io': _score_io,
+    'fds': _score_fds,
+}
+
+
+class ProcessTracker:
+    """Keeps psutil.Process objects between refreshes and ranks the top N"""
+
+    def __init__(self, limit=PROCESS_LIMIT, sort_key=PROCESS_SORT):
+        if sort_key not in SORT_KEYS:
+            raise ValueError(f"Unknown process sort key: {sort_key}")
+        self.limit = limit
+        self.sort_key = sort_key
+        self._tracked = {}  # (pid, create_time) -> _Tracked
+        self._lock = threading.Lock()
+
+    def _sync_pids(self):
+        # Keyed by create time too: a pid reused since the last cycle is a new process
+        current = {}
+        for pid in psutil.pids():
+            try:
+                proc = psutil.Process(pid)
+                current[(pid, proc.create_time())] = proc
+            except psutil.Error:
+                continue
+        # Drop exited processes, start tracking new ones
+        for key in [key for key in self._tracked if key not in current]:
+            del self._tracked[key]
+        for key, proc in current.items():
+            if key in self._tracked:
+                continue
+            try:
+                name = proc.name()
+                # Prime cpu_percent so the next cycle returns a real delta
+                proc.cpu_percent(None)
+            except psutil.Error:
+                continue
+            if name in _IGNORED_NAMES:
+                continue
+            self._tracked[key] = _Tracked(proc, name)
+
+    def top(self):
+        """Refreshes tracked processes and returns the top N rows"""
+        with self._lock:
+            self._sync_pids()
+            score = SORT_KEYS[self.sort_key]
+            ranked = []
+            for key, tracked in list(self._tracked.items()):
+                try:
+                    with tracked.proc.oneshot():
+                        # cpu_percent is always refreshed so deltas stay per-cycle
+                        tracked.cpu = tracked.proc.cpu_percent(None)
+                        value = score(tracked)
+                except (psutil.NoSuchProcess, psutil.ZombieProcess):
+                    del self._tracked[key]
+                    continue
+                except psutil.AccessDenied:
+                    value = 0
+                ranked.append((value, key))
+
+            rows = []
+            for value, key in heapq.nlargest(self.limit, ranked):
+                tracked = self._tracked[key]
+                try:
+                    with tracked.proc.oneshot():
+                        memory_info = tracked.proc.memory_info()
+                        memory_percent = tracked.proc.memory_percent()
+                except (psutil.NoSuchProcess, psutil.ZombieProcess):
+                    continue
+                except psutil.AccessDenied:
+                    memory_info, memory_percent = None, 0
+                rows.append({
+                    'pid': key[0],
+                    'name': tracked.name,
+                    'cpu_percent': tracked.cpu,
+                    'memory_percent': memory_percent,
+                    'rss': memory_info.rss if memory_info else 0,
+                    'sort_value': value,
+                })
+            return rows
+
+
+# Global tracker used by the processes metric group
+tracker = ProcessTracker()
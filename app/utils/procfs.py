@@ -0,0 +1,133 @@
+import os
+import glob
+import threading
+import time
+
+# Files kept open between cycles; /proc regenerates them on every read at offset 0
+PROC_FILES = ('stat', 'meminfo', 'loadavg', 'net/dev')
+CPUFREQ_GLOB = '/sys/devices/system/cpu/cpu[0-9]*/cpufreq/scaling_cur_freq'
+
+# Only the first line of /proc/stat is needed, the rest (intr, softirq) can be huge
+_STAT_READ_SIZE = 4096
+
+
+class ProcfsReader:
+    """Linux metrics read straight from /proc with pread into reusable buffers"""
+
+    def __init__(self, root='/proc'):
+        self._fds = {}
+        self._lock = threading.Lock()
+        self._buf = bytearray(16384)
+        self._last_cpu = None  # (total, busy) jiffies of the previous cycle
+        try:
+            for name in PROC_FILES:
+                self._fds[name] = os.open(os.path.join(root, name), os.O_RDONLY)
+            self._freq_fds = [os.open(path, os.O_RDONLY) for path in sorted(glob.glob(CPUFREQ_GLOB))]
+        except OSError:
+            self.close()
+            raise
+        self.boot_time = self._read_boot_time(root)
+
+    def close(self):
+        for fd in list(self._fds.values()) + list(getattr(self, '_freq_fds', [])):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        self._fds = {}
+        self._freq_fds = []
+
+    def _read(self, fd, limit=None):
+        """Reads the whole file at offset 0 into the shared buffer, growing it if needed"""
+        while True:
+            view = memoryview(self._buf)
+            if limit is not None:
+                view = view[:limit]
+            n = os.preadv(fd, [view], 0)
+            if limit is not None or n < len(self._buf):
+                return bytes(view[:n])
+            self._buf = bytearray(len(self._buf) * 2)
+
+    def _read_boot_time(self, root):
+        with open(os.path.join(root, 'stat'), 'rb') as f:
+            for line in f:
+                if line.startswith(b'btime'):
+                    return float(line.split()[1])
+        return time.time()
+
+    def cpu_percent(self, data):
+        # cpu  user nice system idle iowait irq softirq steal guest guest_nice
+        fields = data[:data.index(b'\n')].split()[1:]
+        times = [int(x) for x in fields]
+        idle = times[3] + (times[4] if len(times) > 4 else 0)
+        # guest time is already included in user/nice
+        total = sum(times[:8])
+        busy = total - idle
+        last = self._last_cpu
+        self._last_cpu = (total, busy)
+        if last is None or total <= last[0]:
+            return 0.0
+        return round(min(max((busy - last[1]) / (total - last[0]) * 100, 0.0), 100.0), 1)
+
+    @staticmethod
+    def memory(data):
+        values = {}
+        wanted = (b'MemTotal:', b'MemFree:', b'MemAvailable:', b'Buffers:', b'Cached:', b'SReclaimable:')
+        for line in data.split(b'\n'):
+            key, _, rest = line.partition(b' ')
+            if key in wanted:
+                values[key] = int(rest.split()[0]) * 1024
+                if len(values) == len(wanted):
+                    break
+        total = values.get(b'MemTotal:', 0)
+        free = values.get(b'MemFree:', 0)
+        cached = values.get(b'Cached:', 0) + values.get(b'SReclaimable:', 0)
+        available = values.get(b'MemAvailable:', free)
+        # Same definitions psutil 5.9 virtual_memory() uses on Linux
+        used = total - free - values.get(b'Buffers:', 0) - cached
+        if used < 0:
+            used = total - free
+        percent = round((total - available) / total * 100, 1) if total else 0
+        return total, used, percent
+
+    @staticmethod
+    def net_totals(data):
+        sent = recv = 0
+        # Two header lines, then "iface: rx_bytes ... (8 rx fields) tx_bytes ..."
+        for line in data.split(b'\n')[2:]:
+            _, sep, counters = line.partition(b':')
+            if not sep:
+                continue
+            fields = counters.split()
+            recv += int(fields[0])
+            sent += int(fields[8])
+        return sent, recv
+
+    def cpu_freq(self):
+        if not self._freq_fds:
+            return None
+        total = 0
+        for fd in self._freq_fds:
+            total += int(self._read(fd, 64))
+        # scaling_cur_freq is in kHz
+        return total / len(self._freq_fds) / 1000
+
+    def collect_fast(self):
+        """Same fields as system_utils.collect_fast(), without psutil"""
+        with self._lock:
+            cpu_percent = self.cpu_percent(self._read(self._fds['stat'], _STAT_READ_SIZE))
+            ram_total, ram_used, ram_percent = self.memory(self._read(self._fds['meminfo']))
+            load_avg = tuple(float(x) for x in self._read(self._fds['loadavg']).split()[:3])
+            net_sent, net_recv = self.net_totals(self._read(self._fds['net/dev']))
+            cpu_freq = self.cpu_freq()
+        return {
+            'cpu_percent': cpu_percent,
+            'cpu_freq_current': round(cpu_freq, 2) if cpu_freq is not None else None,
+            'ram_used': ram_used,
+            'ram_total': ram_total,
+            'ram_percent': ram_percent,
+            'net_sent': net_sent,
+            'net_recv': net_recv,
+            'uptime_seconds': int(time.time() - self.boot_time),
+            'load_avg': load_avg,
+        }
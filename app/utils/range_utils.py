@@ -0,0 +1,198 @@
+import os
+import ssl
+import uuid
+import mimetypes
+from urllib.parse import quote
+from flask import Response, request
+from werkzeug.http import http_date
+from werkzeug.wsgi import FileWrapper
+
+CHUNK_SIZE = 1024 * 1024
+MAX_RANGES = 64  # more parts than this is treated as abuse and the Range header is ignored
+
+
+def file_etag(st):
+    """Strong ETag from inode, size and mtime; changes whenever the content can"""
+    return f"{st.st_ino:x}-{st.st_size:x}-{st.st_mtime_ns:x}"
+
+
+def parse_ranges(header, size):
+    """Returns sorted, merged [(start, end)] for a Range header, [] if unsatisfiable, None to ignore it"""
+    units, _, spec = header.partition('=')
+    if units.strip().lower() != 'bytes' or not spec:
+        return None
+    items = spec.split(',')
+    if len(items) > MAX_RANGES:
+        return None
+    ranges = []
+    for item in items:
+        first, dash, last = item.strip().partition('-')
+        if not dash or not (first + last).isdigit():
+            return None  # malformed header, serve the whole file
+        if not first:  # suffix range: last N bytes
+            start, stop = max(size - int(last), 0), size
+        else:
+            start = int(first)
+            stop = size if not last else min(int(last) + 1, size)
+            if last and int(last) < start:
+                return None
+        if start < stop:
+            ranges.append((start, stop))
+    ranges.sort()
+    merged = []
+    for start, stop in ranges:
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], stop))
+        else:
+            merged.append((start, stop))
+    return merged
+
+
+def _if_range_matches(etag, st):
+    if_range = request.if_range
+    if if_range.etag is not None:
+        return if_range.etag == etag
+    if if_range.date is not None:
+        # Only an exact match with our Last-Modified (whole seconds) validates the range
+        return if_range.date.timestamp() == int(st.st_mtime)
+    return True
+
+
+def _read_chunks(f, spans):
+    """Yields file data chunk by chunk with seek + read (the file object is ours alone).
+
+    Reads stop at the file's current end: a file truncated after the
+    headers were sent ends the body early (the client sees an incomplete
+    response) instead of crashing the process like a mapping would.
+    """
+    try:
+        for span in spans:
+            if isinstance(span, bytes):
+                yield span
+                continue
+            position, stop = span
+            f.seek(position)
+            while position < stop:
+                data = f.read(min(CHUNK_SIZE, stop - position))
+                if not data:
+                    return
+                yield data
+                position += len(data)
+    finally:
+        f.close()
+
+
+def _sendfile_socket():
+    """Client socket of the Werkzeug server when the body can go out with sendfile(), else None"""
+    sock = request.environ.get('werkzeug.socket')
+    if sock is None or not hasattr(os, 'sendfile') or isinstance(sock, ssl.SSLSocket):
+        return None
+    return sock
+
+
+def _sendfile_chunks(f, sock, spans):
+    """Sends the spans from the page cache straight to the socket.
+
+    The empty first chunk makes the server send the headers; the data then
+    bypasses Python buffers (socket.sendfile waits out a full send buffer
+    and stops at the file's current end, like _read_chunks).
+    """
+    try:
+        yield b''
+        for span in spans:
+            if isinstance(span, bytes):
+                sock.sendall(span)
+                continue
+            start, stop = span
+            if sock.sendfile(f, start, stop - start) < stop - start:
+                return
+    finally:
+        f.close()
+
+
+def _body(f, spans):
+    sock = _sendfile_socket()
+    if sock is not None:
+        return _sendfile_chunks(f, sock, spans)
+    return _read_chunks(f, spans)
+
+
+def _server_file_wrapper():
+    """wsgi.file_wrapper when the server implements it with sendfile (e.g. gunicorn), else None"""
+    wrapper = request.environ.get('wsgi.file_wrapper')
+    if wrapper is None or wrapper is FileWrapper:
+        return None
+    return wrapper
+
+
+def send_ranged(path, as_attachment=False):
+    """Serves a file with ETag, If-Range and single or multipart byte ranges"""
+    f = open(path, 'rb')
+    try:
+        st = os.fstat(f.fileno())
+        size = st.st_size
+        etag = file_etag(st)
+        mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+        headers = {
+            'Accept-Ranges': 'bytes',
+            'ETag': f'"{etag}"',
+            'Last-Modified': http_date(st.st_mtime),
+            'Cache-Control': 'no-cache',
+        }
+        if as_attachment:
+            name = os.path.basename(path)
+            try:
+                name.encode('ascii')
+                headers['Content-Disposition'] = f'attachment; filename="{name}"'
+            except UnicodeEncodeError:
+                headers['Content-Disposition'] = f"attachment; filename*=UTF-8''{quote(name)}"
+
+        if request.if_none_match.contains(etag):
+            f.close()
+            return Response(status=304, headers=headers)
+
+        ranges = None
+        range_header = request.headers.get('Range')
+        if range_header and _if_range_matches(etag, st):
+            ranges = parse_ranges(range_header, size)
+            if ranges == []:
+                f.close()
+                headers['Content-Range'] = f'bytes */{size}'
+                return Response(status=416, headers=headers)
+
+        if not ranges or len(ranges) == 1:
+            start, stop = ranges[0] if ranges else (0, size)
+            status = 206 if ranges else 200
+            if ranges:
+                headers['Content-Range'] = f'bytes {start}-{stop - 1}/{size}'
+            headers['Content-Length'] = str(stop - start)
+            wrapper = _server_file_wrapper()
+            if wrapper is not None:
+                # The server sends from the current offset for Content-Length bytes
+                f.seek(start)
+                body = wrapper(f, CHUNK_SIZE)
+            else:
+                body = _body(f, [(start, stop)])
+            return Response(body, status=status, headers=headers, mimetype=mimetype,
+                            direct_passthrough=True)
+
+        # Several ranges: multipart/byteranges
+        boundary = uuid.uuid4().hex
+        spans = []
+        length = 0
+        for start, stop in ranges:
+            part_header = (f'--{boundary}\r\nContent-Type: {mimetype}\r\n'
+                           f'Content-Range: bytes {start}-{stop - 1}/{size}\r\n\r\n').encode()
+            spans.extend([part_header, (start, stop), b'\r\n'])
+            length += len(part_header) + (stop - start) + 2
+        closing = f'--{boundary}--\r\n'.encode()
+        spans.append(closing)
+        length += len(closing)
+        headers['Content-Length'] = str(length)
+        return Response(_body(f, spans), status=206, headers=headers,
+                        content_type=f'multipart/byteranges; boundary={boundary}',
+                        direct_passthrough=True)
+    except Exception:
+        f.close()
+        raise
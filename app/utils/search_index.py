@@ -0,0 +1,459 @@
+import os
+import re
+import time
+import fnmatch
+import marshal
+import threading
+import logging
+from array import array
+try:
+    from re import _parser as sre_parse, _constants as sre_constants
+except ImportError:  # Python < 3.11
+    import sre_parse
+    import sre_constants
+from app.utils.fs_watcher import watcher
+from app.utils.cluster import leader
+
+logger = logging.getLogger('VPScope')
+
+SEARCH_ENABLED = os.getenv('VPSCOPE_SEARCH', '1') == '1'
+CONTENT_ENABLED = os.getenv('VPSCOPE_SEARCH_CONTENT', '0') == '1'
+INDEX_PATH = os.getenv('VPSCOPE_SEARCH_INDEX', os.path.join('data', 'search_index.bin'))
+EXCLUDE = set(filter(None, os.getenv('VPSCOPE_SEARCH_EXCLUDE',
+                                     '.git,node_modules,__pycache__,.venv,venv').split(',')))
+MAX_ENTRIES = int(os.getenv('VPSCOPE_SEARCH_MAX_FILES', '2000000'))
+MAX_WATCHES = int(os.getenv('VPSCOPE_SEARCH_MAX_WATCHES', '8192'))
+CONTENT_MAX_BYTES = int(os.getenv('VPSCOPE_SEARCH_CONTENT_MAX', str(1024 * 1024)))
+RESCAN_INTERVAL = 600  # seconds; catches changes in directories beyond MAX_WATCHES
+SAVE_INTERVAL = 300
+REFRESH_DELAY = 0.5  # seconds; coalesces bursts of events in one directory
+MAX_MATCHES_PER_FILE = 20
+INDEX_FORMAT = 1
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+_REPEATS = {sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT,
+            getattr(sre_constants, 'POSSESSIVE_REPEAT', sre_constants.MAX_REPEAT)}
+
+
+def _literal_runs(pattern):
+    """Literal substrings every match of a regex must contain; empty if unknown.
+
+    Taken from the parsed pattern, so escapes (\\x2e, \\u0061, \\N{...})
+    mean what re makes of them. Only the top-level concatenation is used:
+    a group, class or alternation may match without any given literal.
+    """
+    try:
+        parsed = sre_parse.parse(pattern)
+    except (re.error, OverflowError, RecursionError):
+        return []
+    runs = []
+    run = ''
+    for op, value in parsed:
+        if op is sre_constants.LITERAL:
+            run += chr(value)
+            continue
+        if op in _REPEATS:
+            low, high, item = value
+            if low and len(item) == 1 and item[0][0] is sre_constants.LITERAL:
+                # x{2,5}: the first two are there; what follows may be more of x
+                char = chr(item[0][1]) * low
+                run += char
+                if high == low:
+                    continue
+                runs.append(run)
+                run = char
+                continue
+        runs.append(run)
+        run = ''
+    runs.append(run)
+    return [run for run in runs if len(run) >= 3]
+
+
+def _join(directory, name):
+    return f"{directory}/{name}" if directory else name
+
+
+class SearchIndex:
+    """Trigram index of file names (and optionally text contents) below a root directory"""
+
+    def __init__(self):
+        self.root = None
+        self.paths = []          # id -> relative path, None once removed
+        self.ids = {}            # relative path -> id
+        self.children = {}       # relative dir -> set of child names
+        self.name_tri = {}       # trigram -> array of ids
+        self.content_tri = {}    # trigram (bytes) -> array of ids
+        self.content_mtimes = {}  # id -> mtime_ns of indexed content
+        self.removed = 0
+        self.building = False
+        self.dirty = False
+        self._lock = threading.RLock()
+        self._watched = set()
+        self._pending = set()
+        self._pending_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    # Lifecycle
+
+    def start(self, root):
+        if not SEARCH_ENABLED or self._thread is not None:
+            return
+        self.root = os.path.abspath(root)
+        self.load()
+        self._thread = threading.Thread(target=self._run, name='search-index')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        for directory in list(self._watched):
+            watcher.unwatch(directory, self._on_event)
+        self._watched.clear()
+        self.save()
+
+    def _run(self):
+        last_save = time.time()
+        while not self._stop.is_set():
+            self.building = True
+            started = time.time()
+            try:
+                self._scan_tree('', full=True)
+            except Exception as e:
+                logger.error(f"Search index scan failed: {e}")
+            self.building = False
+            logger.info(f"Search index: {len(self.ids)} entries under {self.root} "
+                        f"({time.time() - started:.1f}s)")
+            self.save()
+            deadline = time.time() + RESCAN_INTERVAL
+            while not self._stop.wait(min(SAVE_INTERVAL, max(deadline - time.time(), 0.1))):
+                if time.time() - last_save >= SAVE_INTERVAL:
+                    self.save()
+                    last_save = time.time()
+                if time.time() >= deadline:
+                    break
+
+    # Persistence
+
+    def save(self):
+        # Workers of a cluster index the same tree; only the elected one writes the file
+        if not self.dirty or self.root is None or not leader.is_leader:
+            return
+        with self._lock:
+            self._compact()
+            state = {
+                'format': INDEX_FORMAT,
+                'root': self.root,
+                'content': CONTENT_ENABLED,
+                'paths': self.paths,
+                'dirs': [path for path in self.children],
+                'name_tri': {tri: ids.tobytes() for tri, ids in self.name_tri.items()},
+                'content_tri': {tri: ids.tobytes() for tri, ids in self.content_tri.items()},
+                'content_mtimes': self.content_mtimes,
+            }
+            data = marshal.dumps(state)
+            self.dirty = False
+        directory = os.path.dirname(INDEX_PATH)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = INDEX_PATH + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, INDEX_PATH)
+
+    def load(self):
+        try:
+            with open(INDEX_PATH, 'rb') as f:
+                state = marshal.load(f)
+        except (OSError, EOFError, ValueError, TypeError):
+            return False
+        if (state.get('format') != INDEX_FORMAT or state.get('root') != self.root
+                or state.get('content') != CONTENT_ENABLED):
+            return False
+
+        def postings(raw):
+            ids = array('I')
+            ids.frombytes(raw)
+            return ids
+
+        with self._lock:
+            self.paths = state['paths']
+            self.ids = {path: i for i, path in enumerate(self.paths) if path is not None}
+            self.children = {path: set() for path in state['dirs']}
+            for path in self.ids:
+                parent, _, name = path.rpartition('/')
+                self.children.setdefault(parent, set()).add(name)
+            self.name_tri = {tri: postings(raw) for tri, raw in state['name_tri'].items()}
+            self.content_tri = {tri: postings(raw) for tri, raw in state['content_tri'].items()}
+            self.content_mtimes = state['content_mtimes']
+            self.removed = self.paths.count(None)
+        logger.info(f"Search index loaded: {len(self.ids)} entries")
+        return True
+
+    # Index maintenance
+
+    def _add(self, path, is_dir, st=None):
+        if len(self.ids) >= MAX_ENTRIES:
+            return
+        entry_id = len(self.paths)
+        self.paths.append(path)
+        self.ids[path] = entry_id
+        name = path.rpartition('/')[2].lower()
+        for tri in _trigrams(name):
+            self.name_tri.setdefault(tri, array('I')).append(entry_id)
+        if is_dir:
+            self.children.setdefault(path, set())
+        elif CONTENT_ENABLED and st is not None:
+            self._index_content(entry_id, path, st)
+        self.dirty = True
+
+    def _remove(self, path):
+        entry_id = self.ids.pop(path, None)
+        if entry_id is None:
+            return
+        self.paths[entry_id] = None
+        self.content_mtimes.pop(entry_id, None)
+        self.removed += 1
+        names = self.children.pop(path, None)
+        if names:
+            for name in names:
+                self._remove(_join(path, name))
+        if names is not None:
+            self._unwatch(path)
+        self.dirty = True
+
+    def _index_content(self, entry_id, path, st):
+        if st.st_size > CONTENT_MAX_BYTES:
+            return
+        try:
+            with open(os.path.join(self.root, path), 'rb') as f:
+                data = f.read(CONTENT_MAX_BYTES)
+        except OSError:
+            return
+        if b'\0' in data[:8192]:
+            return  # binary
+        # Lowercase as text so non-ASCII letters match case-insensitively too
+        for tri in _trigrams(data.decode('utf-8', 'replace').lower().encode('utf-8')):
+            self.content_tri.setdefault(tri, array('I')).append(entry_id)
+        self.content_mtimes[entry_id] = st.st_mtime_ns
+
+    def _compact(self):
+        """Drops removed ids from the postings once they make up a large share"""
+        if self.removed < 1000 or self.removed < len(self.paths) // 3:
+            return
+        remap = {}
+        paths = []
+        for old_id, path in enumerate(self.paths):
+            if path is not None:
+                remap[old_id] = len(paths)
+                paths.append(path)
+
+        def rebuild(index):
+            result = {}
+            for tri, ids in index.items():
+                live = array('I', (remap[i] for i in ids if i in remap))
+                if live:
+                    result[tri] = live
+            return result
+
+        self.name_tri = rebuild(self.name_tri)
+        self.content_tri = rebuild(self.content_tri)
+        self.content_mtimes = {remap[i]: m for i, m in self.content_mtimes.items() if i in remap}
+        self.paths = paths
+        self.ids = {path: i for i, path in enumerate(paths)}
+        self.removed = 0
+
+    def _watch(self, path):
+        full = os.path.join(self.root, path)
+        if full in self._watched or len(self._watched) >= MAX_WATCHES:
+            return
+        if watcher.watch(full, self._on_event):
+            self._watched.add(full)
+
+    def _unwatch(self, path):
+        full = os.path.join(self.root, path)
+        if full in self._watched:
+            self._watched.discard(full)
+            watcher.unwatch(full, self._on_event)
+
+    def _refresh_dir(self, path):
+        """Brings one directory's children in line with disk; returns child directories"""
+        full = os.path.join(self.root, path) if path else self.root
+        try:
+            with os.scandir(full) as it:
+                entries = [entry for entry in it if entry.name not in EXCLUDE]
+        except OSError:
+            if path:
+                with self._lock:
+                    self._remove(path)
+            return []
+        subdirs = []
+        with self._lock:
+            self._watch(path)
+            old_names = self.children.get(path, set())
+            new_names = set()
+            for entry in entries:
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                    st = entry.stat(follow_symlinks=False) if CONTENT_ENABLED and not is_dir else None
+                except OSError:
+                    continue
+                new_names.add(entry.name)
+                child = _join(path, entry.name)
+                entry_id = self.ids.get(child)
+                if entry_id is not None and is_dir != (child in self.children):
+                    self._remove(child)
+                    entry_id = None
+                if entry_id is None:
+                    self._add(child, is_dir, st)
+                elif st is not None and self.content_mtimes.get(entry_id, st.st_mtime_ns) != st.st_mtime_ns:
+                    # Content changed: index it under a fresh id
+                    self._remove(child)
+                    self._add(child, False, st)
+                if is_dir:
+                    subdirs.append(child)
+            for name in old_names - new_names:
+                self._remove(_join(path, name))
+            self.children[path] = new_names
+        return subdirs
+
+    def _scan_tree(self, path, full=False):
+        """Refreshes path and, recursively, its subdirectories (all of them, or only new ones)"""
+        stack = [path]
+        while stack and not self._stop.is_set():
+            directory = stack.pop()
+            known = set(self.children.get(directory, ()))
+            for subdir in self._refresh_dir(directory):
+                if full or subdir.rpartition('/')[2] not in known:
+                    stack.append(subdir)
+
+    def _on_event(self, path, event, name):
+        if event == 'overflow':
+            path = self.root
+        relative = os.path.relpath(path, self.root)
+        relative = '' if relative == '.' else relative.replace(os.sep, '/')
+        with self._pending_lock:
+            if relative in self._pending:
+                return
+            self._pending.add(relative)
+        timer = threading.Timer(REFRESH_DELAY, self._flush_event, args=(relative,))
+        timer.daemon = True
+        timer.start()
+
+    def _flush_event(self, path):
+        with self._pending_lock:
+            self._pending.discard(path)
+        try:
+            self._scan_tree(path)
+        except Exception as e:
+            logger.error(f"Search index update failed for {path}: {e}")
+
+    # Queries
+
+    def _candidates(self, index, grams):
+        """Ids present in the postings of every trigram, or None if nothing narrows the search"""
+        if not grams:
+            return None
+        with self._lock:
+            lists = []
+            for gram in grams:
+                ids = index.get(gram)
+                if ids is None:
+                    return []
+                lists.append(ids)
+            lists.sort(key=len)
+            result = set(lists[0])
+            for ids in lists[1:]:
+                result.intersection_update(ids)
+                if not result:
+                    break
+        return sorted(result)
+
+    def search(self, query, mode='name', regex=False, glob=None, subdir=None, limit=1000):
+        """Yields matches as dicts; names are matched case-insensitively"""
+        if mode == 'content' and not CONTENT_ENABLED:
+            raise ValueError("Content search is disabled (set VPSCOPE_SEARCH_CONTENT=1)")
+        pattern = re.compile(query, re.IGNORECASE) if regex else None
+        needle = query.lower()
+        literals = [run.lower() for run in _literal_runs(query)] if regex else ([needle] if query else [])
+        glob = glob.lower() if glob else None
+        prefix = subdir.strip('/').replace(os.sep, '/') + '/' if subdir and subdir.strip('/.') else ''
+
+        with self._lock:
+            # Ids are only valid together with this paths list (compaction renumbers them)
+            paths = self.paths
+            if mode == 'content':
+                grams = set().union(*(_trigrams(run.encode('utf-8')) for run in literals)) if literals else set()
+                candidates = self._candidates(self.content_tri, grams)
+                if candidates is None:
+                    candidates = sorted(self.content_mtimes)
+            else:
+                grams = set().union(*(_trigrams(run) for run in literals)) if literals else set()
+                candidates = self._candidates(self.name_tri, grams)
+                if candidates is None:
+                    candidates = range(len(paths))
+
+        count = 0
+        for entry_id in candidates:
+            if count >= limit:
+                return
+            path = paths[entry_id] if entry_id < len(paths) else None
+            if path is None or (prefix and not path.startswith(prefix)):
+                continue
+            name = path.rpartition('/')[2]
+            if glob and not fnmatch.fnmatchcase(name.lower(), glob):
+                continue
+            full = os.path.join(self.root, path)
+            if mode == 'content':
+                for line_number, text in self._grep(full, needle, pattern):
+                    yield {'path': full, 'name': name, 'is_dir': False, 'line': line_number, 'text': text}
+                    count += 1
+                    if count >= limit:
+                        return
+                continue
+            if pattern is not None:
+                if not pattern.search(name):
+                    continue
+            elif needle not in name.lower():
+                continue
+            yield {'path': full, 'name': name, 'is_dir': path in self.children}
+            count += 1
+
+    def _grep(self, full, needle, pattern):
+        """Yields (line number, line) for matches in one file"""
+        try:
+            with open(full, 'rb') as f:
+                # read, not mmap: a file truncated meanwhile just reads short instead of SIGBUS
+                text = f.read(CONTENT_MAX_BYTES).decode('utf-8', 'replace')
+        except OSError:
+            return
+        if pattern is not None:
+            positions = (m.start() for m in pattern.finditer(text))
+        else:
+            lowered = text.lower()
+            positions = (m.start() for m in re.finditer(re.escape(needle), lowered)) if needle else iter(())
+        found = 0
+        last_line = -1
+        for position in positions:
+            line_number = text.count('\n', 0, position) + 1
+            if line_number == last_line:
+                continue
+            last_line = line_number
+            start = text.rfind('\n', 0, position) + 1
+            end = text.find('\n', position)
+            yield line_number, text[start:end if end >= 0 else len(text)][:500]
+            found += 1
+            if found >= MAX_MATCHES_PER_FILE:
+                return
+
+    def stats(self):
+        return {'root': self.root, 'entries': len(self.ids), 'building': self.building,
+                'content': CONTENT_ENABLED, 'watched_dirs': len(self._watched)}
+
+
+# Global search index
+search_index = SearchIndex()
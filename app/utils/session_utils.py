@@ -0,0 +1,260 @@
+import os
+import json
+import time
+import secrets
+import logging
+import threading
+from functools import wraps
+from collections import OrderedDict
+from flask import g, request
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin, SecureCookieSessionInterface
+from werkzeug.datastructures import CallbackDict
+
+logger = logging.getLogger('VPScope')
+
+# Where login sessions live: 'cookie' (signed, nothing stored on the server), 'memory'
+# (this process, with TTL eviction and optional snapshots) or 'filesystem' (Flask-Session files)
+SESSION_BACKENDS = ('cookie', 'memory', 'filesystem')
+SESSION_BACKEND = os.getenv('VPSCOPE_SESSION_BACKEND', 'cookie')
+# memory: most sessions kept; the least recently used are dropped beyond it
+MAX_SESSIONS = int(os.getenv('VPSCOPE_SESSION_MAX', '10000'))
+# memory: file the sessions are saved to so a restart doesn't log everyone out (empty: never saved)
+SNAPSHOT_PATH = os.getenv('VPSCOPE_SESSION_SNAPSHOT', '')
+SNAPSHOT_INTERVAL = 60  # seconds
+SWEEP_INTERVAL = 60  # seconds between removals of expired sessions
+# filesystem: session files kept before the oldest are pruned
+FILE_THRESHOLD = int(os.getenv('VPSCOPE_SESSION_FILES', '500'))
+
+if SESSION_BACKEND not in SESSION_BACKENDS:
+    raise ValueError(f"VPSCOPE_SESSION_BACKEND must be one of {', '.join(SESSION_BACKENDS)}, "
+                     f"not {SESSION_BACKEND!r}")
+
+
+def read_only_session(view):
+    """Marks a view that never changes the session (polled endpoints).
+
+    Its responses neither refresh the session expiry nor write the session
+    back, unless the view really modified it.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.read_only_session = True
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def _is_read_only():
+    # Static files never touch the session
+    return request.endpoint == 'static' or g.get('read_only_session', False)
+
+
+class ReadOnlySessionMixin:
+    """Skips the per-request session refresh on read-only requests"""
+
+    def should_set_cookie(self, app, session):
+        if _is_read_only():
+            return session.modified
+        return super().should_set_cookie(app, session)
+
+    def should_set_storage(self, app, session):
+        if _is_read_only():
+            return session.modified
+        return super().should_set_storage(app, session)
+
+
+def _make_permanent(app, session):
+    # SESSION_PERMANENT: logins last PERMANENT_SESSION_LIFETIME instead of the browser session
+    if session and app.config.get('SESSION_PERMANENT') and '_permanent' not in session:
+        session.permanent = True
+
+
+class CookieSessionInterface(ReadOnlySessionMixin, SecureCookieSessionInterface):
+    """Flask's signed cookie sessions"""
+
+    def save_session(self, app, session, response):
+        _make_permanent(app, session)
+        super().save_session(app, session, response)
+
+
+class MemorySession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None):
+        def on_update(self):
+            self.modified = True
+            self.accessed = True
+        super().__init__(initial, on_update)
+        self.sid = sid or secrets.token_urlsafe(32)
+        self.modified = False
+        self.accessed = False
+
+    def __bool__(self):
+        # A session holding only the permanent flag (e.g. after logout) is not stored
+        return bool(dict(self)) and self.keys() != {'_permanent'}
+
+    def __getitem__(self, key):
+        self.accessed = True
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        self.accessed = True
+        return super().get(key, default)
+
+    def setdefault(self, key, default=None):
+        self.accessed = True
+        return super().setdefault(key, default)
+
+
+class MemorySessionInterface(ReadOnlySessionMixin, SessionInterface):
+    """Sessions in a dict of this process; the cookie holds only a random id.
+
+    Entries are stored serialized, expire after PERMANENT_SESSION_LIFETIME of
+    inactivity and are dropped least recently used first beyond MAX_SESSIONS.
+    """
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, max_sessions=MAX_SESSIONS, snapshot_path=SNAPSHOT_PATH):
+        self.max_sessions = max_sessions
+        self.snapshot_path = snapshot_path
+        self._sessions = OrderedDict()  # sid -> [serialized data, expires (unix time)]
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._last_sweep = time.time()
+        self._last_snapshot = time.time()
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            with self._lock:
+                entry = self._sessions.get(sid)
+                if entry is not None and entry[1] > time.time():
+                    self._sessions.move_to_end(sid)
+                    data = entry[0]
+                else:
+                    data = None
+            if data is not None:
+                return MemorySession(self.serializer.loads(data), sid)
+        return MemorySession()
+
+    def save_session(self, app, session, response):
+        _make_permanent(app, session)
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if session.accessed:
+            response.vary.add('Cookie')
+        if not session:
+            if session.modified:
+                with self._lock:
+                    if self._sessions.pop(session.sid, None) is not None:
+                        self._dirty = True
+                response.delete_cookie(name, domain=domain, path=path, secure=self.get_cookie_secure(app),
+                                       samesite=self.get_cookie_samesite(app))
+                response.vary.add('Cookie')
+            return
+        if not self.should_set_cookie(app, session):
+            return
+
+        now = time.time()
+        expires = now + app.permanent_session_lifetime.total_seconds()
+        with self._lock:
+            entry = self._sessions.get(session.sid)
+            if session.modified or entry is None:
+                self._sessions[session.sid] = [self.serializer.dumps(dict(session)), expires]
+            else:
+                entry[1] = expires  # Only the expiry is refreshed
+            self._sessions.move_to_end(session.sid)
+            self._dirty = True
+            if now - self._last_sweep >= SWEEP_INTERVAL or len(self._sessions) > self.max_sessions:
+                self._sweep(now)
+        if self.snapshot_path and now - self._last_snapshot >= SNAPSHOT_INTERVAL:
+            self.snapshot()
+
+        response.set_cookie(name, session.sid, expires=self.get_expiration_time(app, session),
+                            httponly=self.get_cookie_httponly(app), domain=domain, path=path,
+                            secure=self.get_cookie_secure(app), samesite=self.get_cookie_samesite(app))
+        response.vary.add('Cookie')
+
+    def _sweep(self, now):
+        self._last_sweep = now
+        for sid in [sid for sid, (_, expires) in self._sessions.items() if expires <= now]:
+            del self._sessions[sid]
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    def snapshot(self):
+        """Writes the live sessions to snapshot_path atomically (owner-only, they are credentials)"""
+        if not self.snapshot_path:
+            return
+        with self._lock:
+            self._last_snapshot = time.time()
+            if not self._dirty:
+                return
+            self._sweep(time.time())
+            data = json.dumps(self._sessions)
+            self._dirty = False
+        try:
+            directory = os.path.dirname(self.snapshot_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.snapshot_path}.tmp"
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'w') as f:
+                f.write(data)
+            os.replace(tmp_path, self.snapshot_path)
+        except OSError as e:
+            logger.error(f"Failed to save sessions: {e}")
+
+    def load(self):
+        """Restores the sessions of a previous run from snapshot_path, if any"""
+        if not self.snapshot_path:
+            return
+        try:
+            with open(self.snapshot_path) as f:
+                sessions = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.error(f"Failed to load sessions: {e}")
+            return
+        now = time.time()
+        try:
+            live = [(sid, data, float(expires)) for sid, (data, expires) in sessions.items()
+                    if isinstance(sid, str) and isinstance(data, str) and float(expires) > now]
+        except (AttributeError, TypeError, ValueError) as e:
+            logger.error(f"Failed to load sessions: unexpected snapshot contents ({e})")
+            return
+        with self._lock:
+            for sid, data, expires in sorted(live, key=lambda item: item[2]):
+                self._sessions[sid] = [data, expires]
+            self._sweep(now)
+
+
+def init_sessions(app, backend=SESSION_BACKEND):
+    """Installs the session interface of the chosen backend on app"""
+    if backend == 'cookie':
+        app.session_interface = CookieSessionInterface()
+    elif backend == 'memory':
+        from app.utils.cluster import CLUSTERED
+        if CLUSTERED:
+            logger.warning("Memory sessions are not shared between workers, "
+                           "a user is logged out whenever another worker serves them")
+        memory_sessions.load()
+        app.session_interface = memory_sessions
+    elif backend == 'filesystem':
+        from cachelib.file import FileSystemCache
+        from flask_session.cachelib import CacheLibSessionInterface
+
+        class FileSystemSessionInterface(ReadOnlySessionMixin, CacheLibSessionInterface):
+            """Flask-Session files, pruned beyond FILE_THRESHOLD"""
+
+        cache = FileSystemCache(app.config.get('SESSION_FILE_DIR', 'flask_session'),
+                                threshold=FILE_THRESHOLD, mode=0o600)
+        app.session_interface = FileSystemSessionInterface(app, client=cache,
+                                                           permanent=app.config['SESSION_PERMANENT'])
+    else:
+        raise ValueError(f"Unknown session backend {backend!r}")
+    return app.session_interface
+
+
+# Global in-memory session store (used with VPSCOPE_SESSION_BACKEND=memory)
+memory_sessions = MemorySessionInterface()
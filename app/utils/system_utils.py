@@ -5,32 +5,129 @@ import time
 from datetime import datetime
 from threading import Lock
 
-# Cache for metrics
+# Cache for metrics (used only when the background sampler is not running)
 _metrics_cache = None
 _cache_timestamp = 0
 _cache_lock = Lock()
 _CACHE_TTL = 3  # seconds
 
+def _interval(group, default):
+    return float(os.getenv(f'VPSCOPE_INTERVAL_{group.upper()}', default))
+
+# Refresh interval (seconds) of each metric group; static is collected once
+GROUP_INTERVALS = {
+    'static': None,
+    'fast': _interval('fast', 2),
+    'disks': _interval('disks', 30),
+    'processes': _interval('processes', 15),
+    'sensors': _interval('sensors', 30),
+}
+
+# Collector backend: 'auto' uses /proc directly on Linux, 'psutil' forces the generic path
+COLLECTOR_BACKEND = os.getenv('VPSCOPE_COLLECTOR', 'auto')
+_procfs_reader = None
+
+def _get_procfs_reader():
+    """Returns the shared /proc reader, or None when the psutil path should be used"""
+    global _procfs_reader
+    if _procfs_reader is None and COLLECTOR_BACKEND in ('auto', 'procfs') and platform.system() == 'Linux':
+        try:
+            from app.utils.procfs import ProcfsReader
+            _procfs_reader = ProcfsReader()
+        except OSError:
+            _procfs_reader = False  # /proc unavailable, don't retry
+    return _procfs_reader or None
+
 def get_summary_metrics():
+    """Returns latest metrics, preferring the background sampler snapshot"""
+    from app.utils.metrics_sampler import sampler
+    snapshot = sampler.get_snapshot()
+    if snapshot is not None:
+        return snapshot
+
     global _metrics_cache, _cache_timestamp
     current_time = time.time()
     with _cache_lock:
         if _metrics_cache and (current_time - _cache_timestamp) < _CACHE_TTL:
             return _metrics_cache
 
+    result = collect_metrics()
+
+    # Cache the result
+    with _cache_lock:
+        _metrics_cache = result
+        _cache_timestamp = current_time
+
+    return result
+
+def collect_metrics():
+    """Collects all metric groups at once (slow, prefer the sampler)"""
+    result = {}
+    for group in GROUP_INTERVALS:
+        result.update(GROUP_COLLECTORS[group]())
+    return result
+
+def collect_static():
+    """Facts that do not change while the server is running"""
+    cpu_freq = psutil.cpu_freq()
+    cpu_freq_max = cpu_freq.max if cpu_freq else 0
+    boot_time = datetime.fromtimestamp(psutil.boot_time())
+    return {
+        'cpu_count': psutil.cpu_count(),
+        'cpu_freq_max': round(cpu_freq_max, 2),
+        'boot_time': boot_time.isoformat(),
+        'os': platform.system(),
+        'hostname': platform.node(),
+        'machine': platform.machine(),
+        'version': platform.version(),
+    }
+
+def collect_fast():
+    """Cheap counters refreshed near real-time"""
+    reader = _get_procfs_reader()
+    if reader is not None:
+        result = reader.collect_fast()
+        if result['cpu_freq_current'] is None:
+            cpu_freq = psutil.cpu_freq()
+            result['cpu_freq_current'] = round(cpu_freq.current if cpu_freq else 0, 2)
+        return result
+    return collect_fast_psutil()
+
+def collect_fast_psutil():
+    """Cheap counters through psutil (portable fallback)"""
     # CPU (non-blocking)
     cpu_percent = psutil.cpu_percent(interval=None)
-    cpu_count = psutil.cpu_count()
     cpu_freq = psutil.cpu_freq()
     cpu_freq_current = cpu_freq.current if cpu_freq else 0
-    cpu_freq_max = cpu_freq.max if cpu_freq else 0
 
     # RAM
     ram = psutil.virtual_memory()
-    ram_used = ram.used
-    ram_total = ram.total
-    ram_percent = ram.percent
 
+    # Network
+    net = psutil.net_io_counters()
+
+    # Uptime
+    uptime_seconds = time.time() - psutil.boot_time()
+
+    # Load average (Linux only)
+    load_avg = None
+    if platform.system() != 'Windows':
+        load_avg = psutil.getloadavg()
+
+    return {
+        'cpu_percent': cpu_percent,
+        'cpu_freq_current': round(cpu_freq_current, 2),
+        'ram_used': ram.used,
+        'ram_total': ram.total,
+        'ram_percent': ram.percent,
+        'net_sent': net.bytes_sent,
+        'net_recv': net.bytes_recv,
+        'uptime_seconds': int(uptime_seconds),
+        'load_avg': load_avg,
+    }
+
+def collect_disks():
+    """Per-mount usage for all disks plus the summary disk"""
     # All disks and summary using psutil if possible, fallback to WMI on Windows
     all_disks = []
     summary_disk = None
@@ -111,35 +208,17 @@ def get_summary_metrics():
         disk_total = 0
         disk_percent = 0
 
-    # Network
-    net = psutil.net_io_counters()
-    net_sent = net.bytes_sent
-    net_recv = net.bytes_recv
-
-    # Boot time
-    boot_time = datetime.fromtimestamp(psutil.boot_time())
-    uptime_seconds = (datetime.now() - boot_time).total_seconds()
-
-    # Load average (Linux only)
-    load_avg = None
-    if platform.system() != 'Windows':
-        load_avg = psutil.getloadavg()
+    return {
+        'disk_used': disk_used,
+        'disk_total': disk_total,
+        'disk_percent': disk_percent,
+        'all_disks': all_disks,
+    }
 
-    # Processes (optimized: ad_value=0, limit to top 20)
-    processes = []
-    for proc in psutil.process_iter(['pid', 'name', 'cpu_percent', 'memory_percent'], ad_value=0):
-        try:
-            info = proc.info
-            name = info.get('name', '')
-            if name == 'System Idle Process' or not name:
-                continue
-            processes.append(info)
-        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-            continue
-
-    # Sort by CPU and limit to top 20
-    processes.sort(key=lambda x: x.get('cpu_percent', 0), reverse=True)
-    processes = processes[:20]
+def collect_processes():
+    """Top processes, ranked by the process tracker's sort key"""
+    from app.utils.process_tracker import tracker
+    processes = tracker.top()
 
     # Normalize CPU % if needed
     total_cpu = sum(p.get('cpu_percent', 0) for p in processes)
@@ -150,6 +229,14 @@ def get_summary_metrics():
 
     total_cpu_processes = sum(p.get('cpu_percent', 0) for p in processes)
 
+    return {
+        'processes': processes,  # Already limited to top N
+        'process_sort': tracker.sort_key,
+        'total_cpu_processes': total_cpu_processes,
+    }
+
+def collect_sensors():
+    """Temperature sensors"""
     # Temperatures (optimized with try-except)
     temps = {}
     if hasattr(psutil, "sensors_temperatures"):
@@ -203,35 +290,12 @@ def get_summary_metrics():
         except:
             pass  # Silent fail
 
-    result = {
-        'cpu_percent': cpu_percent,
-        'cpu_count': cpu_count,
-        'cpu_freq_current': round(cpu_freq_current, 2),
-        'cpu_freq_max': round(cpu_freq_max, 2),
-        'ram_used': ram_used,
-        'ram_total': ram_total,
-        'ram_percent': ram_percent,
-        'disk_used': disk_used,
-        'disk_total': disk_total,
-        'disk_percent': disk_percent,
-        'all_disks': all_disks,
-        'net_sent': net_sent,
-        'net_recv': net_recv,
-        'boot_time': boot_time.isoformat(),
-        'uptime_seconds': int(uptime_seconds),
-        'load_avg': load_avg,
-        'processes': processes,  # Already limited to 20
-        'temperatures': temps,
-        'os': platform.system(),
-        'hostname': platform.node(),
-        'machine': platform.machine(),
-        'version': platform.version(),
-        'total_cpu_processes': total_cpu_processes
-    }
-
-    # Cache the result
-    with _cache_lock:
-        _metrics_cache = result
-        _cache_timestamp = current_time
+    return {'temperatures': temps}
 
-    return result
+GROUP_COLLECTORS = {
+    'static': collect_static,
+    'fast': collect_fast,
+    'disks': collect_disks,
+    'processes': collect_processes,
+    'sensors': collect_sensors,
+}
@@ -0,0 +1,190 @@
+import os
+import codecs
+import threading
+import logging
+from app.utils.fs_watcher import watcher
+from app.utils.io_utils import pread
+
+logger = logging.getLogger('VPScope')
+
+DEFAULT_LINES = 100
+MAX_LINES = 5000
+MAX_EMIT_BYTES = 256 * 1024  # appended data is sent in pieces of at most this size
+_BACK_BLOCK = 64 * 1024
+_MAX_BACK_BYTES = 4 * 1024 * 1024
+
+
+def tail_room(path):
+    return f"tail:{path}"
+
+
+class TailReader:
+    """Follows one file for all its subscribers, tracking offset and inode across rotation"""
+
+    def __init__(self, path, emit):
+        self.path = path
+        self.subscribers = set()
+        self._emit = emit
+        self._lock = threading.RLock()
+        self._fd = None
+        self._ino = None
+        self.offset = 0
+        self._decoder = codecs.getincrementaldecoder('utf-8')('replace')
+        self._directory = os.path.dirname(path)
+        self._name = os.path.basename(path)
+
+    def start(self):
+        self._open(at_end=True)
+        # The directory watch sees a rotated file being recreated under the same name
+        watcher.watch(self._directory, self._on_dir_event)
+
+    def stop(self):
+        watcher.unwatch(self._directory, self._on_dir_event)
+        with self._lock:
+            self._close()
+
+    def _open(self, at_end):
+        try:
+            fd = os.open(self.path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+        except OSError:
+            return False
+        st = os.fstat(fd)
+        self._fd = fd
+        self._ino = st.st_ino
+        self.offset = st.st_size if at_end else 0
+        self._decoder.reset()
+        watcher.watch(self.path, self._on_file_event)
+        return True
+
+    def _close(self):
+        if self._fd is not None:
+            watcher.unwatch(self.path, self._on_file_event)
+            os.close(self._fd)
+            self._fd = None
+
+    def last_lines(self, count):
+        """Returns the last count lines before the current offset"""
+        with self._lock:
+            if self._fd is None or not self.offset:
+                return []
+            end = self.offset
+            data = b''
+            while end > 0 and data.count(b'\n') <= count and len(data) < _MAX_BACK_BYTES:
+                start = max(end - _BACK_BLOCK, 0)
+                data = pread(self._fd, end - start, start) + data
+                end = start
+            lines = data.decode('utf-8', 'replace').split('\n')
+            if lines and lines[-1] == '':
+                lines.pop()
+            if end > 0 and len(lines) > count:
+                lines = lines[1:]  # first line is probably cut
+            return lines[-count:] if count else []
+
+    def _on_file_event(self, path, event, name):
+        self.poll()
+
+    def _on_dir_event(self, path, event, name):
+        if name == self._name and event in ('create', 'move', 'overflow'):
+            self.poll()
+        elif event == 'overflow':
+            self.poll()
+
+    def poll(self):
+        """Sends data appended since the last offset; handles truncation and rotation"""
+        with self._lock:
+            if self._fd is None:
+                if self._open(at_end=False):
+                    self._emit('tail_reset', {'path': self.path, 'reason': 'created'})
+                    self._drain()
+                return
+            self._drain()
+            try:
+                current = os.stat(self.path)
+            except OSError:
+                current = None
+            if current is None or current.st_ino != self._ino:
+                # Rotated: old data was drained above, continue with the new file from its start
+                self._close()
+                if self._open(at_end=False):
+                    self._emit('tail_reset', {'path': self.path, 'reason': 'rotated'})
+                    self._drain()
+                return
+            if current.st_size < self.offset:
+                self.offset = 0
+                self._decoder.reset()
+                self._emit('tail_reset', {'path': self.path, 'reason': 'truncated'})
+                self._drain()
+
+    def _drain(self):
+        while True:
+            size = os.fstat(self._fd).st_size
+            if size <= self.offset:
+                return
+            data = pread(self._fd, min(size - self.offset, MAX_EMIT_BYTES), self.offset)
+            if not data:
+                return
+            self.offset += len(data)
+            text = self._decoder.decode(data)
+            if text:
+                self._emit('tail_data', {'path': self.path, 'data': text, 'offset': self.offset})
+
+
+class TailManager:
+    """Shares one TailReader per file between all subscribed clients"""
+
+    def __init__(self):
+        self._readers = {}  # path -> TailReader
+        self._lock = threading.Lock()
+        self._emit = None
+
+    def set_emitter(self, emit):
+        """emit(event, data, room) used to deliver tail events to a file's room"""
+        self._emit = emit
+
+    def _emitter(self, path):
+        room = tail_room(path)
+        return lambda event, data: self._emit(event, data, room) if self._emit else None
+
+    def subscribe(self, path, sid, lines=DEFAULT_LINES, on_init=None):
+        """Registers sid and returns the initial tail_init payload.
+
+        on_init(payload) runs under the reader's lock, so whatever it sends
+        goes out before any tail_data past the payload's offset.
+        """
+        path = os.path.abspath(path)
+        if not os.path.isfile(path):
+            raise FileNotFoundError(path)
+        lines = max(0, min(int(lines), MAX_LINES))
+        with self._lock:
+            reader = self._readers.get(path)
+            if reader is None:
+                reader = self._readers[path] = TailReader(path, self._emitter(path))
+                reader.start()
+            reader.subscribers.add(sid)
+        with reader._lock:
+            init = {'path': path, 'lines': reader.last_lines(lines), 'offset': reader.offset}
+            if on_init is not None:
+                on_init(init)
+            return init
+
+    def unsubscribe(self, path, sid):
+        path = os.path.abspath(path)
+        with self._lock:
+            reader = self._readers.get(path)
+            if reader is None:
+                return
+            reader.subscribers.discard(sid)
+            if reader.subscribers:
+                return
+            del self._readers[path]
+        reader.stop()
+
+    def unsubscribe_all(self, sid):
+        with self._lock:
+            paths = [path for path, reader in self._readers.items() if sid in reader.subscribers]
+        for path in paths:
+            self.unsubscribe(path, sid)
+
+
+# Global tail manager
+tails = TailManager()
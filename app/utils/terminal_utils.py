@@ -1,16 +1,61 @@
+import os
+import time
+import uuid
+import codecs
+import signal
+import struct
+import selectors
+import socket
 import subprocess
 import threading
 import shlex
+import logging
+
+try:
+    import pty
+    import fcntl
+    import termios
+    PTY_SUPPORTED = True
+except ImportError:  # Windows: commands run one by one through run_command
+    PTY_SUPPORTED = False
+
+logger = logging.getLogger('VPScope')
+
+# Output is sent in frames: whatever arrived within FRAME_INTERVAL, at most FRAME_BYTES
+FRAME_INTERVAL = 0.016
+FRAME_BYTES = 64 * 1024
+# Bytes sent but not yet acknowledged by the client before reading from the PTY pauses
+SEND_WINDOW = int(os.getenv('VPSCOPE_TERM_WINDOW', str(256 * 1024)))
+# Output kept per session and replayed when a client reattaches
+SCROLLBACK_BYTES = int(os.getenv('VPSCOPE_TERM_SCROLLBACK', str(1024 * 1024)))
+# Detached sessions (no browser attached) are killed after this many seconds
+IDLE_TIMEOUT = int(os.getenv('VPSCOPE_TERM_IDLE', '1800'))
+MAX_SESSIONS = int(os.getenv('VPSCOPE_TERM_MAX_SESSIONS', '8'))  # per user
+REAP_INTERVAL = 30
+# Keys passed to the shell as they are: Ctrl-C, Ctrl-D, Ctrl-Z
+CONTROL_KEYS = ('\x03', '\x04', '\x1a')
+
+
+def terminal_room(session_id):
+    return f"term:{session_id}"
+
+
+def validate_command(command):
+    """Returns why a command is blocked, or None if it may run"""
+    # Enhanced validation to block shell injection and dangerous commands
+    if any(char in command for char in [';', '&', '|', '(', ')', '[', ']', '{', '}', '<', '>', '^', '"', "'", '`']):
+        return 'Command blocked: shell metacharacters not allowed.'
+    if any(dangerous in command.lower() for dangerous in ['rm -rf', 'del /f /q /s', 'format', 'fdisk', 'mkfs', 'dd if=']):
+        return 'Command blocked for security reasons.'
+    return None
+
 
 def run_command(cmd, emit_func):
     def runner(command):
         try:
-            # Enhanced validation to block shell injection and dangerous commands
-            if any(char in command for char in [';', '&', '|', '(', ')', '[', ']', '{', '}', '<', '>', '^', '"', "'", '`']):
-                emit_func('cmd_output', {'output': 'Command blocked: shell metacharacters not allowed.'})
-                return
-            if any(dangerous in command.lower() for dangerous in ['rm -rf', 'del /f /q /s', 'format', 'fdisk', 'mkfs', 'dd if=']):
-                emit_func('cmd_output', {'output': 'Command blocked for security reasons.'})
+            blocked = validate_command(command)
+            if blocked:
+                emit_func('cmd_output', {'output': blocked})
                 return
 
             # Use shell=True for Windows compatibility with built-ins, but validated
@@ -27,3 +72,401 @@ def run_command(cmd, emit_func):
     thread = threading.Thread(target=runner, args=(cmd,))
     thread.daemon = True
     thread.start()
+
+
+class OutputRing:
+    """The last capacity bytes of a stream, addressed by absolute stream offsets"""
+
+    def __init__(self, capacity=SCROLLBACK_BYTES):
+        self.capacity = capacity
+        self._buffer = bytearray()
+        self.start = 0  # offset of the oldest byte still kept
+
+    @property
+    def end(self):
+        return self.start + len(self._buffer)
+
+    def append(self, data):
+        self._buffer += data
+        overflow = len(self._buffer) - self.capacity
+        if overflow > 0:
+            # bytearray drops bytes from its front without moving the rest
+            del self._buffer[:overflow]
+            self.start += overflow
+
+    def read(self, offset, size):
+        """Returns (data, offset of data); starts at the oldest kept byte if offset was dropped"""
+        offset = max(offset, self.start)
+        begin = offset - self.start
+        return bytes(self._buffer[begin:begin + size]), offset
+
+
+class TerminalSession:
+    """A shell on its own PTY; outlives the browser connection that started it"""
+
+    def __init__(self, owner, cols=120, rows=32):
+        self.id = uuid.uuid4().hex
+        self.owner = owner
+        self.sid = None            # Socket.IO client currently attached
+        self.pid = None
+        self.fd = None             # PTY master, non-blocking
+        self.created = time.time()
+        self.last_active = self.created
+        self.detached_at = self.created
+        self.scrollback = OutputRing()
+        self.sent = 0              # stream offset up to which output was sent to the client
+        self.acked = 0             # stream offset the client confirmed it has rendered
+        self.frame_started = None  # when the first byte of the pending frame arrived
+        self.exit_code = None
+        self.exit_sent = False     # term_exit delivered to the attached client
+        self.paused = False        # reading stopped until the client catches up
+        self.cols = cols
+        self.rows = rows
+        self._decoder = codecs.getincrementaldecoder('utf-8')('replace')
+
+    def start(self):
+        shell = os.getenv('VPSCOPE_TERM_SHELL') or os.getenv('SHELL') or '/bin/sh'
+        env = dict(os.environ, TERM='dumb', PAGER='cat', GIT_PAGER='cat')
+        pid, fd = pty.fork()
+        if pid == 0:
+            # Child: only exec here, the parent's threads don't exist in this process
+            try:
+                os.execvpe(shell, [shell, '-i'], env)
+            finally:
+                os._exit(127)
+        self.pid = pid
+        self.fd = fd
+        os.set_blocking(fd, False)
+        self.resize(self.cols, self.rows)
+
+    def resize(self, cols, rows):
+        self.cols = max(10, min(int(cols), 1000))
+        self.rows = max(2, min(int(rows), 500))
+        if self.fd is not None:
+            fcntl.ioctl(self.fd, termios.TIOCSWINSZ, struct.pack('HHHH', self.rows, self.cols, 0, 0))
+
+    def write(self, data):
+        self.last_active = time.time()
+        payload = data.encode('utf-8')
+        while payload:
+            try:
+                written = os.write(self.fd, payload)
+            except BlockingIOError:
+                time.sleep(0.005)  # the shell isn't reading its input right now
+                continue
+            payload = payload[written:]
+
+    @property
+    def pending(self):
+        return self.scrollback.end - self.sent
+
+    def take_frame(self):
+        """Returns (text, dropped) for up to FRAME_BYTES unsent bytes"""
+        chunk, start = self.scrollback.read(self.sent, FRAME_BYTES)
+        dropped = start - self.sent  # overwritten before the client got them
+        if dropped:
+            self._decoder.reset()
+        self.sent = start + len(chunk)
+        self.frame_started = time.time() if self.pending else None
+        return self._decoder.decode(chunk), dropped
+
+    def rewind(self, offset):
+        """Sends output again from offset (or the oldest kept byte) on the next flush"""
+        self.sent = self.acked = max(min(int(offset), self.scrollback.end), self.scrollback.start)
+        self._decoder.reset()
+        # Don't start the replay in the middle of a UTF-8 sequence
+        head, _ = self.scrollback.read(self.sent, 4)
+        skip = 0
+        while skip < len(head) and 0x80 <= head[skip] < 0xC0:
+            skip += 1
+        self.sent = self.acked = self.sent + skip
+        self.frame_started = time.time() if self.pending else None
+
+    @property
+    def unacked(self):
+        return self.sent - self.acked
+
+    def to_dict(self):
+        return {'id': self.id, 'pid': self.pid, 'created': self.created, 'attached': self.sid is not None,
+                'exit_code': self.exit_code, 'cols': self.cols, 'rows': self.rows,
+                'scrollback_start': self.scrollback.start, 'offset': self.scrollback.end}
+
+    def kill(self):
+        if self.exit_code is None and self.pid:
+            for sig in (signal.SIGHUP, signal.SIGKILL):
+                try:
+                    os.killpg(self.pid, sig)
+                except OSError:
+                    break
+                time.sleep(0.1)
+                if self._reap():
+                    break
+            self._reap()
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def _reap(self):
+        """Collects the exit status if the shell has ended"""
+        if self.exit_code is not None:
+            return True
+        try:
+            pid, status = os.waitpid(self.pid, os.WNOHANG)
+        except ChildProcessError:
+            self.exit_code = -1
+            return True
+        if pid == 0:
+            return False
+        self.exit_code = os.waitstatus_to_exitcode(status)
+        return True
+
+
+class TerminalManager:
+    """Owns all PTY sessions; one selector thread reads every master fd"""
+
+    def __init__(self):
+        self._sessions = {}  # id -> TerminalSession
+        self._lock = threading.RLock()
+        self._selector = None
+        self._wakeup_r, self._wakeup_w = None, None
+        self._thread = None
+        self._emit = None
+        self._last_reap = time.time()
+
+    def set_emitter(self, emit):
+        """emit(event, data, room) used to deliver output to the session's private room"""
+        self._emit = emit
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        self._selector = selectors.DefaultSelector()
+        self._wakeup_r, self._wakeup_w = socket.socketpair()
+        self._wakeup_r.setblocking(False)
+        self._wakeup_w.setblocking(False)
+        self._selector.register(self._wakeup_r, selectors.EVENT_READ, None)
+        self._thread = threading.Thread(target=self._loop, name='terminal-reader')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _wake(self):
+        try:
+            self._wakeup_w.send(b'\0')
+        except (BlockingIOError, OSError):
+            pass
+
+    def _send(self, event, data, session):
+        if self._emit and session.sid:
+            self._emit(event, data, terminal_room(session.id))
+
+    def open(self, owner, cols=120, rows=32):
+        """Starts a new shell; its output collects in the scrollback until a client attaches"""
+        with self._lock:
+            self._ensure_started()
+            if sum(1 for s in self._sessions.values() if s.owner == owner) >= MAX_SESSIONS:
+                raise RuntimeError(f'At most {MAX_SESSIONS} terminal sessions per user')
+            session = TerminalSession(owner, cols, rows)
+            session.start()
+            self._sessions[session.id] = session
+            self._selector.register(session.fd, selectors.EVENT_READ, session)
+        logger.info(f"Terminal session {session.id} started (pid {session.pid})")
+        return session
+
+    def get(self, session_id, owner):
+        with self._lock:
+            session = self._sessions.get(session_id)
+        if session is None or session.owner != owner:
+            return None
+        return session
+
+    def sessions(self, owner):
+        with self._lock:
+            return [s.to_dict() for s in self._sessions.values() if s.owner == owner]
+
+    def attach(self, session_id, owner, sid, offset=0):
+        """Moves a session to a new client and replays its scrollback from offset.
+
+        Returns (session, previous sid) or (None, None) if there is no such session.
+        """
+        session = self.get(session_id, owner)
+        if session is None:
+            return None, None
+        with self._lock:
+            previous = session.sid
+            session.sid = sid
+            session.last_active = time.time()
+            session.rewind(offset)
+            session.exit_sent = False
+            self._resume(session)
+        return session, previous
+
+    def replay(self, session):
+        """Sends what the client hasn't seen yet; called once it has joined the session's room"""
+        with self._lock:
+            self._flush(session)
+
+    def detach(self, sid):
+        with self._lock:
+            for session in self._sessions.values():
+                if session.sid == sid:
+                    session.sid = None
+                    session.detached_at = time.time()
+                    # Keep reading into the scrollback while nobody watches
+                    self._resume(session)
+
+    def ack(self, session_id, owner, offset):
+        session = self.get(session_id, owner)
+        if session is None:
+            return
+        with self._lock:
+            session.acked = max(session.acked, min(int(offset), session.sent))
+            if session.unacked < SEND_WINDOW:
+                self._resume(session)
+                self._flush(session)
+
+    def write(self, session_id, owner, data):
+        session = self.get(session_id, owner)
+        if session is None or session.fd is None:
+            return False
+        session.write(data)
+        return True
+
+    def close(self, session_id, owner):
+        session = self.get(session_id, owner)
+        if session is None:
+            return False
+        self._remove(session)
+        return True
+
+    def _remove(self, session):
+        with self._lock:
+            self._sessions.pop(session.id, None)
+            if session.fd is not None and not session.paused and session.exit_code is None:
+                try:
+                    self._selector.unregister(session.fd)
+                except (KeyError, ValueError):
+                    pass
+        # Outside the lock: killing waits for the shell to exit
+        session.kill()
+        logger.info(f"Terminal session {session.id} closed")
+
+    def _pause(self, session):
+        # Nothing can be sent until the client acks, so no frame deadline either
+        session.frame_started = None
+        if not session.paused and session.fd is not None:
+            try:
+                self._selector.unregister(session.fd)
+            except (KeyError, ValueError):
+                pass  # already unregistered at end of output
+            session.paused = True
+
+    def _resume(self, session):
+        if session.pending and session.frame_started is None:
+            session.frame_started = time.time()  # output held back while paused
+        if session.paused and session.fd is not None and session.exit_code is None:
+            self._selector.register(session.fd, selectors.EVENT_READ, session)
+            session.paused = False
+            self._wake()
+
+    def _loop(self):
+        while True:
+            timeout = self._next_deadline()
+            for key, _ in self._selector.select(timeout):
+                if key.data is None:
+                    try:
+                        while self._wakeup_r.recv(512):
+                            pass
+                    except BlockingIOError:
+                        pass
+                    continue
+                with self._lock:
+                    self._read(key.data)
+            with self._lock:
+                self._flush_frames()
+            if time.time() - self._last_reap >= REAP_INTERVAL:
+                self._reap_idle()
+
+    def _next_deadline(self):
+        with self._lock:
+            starts = [s.frame_started for s in self._sessions.values() if s.frame_started is not None]
+        if not starts:
+            return REAP_INTERVAL
+        return max(0, min(starts) + FRAME_INTERVAL - time.time())
+
+    def _read(self, session):
+        if session.fd is None or session.paused or self._sessions.get(session.id) is not session:
+            return  # removed after select() returned it
+        try:
+            data = os.read(session.fd, FRAME_BYTES)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b''  # EIO: the shell and everything on its PTY have exited
+        if not data:
+            self._selector.unregister(session.fd)
+            if session._reap():
+                self._flush(session)
+            else:
+                # The PTY closed just before the shell exited; wait for it off the reader thread
+                threading.Thread(target=self._finish, args=(session,), daemon=True).start()
+            return
+        if session.frame_started is None:
+            session.frame_started = time.time()
+        session.scrollback.append(data)
+        if session.pending >= FRAME_BYTES:
+            self._flush(session)
+
+    def _finish(self, session):
+        deadline = time.time() + 1
+        while not session._reap() and time.time() < deadline:
+            time.sleep(0.01)
+        with self._lock:
+            self._flush(session)
+
+    def _flush_frames(self):
+        now = time.time()
+        for session in self._sessions.values():
+            if session.frame_started is not None and now - session.frame_started >= FRAME_INTERVAL:
+                self._flush(session)
+
+    def _flush(self, session):
+        """Sends pending output as frames while the client's window allows"""
+        if session.sid is None:
+            # Nobody attached: output only goes to the scrollback until someone reattaches
+            session.frame_started = None
+            return
+        while session.pending:
+            if session.unacked >= SEND_WINDOW:
+                # Stop reading; the shell blocks once the PTY buffer is full
+                self._pause(session)
+                return
+            text, dropped = session.take_frame()
+            frame = {'id': session.id, 'data': text, 'offset': session.sent}
+            if dropped:
+                frame['dropped'] = dropped
+            self._send('term_output', frame, session)
+        if session.unacked >= SEND_WINDOW:
+            self._pause(session)
+        if session.exit_code is not None and not session.exit_sent:
+            # After the last of the output
+            session.exit_sent = True
+            self._send('term_exit', {'id': session.id, 'code': session.exit_code}, session)
+
+    def _reap_idle(self):
+        self._last_reap = now = time.time()
+        with self._lock:
+            idle = [s for s in self._sessions.values()
+                    if s.sid is None and now - max(s.detached_at, s.last_active) > IDLE_TIMEOUT]
+        for session in idle:
+            logger.info(f"Terminal session {session.id} idle for {IDLE_TIMEOUT}s, closing")
+            self._remove(session)
+
+    def shutdown(self):
+        with self._lock:
+            sessions = list(self._sessions.values())
+        for session in sessions:
+            self._remove(session)
+
+
+# Global terminal session manager
+terminals = TerminalManager()
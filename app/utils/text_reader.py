@@ -0,0 +1,222 @@
+import os
+import bisect
+import threading
+from array import array
+from collections import OrderedDict
+from app.utils.io_utils import pread
+
+BLOCK_SIZE = 64 * 1024
+MAX_LINES = 2000           # most lines returned by one request
+MAX_LINE_BYTES = 64 * 1024  # longer lines are cut when returned
+INDEX_CACHE_SIZE = 16
+# Files above this size are not returned whole by /files/read; the editor pages them instead
+EDITOR_MAX_BYTES = int(os.getenv('VPSCOPE_EDITOR_MAX_BYTES', str(5 * 1024 * 1024)))
+
+
+def _decode(raw):
+    if len(raw) > MAX_LINE_BYTES:
+        raw = raw[:MAX_LINE_BYTES]
+    return raw.rstrip(b'\r').decode('utf-8', 'replace')
+
+
+class FileView:
+    """Read-only view of a file through pread, bounded by the size seen when it was opened.
+
+    Supports what the line index needs from an mmap: slices, find and rfind
+    of a one-byte separator. Unlike an mmap it can't kill the process with
+    SIGBUS when the file is truncated underneath (log rotation): bytes past
+    the new end just read as missing.
+    """
+
+    def __init__(self, fd, size):
+        self.fd = fd
+        self.size = size
+        self._block = None
+        self._data = b''
+
+    def __len__(self):
+        return self.size
+
+    def _read_block(self, block):
+        if block != self._block:
+            begin = block * BLOCK_SIZE
+            length = min(BLOCK_SIZE, self.size - begin)
+            self._data = pread(self.fd, length, begin) if length > 0 else b''
+            self._block = block
+        return self._data
+
+    def __getitem__(self, key):
+        start, stop, _ = key.indices(self.size)
+        if stop <= start:
+            return b''
+        first, last = start // BLOCK_SIZE, (stop - 1) // BLOCK_SIZE
+        if first == last:
+            begin = first * BLOCK_SIZE
+            return self._read_block(first)[start - begin:stop - begin]
+        return pread(self.fd, stop - start, start)
+
+    def find(self, sub, start=0, end=None):
+        end = self.size if end is None else min(end, self.size)
+        pos = max(start, 0)
+        while pos < end:
+            block = pos // BLOCK_SIZE
+            begin = block * BLOCK_SIZE
+            data = self._read_block(block)
+            found = data.find(sub, pos - begin, end - begin)
+            if found >= 0:
+                return begin + found
+            if len(data) < min(BLOCK_SIZE, self.size - begin):
+                return -1  # The file shrank
+            pos = begin + BLOCK_SIZE
+        return -1
+
+    def rfind(self, sub, start=0, end=None):
+        end = self.size if end is None else min(end, self.size)
+        start = max(start, 0)
+        pos = end
+        while pos > start:
+            block = (pos - 1) // BLOCK_SIZE
+            begin = block * BLOCK_SIZE
+            found = self._read_block(block).rfind(sub, max(start - begin, 0), pos - begin)
+            if found >= 0:
+                return begin + found
+            pos = begin
+        return -1
+
+
+class LineIndex:
+    """Number of lines before each 64 KB block of a file, built lazily as far as needed"""
+
+    def __init__(self, path, size):
+        self.path = path
+        self.size = size
+        self.starts = array('Q', [0])  # starts[i] = newlines before block i
+        self._lock = threading.Lock()
+
+    @property
+    def complete(self):
+        return len(self.starts) > (self.size + BLOCK_SIZE - 1) // BLOCK_SIZE
+
+    def total_lines(self, view):
+        self._extend(view, self.size)
+        total = self.starts[-1]
+        if self.size and view[self.size - 1:self.size] != b'\n':
+            total += 1  # last line without a trailing newline
+        return total
+
+    def _extend(self, view, until_offset=None, until_line=None):
+        """Counts newlines block by block until offset or line is covered"""
+        with self._lock:
+            while not self.complete:
+                block = len(self.starts) - 1
+                if until_offset is not None and block * BLOCK_SIZE > until_offset:
+                    return
+                if until_line is not None and self.starts[-1] >= until_line:
+                    return
+                begin = block * BLOCK_SIZE
+                self.starts.append(self.starts[-1] + view[begin:begin + BLOCK_SIZE].count(b'\n'))
+
+    def line_offset(self, view, line):
+        """Byte offset where line (0-based) starts, or None if the file has fewer lines"""
+        if line == 0:
+            return 0
+        self._extend(view, until_line=line)
+        # Last block whose start has fewer than `line` newlines before it
+        block = bisect.bisect_left(self.starts, line) - 1
+        if block < 0:
+            return 0
+        pos = block * BLOCK_SIZE
+        remaining = line - self.starts[block]
+        while remaining:
+            pos = view.find(b'\n', pos)
+            if pos < 0:
+                return None
+            pos += 1
+            remaining -= 1
+        return pos
+
+    def line_number(self, view, offset):
+        """Number of the line containing byte offset"""
+        self._extend(view, until_offset=offset)
+        block = offset // BLOCK_SIZE
+        begin = block * BLOCK_SIZE
+        return self.starts[block] + view[begin:offset].count(b'\n')
+
+
+_indexes = OrderedDict()  # (path, mtime_ns, size) -> LineIndex
+_indexes_lock = threading.Lock()
+
+
+def get_line_index(path, st):
+    key = (path, st.st_mtime_ns, st.st_size)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is not None:
+            _indexes.move_to_end(key)
+            return index
+        index = _indexes[key] = LineIndex(path, st.st_size)
+        while len(_indexes) > INDEX_CACHE_SIZE:
+            _indexes.popitem(last=False)
+        return index
+
+
+def _read_lines(view, offset, count, size):
+    """Returns (lines, end_offset) for up to count lines starting at offset"""
+    lines = []
+    pos = offset
+    while pos < size and len(lines) < count:
+        end = view.find(b'\n', pos)
+        if end < 0:
+            end = size
+        lines.append(_decode(view[pos:end]))
+        pos = end + 1
+    return lines, min(pos, size)
+
+
+def read_window(path, start=None, count=200, tail=None, offset=None, with_total=False):
+    """Returns a window of lines by line number, from the end (tail) or at a byte offset"""
+    path = os.path.abspath(path)
+    count = max(0, min(count, MAX_LINES))
+    with open(path, 'rb') as f:
+        st = os.fstat(f.fileno())
+        size = st.st_size
+        result = {'path': path, 'size': size, 'lines': [], 'start_line': 0,
+                  'start_offset': 0, 'end_offset': 0, 'eof': True, 'total_lines': 0 if not size else None}
+        if not size:
+            return result
+        index = get_line_index(path, st)
+        # pread, not mmap: the logs this pages through get truncated while we read them
+        view = FileView(f.fileno(), size)
+        if tail is not None:
+            # Walk back from the end; no index needed
+            tail = max(0, min(tail, MAX_LINES))
+            pos = size - 1 if view[size - 1:size] == b'\n' else size
+            begin = size if not tail else 0
+            for _ in range(tail):
+                newline = view.rfind(b'\n', 0, pos)
+                if newline < 0:
+                    begin = 0
+                    break
+                begin = newline + 1
+                pos = newline
+            lines, end = _read_lines(view, begin, tail, size)
+            start_line = None  # known once the total is
+        elif offset is not None:
+            offset = max(0, min(offset, size))
+            begin = view.rfind(b'\n', 0, offset) + 1 if offset else 0
+            lines, end = _read_lines(view, begin, count, size)
+            start_line = index.line_number(view, begin)
+        else:
+            begin = index.line_offset(view, max(start or 0, 0))
+            if begin is None:
+                begin = size
+            lines, end = _read_lines(view, begin, count, size)
+            start_line = max(start or 0, 0)
+
+        if with_total or index.complete:
+            result['total_lines'] = index.total_lines(view)
+            if start_line is None:
+                start_line = result['total_lines'] - len(lines)
+        result.update(lines=lines, start_line=start_line, start_offset=begin,
+                      end_offset=end, eof=end >= size)
+    return result
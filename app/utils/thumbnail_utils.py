@@ -0,0 +1,277 @@
+import os
+import time
+import hashlib
+import threading
+import logging
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+try:
+    from PIL import Image, ImageOps
+    # DecompressionBombError (past twice MAX_IMAGE_PIXELS) is not an OSError
+    IMAGE_ERRORS = (OSError, SyntaxError, ValueError, Image.DecompressionBombError)
+except ImportError:  # Pillow is optional; image thumbnails are disabled without it
+    Image = None
+    IMAGE_ERRORS = (OSError, SyntaxError, ValueError)
+
+logger = logging.getLogger('VPScope')
+
+THUMB_DIR = os.getenv('VPSCOPE_THUMB_DIR', os.path.join('data', 'thumbnails'))
+THUMB_CACHE_BYTES = int(os.getenv('VPSCOPE_THUMB_CACHE_MB', '256')) * 1024 * 1024
+THUMB_WORKERS = int(os.getenv('VPSCOPE_THUMB_WORKERS', str(min(4, os.cpu_count() or 1))))
+THUMB_TIMEOUT = 30          # seconds to wait for one thumbnail
+SIZES = (64, 128, 256, 512)  # allowed bounding boxes; requests are rounded up to one of them
+MAX_SOURCE_BYTES = 200 * 1024 * 1024
+MAX_SOURCE_PIXELS = 100 * 1000 * 1000
+JPEG_QUALITY = 80
+
+TEXT_PREVIEW_LINES = 40
+TEXT_PREVIEW_BYTES = 8 * 1024
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp', '.tif', '.tiff', '.ico'}
+
+
+def fit_size(requested):
+    """Smallest allowed size that covers the requested one"""
+    for size in SIZES:
+        if requested <= size:
+            return size
+    return SIZES[-1]
+
+
+def _render_image(source, target, size):
+    """Runs in a worker process: writes a thumbnail of source to target, returns its format"""
+    Image.MAX_IMAGE_PIXELS = MAX_SOURCE_PIXELS
+    with Image.open(source) as image:
+        # JPEG can decode at 1/2..1/8 scale directly, which skips most of the work
+        image.draft('RGB', (size, size))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((size, size), Image.LANCZOS, reducing_gap=2.0)
+        if image.mode in ('RGBA', 'LA', 'P'):
+            image = image.convert('RGBA')
+            image.save(target, 'PNG', optimize=True)
+            return 'png'
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        image.save(target, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+        return 'jpeg'
+
+
+def _text_head(source):
+    """First lines of a text file, or None if it looks binary"""
+    with open(source, 'rb') as f:
+        data = f.read(TEXT_PREVIEW_BYTES)
+    if b'\0' in data:
+        return None
+    lines = data.split(b'\n')[:TEXT_PREVIEW_LINES]
+    return b'\n'.join(lines).decode('utf-8', 'replace').encode('utf-8')
+
+
+class ThumbnailCache:
+    """Content-addressed previews on disk with LRU eviction by total size"""
+
+    def __init__(self, directory=THUMB_DIR, max_bytes=THUMB_CACHE_BYTES, workers=THUMB_WORKERS):
+        self.directory = os.path.abspath(directory)
+        self.max_bytes = max_bytes
+        self.workers = workers
+        self._entries = OrderedDict()  # key -> (filename, size), least recently used first
+        self._total = 0
+        self._pending = {}             # key -> Event of a preview being generated
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._pool = None
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def images_enabled(self):
+        return Image is not None
+
+    def _load(self):
+        """Indexes the cache directory, oldest access first"""
+        if self._loaded:
+            return
+        self._loaded = True
+        os.makedirs(self.directory, exist_ok=True)
+        found = []
+        for root, dirs, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                if name.endswith('.tmp'):
+                    os.remove(path)  # left over from an interrupted render
+                    continue
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                found.append((st.st_mtime, name.split('.', 1)[0], os.path.relpath(path, self.directory), st.st_size))
+        for _, key, filename, size in sorted(found):
+            self._entries[key] = (filename, size)
+            self._total += size
+        for filename in self._evict():
+            os.remove(os.path.join(self.directory, filename))
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                # spawn: forking a process that runs server threads can deadlock the child
+                self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+            return self._pool
+
+    def _drop_pool(self, pool):
+        """Forgets a pool whose worker died, so the next render starts a fresh one"""
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _render(self, path, tmp, size):
+        # A crashed worker breaks the whole pool, failing the renders of other
+        # images too: retry once on a new pool before blaming this image
+        for attempt in range(2):
+            pool = self._get_pool()
+            try:
+                return pool.submit(_render_image, path, tmp, size).result(THUMB_TIMEOUT)
+            except BrokenProcessPool:
+                self._drop_pool(pool)
+                logger.warning(f"Thumbnail worker died while rendering {path}")
+        raise ValueError('Cannot read image: the thumbnail worker crashed on it')
+
+    @staticmethod
+    def cache_key(path, st, kind, size):
+        raw = f"{os.path.abspath(path)}\0{st.st_mtime_ns}\0{st.st_size}\0{kind}\0{size}"
+        return hashlib.sha1(raw.encode('utf-8', 'surrogateescape')).hexdigest()
+
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+        path = os.path.join(self.directory, entry[0])
+        try:
+            os.utime(path)  # keeps the LRU order across restarts
+        except FileNotFoundError:
+            with self._lock:
+                if self._entries.pop(key, None) is not None:
+                    self._total -= entry[1]
+            return None
+        return path
+
+    def _store(self, key, filename):
+        size = os.path.getsize(os.path.join(self.directory, filename))
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._total -= old[1]
+            self._entries[key] = (filename, size)
+            self._total += size
+            evicted = self._evict()
+        for name in evicted:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+    def _evict(self):
+        evicted = []
+        while self._total > self.max_bytes and len(self._entries) > 1:
+            _, (filename, size) = self._entries.popitem(last=False)
+            self._total -= size
+            evicted.append(filename)
+        return evicted
+
+    def get(self, path, kind='image', size=256):
+        """Returns (cache file, mimetype) for a preview of path, generating it once if needed"""
+        with self._lock:
+            self._load()
+        st = os.stat(path)
+        size = fit_size(size)
+        key = self.cache_key(path, st, kind, size)
+        while True:
+            cached = self._lookup(key)
+            if cached is not None:
+                self.hits += 1
+                return cached, _mimetype(cached)
+            with self._lock:
+                event = self._pending.get(key)
+                if event is None:
+                    event = self._pending[key] = threading.Event()
+                    break
+            # Someone else is rendering the same preview; wait for it and look again
+            if not event.wait(THUMB_TIMEOUT):
+                raise TimeoutError('Preview generation timed out')
+            if key not in self._entries:
+                raise ValueError('Preview could not be generated')
+        self.misses += 1
+        try:
+            filename = self._generate(path, st, kind, size, key)
+            self._store(key, filename)
+            return os.path.join(self.directory, filename), _mimetype(filename)
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+            event.set()
+
+    def _generate(self, path, st, kind, size, key):
+        subdir = os.path.join(self.directory, key[:2])
+        os.makedirs(subdir, exist_ok=True)
+        tmp = os.path.join(subdir, f"{key}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            if kind == 'text':
+                head = _text_head(path)
+                if head is None:
+                    raise ValueError('Not a text file')
+                with open(tmp, 'wb') as f:
+                    f.write(head)
+                fmt = 'txt'
+            else:
+                if Image is None:
+                    raise RuntimeError('Image thumbnails need Pillow installed')
+                if st.st_size > MAX_SOURCE_BYTES:
+                    raise ValueError('Image is too large for a thumbnail')
+                started = time.time()
+                try:
+                    fmt = self._render(path, tmp, size)
+                except TimeoutError:
+                    # An OSError too, but the image isn't unreadable, just slow
+                    raise TimeoutError('Preview generation timed out')
+                except IMAGE_ERRORS as e:
+                    # Not an image Pillow can read (SyntaxError is raised for some broken files)
+                    raise ValueError(f'Cannot read image: {e}')
+                fmt = 'jpg' if fmt == 'jpeg' else fmt
+                logger.debug(f"Thumbnail of {path} ({size}px) in {time.time() - started:.3f}s")
+            filename = os.path.join(key[:2], f"{key}.{fmt}")
+            os.replace(tmp, os.path.join(self.directory, filename))
+            return filename
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._total, 'max_bytes': self.max_bytes,
+                    'hits': self.hits, 'misses': self.misses, 'images': self.images_enabled}
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+def _mimetype(filename):
+    if filename.endswith('.png'):
+        return 'image/png'
+    if filename.endswith('.txt'):
+        return 'text/plain; charset=utf-8'
+    return 'image/jpeg'
+
+
+# Global thumbnail cache
+thumbnails = ThumbnailCache()
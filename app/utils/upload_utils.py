@@ -0,0 +1,294 @@
+import os
+import json
+import time
+import uuid
+import threading
+import logging
+from app.utils.io_utils import pwrite
+
+logger = logging.getLogger('VPScope')
+
+# Where upload state is kept so interrupted uploads can resume after a restart
+UPLOAD_STATE_DIR = os.getenv('VPSCOPE_UPLOAD_STATE_DIR', os.path.join('data', 'uploads'))
+CHUNK_SIZE = int(os.getenv('VPSCOPE_UPLOAD_CHUNK_SIZE', str(8 * 1024 * 1024)))
+MAX_CHUNK_SIZE = 64 * 1024 * 1024
+UPLOAD_TTL = 24 * 3600  # seconds an unfinished upload is kept
+
+_COPY_BUFFER = 1024 * 1024
+
+
+class UploadError(Exception):
+    pass
+
+
+def _merge_range(ranges, start, end):
+    """Adds [start, end) to a sorted list of disjoint ranges, merging neighbours"""
+    merged = []
+    for r_start, r_end in ranges:
+        if r_end < start or r_start > end:
+            merged.append([r_start, r_end])
+        else:
+            start, end = min(start, r_start), max(end, r_end)
+    merged.append([start, end])
+    merged.sort()
+    return merged
+
+
+def unique_path(directory, filename):
+    """Adds ' (n)' before the extension until the name is free"""
+    filepath = os.path.join(directory, filename)
+    counter = 1
+    name, ext = os.path.splitext(filename)
+    while os.path.exists(filepath):
+        filepath = os.path.join(directory, f"{name} ({counter}){ext}")
+        counter += 1
+    return filepath
+
+
+class ChunkedUpload:
+    """One resumable upload written in place into a preallocated part file"""
+
+    def __init__(self, upload_id, directory, filename, size, ranges=None, created=None, updated=None):
+        self.id = upload_id
+        self.directory = directory
+        self.filename = filename
+        self.size = size
+        self.ranges = ranges or []
+        self.created = created or time.time()
+        self.updated = updated or self.created  # last chunk received; expiry counts from here
+        self.part_path = os.path.join(directory, f".{filename}.{upload_id}.part")
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)  # notified when the last writer is done
+        self._writers = 0
+        self._fd = None
+
+    def open(self, create=False):
+        flags = os.O_RDWR | (os.O_CREAT if create else 0) | getattr(os, 'O_BINARY', 0)
+        self._fd = os.open(self.part_path, flags, 0o644)
+        if create and self.size:
+            # Reserve the whole file up front; chunks are then written by offset
+            if hasattr(os, 'posix_fallocate'):
+                try:
+                    os.posix_fallocate(self._fd, 0, self.size)
+                except OSError:
+                    os.ftruncate(self._fd, self.size)
+            else:
+                os.ftruncate(self._fd, self.size)
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def received(self):
+        return sum(end - start for start, end in self.ranges)
+
+    def missing(self):
+        gaps = []
+        position = 0
+        for start, end in self.ranges:
+            if start > position:
+                gaps.append([position, start])
+            position = max(position, end)
+        if position < self.size:
+            gaps.append([position, self.size])
+        return gaps
+
+    def status(self):
+        return {
+            'upload_id': self.id,
+            'filename': self.filename,
+            'size': self.size,
+            'chunk_size': CHUNK_SIZE,
+            'received': self.ranges,
+            'received_bytes': self.received(),
+            'missing': self.missing(),
+        }
+
+    def write_chunk(self, offset, stream, length):
+        """Copies length bytes from stream to offset with pwrite; chunks may arrive concurrently"""
+        if offset < 0 or length < 0 or offset + length > self.size:
+            raise UploadError("Chunk is outside the file")
+        if length > MAX_CHUNK_SIZE:
+            raise UploadError("Chunk is too large")
+        with self._lock:
+            # The fd stays open while any chunk is being written; finalize and abort wait for them
+            if self._fd is None:
+                raise UploadError("Upload is already finished")
+            fd = self._fd
+            self._writers += 1
+            self.updated = time.time()
+        try:
+            written = 0
+            while written < length:
+                data = stream.read(min(_COPY_BUFFER, length - written))
+                if not data:
+                    break
+                view = memoryview(data)
+                while view:
+                    n = pwrite(fd, view, offset + written)
+                    view = view[n:]
+                    written += n
+            if written != length:
+                raise UploadError(f"Chunk truncated: got {written} of {length} bytes")
+            with self._lock:
+                self.ranges = _merge_range(self.ranges, offset, offset + length)
+                self.updated = time.time()
+                self._save_state()
+        finally:
+            with self._lock:
+                self._writers -= 1
+                if not self._writers:
+                    self._idle.notify_all()
+        return self.status()
+
+    def _wait_idle(self):
+        # Caller holds self._lock
+        while self._writers:
+            self._idle.wait()
+
+    def finalize(self):
+        """Moves the completed part file to its final (unique) name"""
+        with self._lock:
+            self._wait_idle()
+            if self._fd is None:
+                raise UploadError("Upload is already finished")
+            if self.missing():
+                raise UploadError("Upload is incomplete")
+            os.fsync(self._fd)
+            self.close()
+            final_path = unique_path(self.directory, self.filename)
+            os.replace(self.part_path, final_path)
+            self._remove_state()
+        return final_path
+
+    def abort(self):
+        with self._lock:
+            self._wait_idle()
+            self.close()
+            try:
+                os.remove(self.part_path)
+            except FileNotFoundError:
+                pass
+            self._remove_state()
+
+    @property
+    def _state_path(self):
+        return os.path.join(UPLOAD_STATE_DIR, f"{self.id}.json")
+
+    def _save_state(self):
+        os.makedirs(UPLOAD_STATE_DIR, exist_ok=True)
+        state = {
+            'directory': self.directory,
+            'filename': self.filename,
+            'size': self.size,
+            'ranges': self.ranges,
+            'created': self.created,
+            'updated': self.updated,
+        }
+        tmp_path = f"{self._state_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self._state_path)
+
+    def _remove_state(self):
+        try:
+            os.remove(self._state_path)
+        except FileNotFoundError:
+            pass
+
+
+class UploadRegistry:
+    """Active chunked uploads by id, restored from disk on demand"""
+
+    def __init__(self):
+        self._uploads = {}
+        self._lock = threading.Lock()
+
+    def create(self, directory, filename, size):
+        filename = os.path.basename(filename.replace('\\', '/'))
+        if not filename or filename in ('.', '..'):
+            raise UploadError("Invalid file name")
+        if size < 0:
+            raise UploadError("Invalid file size")
+        self.expire()
+        upload = ChunkedUpload(uuid.uuid4().hex, directory, filename, size)
+        upload.open(create=True)
+        upload._save_state()
+        with self._lock:
+            self._uploads[upload.id] = upload
+        return upload
+
+    def get(self, upload_id):
+        if not upload_id.isalnum():
+            raise UploadError("Unknown upload")
+        with self._lock:
+            upload = self._uploads.get(upload_id)
+            if upload is not None:
+                return upload
+            # Resume an upload started before a restart
+            try:
+                with open(os.path.join(UPLOAD_STATE_DIR, f"{upload_id}.json")) as f:
+                    state = json.load(f)
+            except (OSError, ValueError):
+                raise UploadError("Unknown upload")
+            upload = ChunkedUpload(upload_id, state['directory'], state['filename'], state['size'],
+                                   state['ranges'], state['created'], state.get('updated'))
+            try:
+                upload.open()
+            except OSError:
+                upload._remove_state()
+                raise UploadError("Upload data is gone")
+            self._uploads[upload_id] = upload
+            return upload
+
+    def discard(self, upload_id):
+        with self._lock:
+            self._uploads.pop(upload_id, None)
+
+    def expire(self):
+        """Drops uploads that received no chunk for UPLOAD_TTL, loaded or only on disk"""
+        now = time.time()
+        with self._lock:
+            expired = [u for u in self._uploads.values() if now - u.updated > UPLOAD_TTL]
+            for upload in expired:
+                self._uploads.pop(upload.id, None)
+            loaded = set(self._uploads)
+        for upload in expired:
+            logger.info(f"Removing expired upload {upload.id} ({upload.filename})")
+            upload.abort()
+        self._sweep_state(now, loaded)
+
+    def _sweep_state(self, now, loaded):
+        # Uploads left by a previous run (or another worker) are only known from their state files
+        try:
+            names = os.listdir(UPLOAD_STATE_DIR)
+        except FileNotFoundError:
+            return
+        for name in names:
+            upload_id, ext = os.path.splitext(name)
+            if ext != '.json' or upload_id in loaded:
+                continue
+            state_path = os.path.join(UPLOAD_STATE_DIR, name)
+            try:
+                with open(state_path) as f:
+                    state = json.load(f)
+                upload = ChunkedUpload(upload_id, state['directory'], state['filename'], state['size'],
+                                       state['ranges'], state['created'], state.get('updated'))
+            except FileNotFoundError:
+                continue
+            except (OSError, ValueError, KeyError, TypeError):
+                # Unreadable: drop it once it is old enough not to be a save in progress
+                try:
+                    if now - os.stat(state_path).st_mtime > UPLOAD_TTL:
+                        os.remove(state_path)
+                except OSError:
+                    pass
+                continue
+            if now - upload.updated > UPLOAD_TTL or not os.path.exists(upload.part_path):
+                logger.info(f"Removing abandoned upload {upload_id} ({upload.filename})")
+                upload.abort()
+
+
+# Global registry
+uploads = UploadRegistry()
@@ -0,0 +1,14 @@
+"""WSGI entry point for running the workers under an external server, one process per port:
+
+    VPSCOPE_ASYNC_MODE=eventlet VPSCOPE_MESSAGE_QUEUE=local \
+        gunicorn -k eventlet -w 1 -b 127.0.0.1:8001 app.wsgi:app
+"""
+import atexit
+from app import create_app, socketio, shutdown
+from app.utils.cluster import socketio_options
+from app.utils.logging_utils import setup_logger
+
+setup_logger()
+app = create_app()
+socketio.init_app(app, **socketio_options())
+atexit.register(shutdown)
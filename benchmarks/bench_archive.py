@@ -0,0 +1,73 @@
+"""Measures streaming archive throughput for zip and tar.gz with 1..N gzip workers.
+
+Usage: python benchmarks/bench_archive.py [size_mb] [path]
+
+Without a path a temporary tree with text (compressible) and random
+(incompressible) files of about size_mb in total is generated.
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils import archive_utils
+
+
+def make_tree(root, size_mb):
+    line = b'2024-01-01 12:00:00 INFO request handled in 12ms path=/api/v1/items status=200\n'
+    per_file = 4 * 1024 * 1024
+    for i in range(max(size_mb // 4, 1)):
+        directory = os.path.join(root, f'dir{i % 4}')
+        os.makedirs(directory, exist_ok=True)
+        if i % 2:
+            with open(os.path.join(directory, f'data{i}.bin'), 'wb') as f:
+                f.write(os.urandom(per_file))
+        else:
+            with open(os.path.join(directory, f'log{i}.txt'), 'wb') as f:
+                f.write(line * (per_file // len(line)))
+
+
+def tree_size(root):
+    return sum(os.path.getsize(os.path.join(d, name)) for d, _, names in os.walk(root) for name in names)
+
+
+def bench(name, stream, source_bytes):
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    out = 0
+    for chunk in stream:
+        out += len(chunk)
+    wall = time.perf_counter() - start
+    cpu = time.process_time() - cpu_start
+    print(f"{name:<16} {source_bytes / wall / 1e6:8.1f} MB/s   ratio {out / source_bytes:5.2f}   "
+          f"wall {wall:6.2f}s   cpu {cpu:6.2f}s")
+
+
+def main():
+    size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 128
+    tmp = None
+    if len(sys.argv) > 2:
+        root = sys.argv[2]
+    else:
+        tmp = tempfile.mkdtemp(prefix='vpscope-bench-')
+        root = os.path.join(tmp, 'tree')
+        make_tree(root, size_mb)
+    try:
+        source_bytes = tree_size(root)
+        print(f"{source_bytes / 1e6:.0f} MB in {root}")
+        bench('zip', archive_utils.stream_zip([root]), source_bytes)
+        workers = [1, 2, 4, os.cpu_count() or 1]
+        for n in sorted(set(workers)):
+            archive_utils.ARCHIVE_WORKERS = n
+            archive_utils._executor = None
+            bench(f'tar.gz x{n}', archive_utils.stream_tar_gz([root], workers=n), source_bytes)
+    finally:
+        if tmp:
+            shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+"""Compares per-cycle CPU cost of the /proc and psutil fast-group collectors.
+
+Usage: python benchmarks/bench_collectors.py [cycles]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils import system_utils
+from app.utils.procfs import ProcfsReader
+
+
+def bench(name, func, cycles):
+    func()  # warm up
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    for _ in range(cycles):
+        func()
+    cpu = (time.process_time() - cpu_start) / cycles * 1e6
+    wall = (time.perf_counter() - wall_start) / cycles * 1e6
+    print(f"{name:<8} cpu {cpu:9.1f} us/cycle   wall {wall:9.1f} us/cycle")
+    return cpu
+
+
+def main():
+    cycles = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    reader = ProcfsReader()
+    print(f"fast metric group, {cycles} cycles")
+    psutil_cpu = bench('psutil', system_utils.collect_fast_psutil, cycles)
+    procfs_cpu = bench('procfs', reader.collect_fast, cycles)
+    print(f"procfs speedup: {psutil_cpu / procfs_cpu:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
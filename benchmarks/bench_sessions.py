@@ -0,0 +1,108 @@
+"""Per-request overhead of each session backend for a logged-in user.
+
+Runs a minimal Flask app with Flask-Login through the test client:
+'poll' is a read-only polled view like /system/metrics, 'page' a normal
+view that refreshes the session. 'filesystem-old' is the previous setup
+(Flask-Session files written on every request). The 'none' row is the
+same poll view without login or session, i.e. the framework's own cost.
+
+Usage: python benchmarks/bench_sessions.py [requests]
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+import warnings
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from flask_login import LoginManager, UserMixin, login_user, login_required
+
+from app.utils.session_utils import init_sessions, read_only_session, MemorySessionInterface
+
+
+class User(UserMixin):
+    id = '1'
+
+
+def make_app(backend, directory):
+    app = Flask(__name__)
+    app.config.update(SECRET_KEY='bench', SESSION_PERMANENT=True,
+                      PERMANENT_SESSION_LIFETIME=timedelta(days=31),
+                      SESSION_FILE_DIR=os.path.join(directory, 'sessions'))
+    if backend == 'filesystem-old':
+        from flask_session import Session
+        app.config['SESSION_TYPE'] = 'filesystem'
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', DeprecationWarning)
+            Session(app)
+    elif backend == 'memory':
+        app.session_interface = MemorySessionInterface(snapshot_path='')
+    elif backend != 'none':
+        init_sessions(app, backend)
+
+    login_manager = LoginManager(app)
+    login_manager.user_loader(lambda user_id: User() if user_id == '1' else None)
+
+    @app.route('/login')
+    def login():
+        login_user(User())
+        return 'ok'
+
+    @app.route('/none')
+    def none():
+        return '{}'
+
+    @app.route('/poll')
+    @login_required
+    @read_only_session
+    def poll():
+        return '{}'
+
+    @app.route('/page')
+    @login_required
+    def page():
+        return '{}'
+
+    return app
+
+
+def bench(client, path, requests):
+    for _ in range(50):
+        client.get(path)  # warm up
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    for _ in range(requests):
+        response = client.get(path)
+        assert response.status_code == 200, (path, response.status_code)
+    cpu = (time.process_time() - cpu_start) / requests * 1e6
+    wall = (time.perf_counter() - wall_start) / requests * 1e6
+    return cpu, wall, 'Set-Cookie' in response.headers
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    print(f"{requests} requests per row")
+    print(f"{'backend':<15} {'view':<5} {'cpu us/req':>10} {'wall us/req':>11} {'set-cookie':>10} {'files':>6}")
+    for backend in ('none', 'cookie', 'memory', 'filesystem', 'filesystem-old'):
+        directory = tempfile.mkdtemp(prefix='vpscope-sessions-')
+        try:
+            app = make_app(backend, directory)
+            client = app.test_client()
+            views = ('none',) if backend == 'none' else ('poll', 'page')
+            if backend != 'none':
+                client.get('/login')
+            for view in views:
+                cpu, wall, cookie = bench(client, f'/{view}', requests)
+                files = len(os.listdir(app.config['SESSION_FILE_DIR'])) if os.path.isdir(
+                    app.config['SESSION_FILE_DIR']) else 0
+                print(f"{backend:<15} {view:<5} {cpu:>10.1f} {wall:>11.1f} {'yes' if cookie else 'no':>10} {files:>6}")
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
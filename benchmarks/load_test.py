@@ -0,0 +1,231 @@
+"""Concurrent-connection load test of the server in each async mode.
+
+Starts app/run.py once per mode, opens N Socket.IO dashboard clients
+(Engine.IO long-polling on the /metrics namespace, each keeping a poll
+request open like a real browser), then measures /system/metrics latency
+at a fixed request rate while they stay connected.
+
+Usage: python benchmarks/load_test.py [--modes threading,eventlet,gevent]
+                                      [--connections 200] [--requests 500] [--rate 50]
+"""
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+import http.client
+from urllib.parse import urlencode
+
+import psutil
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HOST = '127.0.0.1'
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind((HOST, 0))
+        return sock.getsockname()[1]
+
+
+def start_server(mode, port):
+    env = dict(os.environ, VPSCOPE_ASYNC_MODE=mode, VPSCOPE_SEARCH='0')
+    # A file rather than a pipe: the access log of every request would fill an unread pipe and stall the server
+    log = tempfile.TemporaryFile()
+    proc = subprocess.Popen([sys.executable, os.path.join(ROOT, 'app', 'run.py'), '--host', HOST,
+                             '--port', str(port), '--async-mode', mode],
+                            cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=log)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            log.seek(0)
+            return None, log.read().decode(errors='replace').strip().splitlines()[-1:]
+        try:
+            socket.create_connection((HOST, port), timeout=0.5).close()
+            return proc, None
+        except OSError:
+            time.sleep(0.2)
+    proc.kill()
+    return None, ['server did not start in 30s']
+
+
+def login(port, username, password):
+    """Returns the session cookie of a logged-in user"""
+    conn = http.client.HTTPConnection(HOST, port, timeout=10)
+    conn.request('POST', '/login', urlencode({'username': username, 'password': password}),
+                 {'Content-Type': 'application/x-www-form-urlencoded'})
+    response = conn.getresponse()
+    response.read()
+    cookies = [header.split(';', 1)[0] for name, header in response.getheaders() if name.lower() == 'set-cookie']
+    conn.close()
+    if not cookies:
+        raise RuntimeError('Login failed: no session cookie')
+    return '; '.join(cookies)
+
+
+async def request(port, method, path, cookie, body=b'', timeout=30):
+    """One HTTP/1.1 request on a fresh connection; returns (status, body)"""
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(HOST, port), timeout)
+    try:
+        head = (f"{method} {path} HTTP/1.1\r\nHost: {HOST}:{port}\r\nCookie: {cookie}\r\n"
+                f"Content-Type: text/plain;charset=UTF-8\r\nContent-Length: {len(body)}\r\n"
+                f"Connection: close\r\n\r\n")
+        writer.write(head.encode() + body)
+        await writer.drain()
+        data = await asyncio.wait_for(reader.read(), timeout)
+    finally:
+        writer.close()
+    head, _, body = data.partition(b'\r\n\r\n')
+    status_line, _, headers = head.partition(b'\r\n')
+    status = int(status_line.split()[1]) if status_line else 0
+    if b'transfer-encoding: chunked' in headers.lower():
+        body = dechunk(body)
+    return status, body
+
+
+def dechunk(data):
+    body = b''
+    while data:
+        size_line, _, data = data.partition(b'\r\n')
+        size = int(size_line.split(b';')[0] or b'0', 16)
+        if not size:
+            break
+        body += data[:size]
+        data = data[size + 2:]
+    return body
+
+
+class DashboardClient:
+    """Engine.IO polling client connected to the /metrics namespace"""
+
+    def __init__(self, port, cookie, stats):
+        self.port = port
+        self.cookie = cookie
+        self.stats = stats
+        self.sid = None
+
+    def _path(self):
+        query = {'EIO': 4, 'transport': 'polling', 't': time.time()}
+        if self.sid:
+            query['sid'] = self.sid
+        return '/socket.io/?' + urlencode(query)
+
+    async def run(self, connected):
+        status, body = await request(self.port, 'GET', self._path(), self.cookie)
+        if status != 200 or not body.startswith(b'0'):
+            raise RuntimeError(f'handshake failed ({status})')
+        self.sid = json.loads(body[1:])['sid']
+        await request(self.port, 'POST', self._path(), self.cookie, b'40/metrics,')
+        if not connected.done():
+            connected.set_result(True)
+        self.stats['connected'] += 1
+        try:
+            while True:
+                # The server holds this poll until it has something to send
+                status, body = await request(self.port, 'GET', self._path(), self.cookie, timeout=60)
+                if status != 200:
+                    self.stats['poll_errors'] += 1
+                    return
+                self.stats['polls'] += 1
+                for packet in body.split(b'\x1e'):
+                    if packet == b'2':  # ping
+                        await request(self.port, 'POST', self._path(), self.cookie, b'3')
+                    elif packet.startswith(b'42/metrics'):
+                        self.stats['messages'] += 1
+        finally:
+            self.stats['connected'] -= 1
+
+
+def percentile(values, p):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+async def run_load(port, cookie, connections, requests, rate, server):
+    stats = {'connected': 0, 'polls': 0, 'messages': 0, 'poll_errors': 0, 'connect_errors': 0}
+    loop = asyncio.get_running_loop()
+    clients = []
+    ready = []
+    started = time.perf_counter()
+    for _ in range(connections):
+        connected = loop.create_future()
+        task = asyncio.ensure_future(DashboardClient(port, cookie, stats).run(connected))
+        task.add_done_callback(lambda t, f=connected: f.done() or f.set_result(False))
+        clients.append(task)
+        ready.append(connected)
+        await asyncio.sleep(0.002)  # ramp up instead of a SYN flood
+    results = await asyncio.wait_for(asyncio.gather(*ready), 120)
+    stats['connect_errors'] = results.count(False)
+    ramp = time.perf_counter() - started
+
+    latencies, errors = [], 0
+
+    async def probe():
+        nonlocal errors
+        t0 = time.perf_counter()
+        try:
+            status, _ = await request(port, 'GET', '/system/metrics', cookie, timeout=10)
+            if status == 200:
+                latencies.append((time.perf_counter() - t0) * 1000)
+                return
+        except (OSError, asyncio.TimeoutError):
+            pass
+        errors += 1
+
+    probes = []
+    for _ in range(requests):
+        probes.append(asyncio.ensure_future(probe()))
+        await asyncio.sleep(1 / rate)
+    await asyncio.gather(*probes)
+    # Server footprint while all clients are still connected
+    footprint = (server.num_threads(), server.memory_info().rss / 2**20)
+
+    for task in clients:
+        task.cancel()
+    await asyncio.gather(*clients, return_exceptions=True)
+    return stats, ramp, latencies, errors, footprint
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', default='threading,eventlet,gevent')
+    parser.add_argument('--connections', type=int, default=200)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--rate', type=float, default=50, help='latency probes per second')
+    parser.add_argument('--username', default=os.getenv('VPSCOPE_USER', 'admin'))
+    parser.add_argument('--password', default=os.getenv('VPSCOPE_PASSWORD', 'admin123'))
+    args = parser.parse_args()
+
+    print(f"{args.connections} dashboard connections, {args.requests} requests at {args.rate}/s")
+    print(f"{'mode':<10} {'conn':>5} {'fail':>5} {'ramp s':>7} {'ok':>5} {'err':>4} "
+          f"{'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'threads':>7} {'rss MB':>7}")
+    for mode in args.modes.split(','):
+        port = free_port()
+        proc, error = start_server(mode, port)
+        if proc is None:
+            print(f"{mode:<10} skipped: {' '.join(error)}")
+            continue
+        try:
+            cookie = login(port, args.username, args.password)
+            stats, ramp, latencies, errors, (threads, rss) = asyncio.run(
+                run_load(port, cookie, args.connections, args.requests, args.rate, psutil.Process(proc.pid)))
+            print(f"{mode:<10} {args.connections - stats['connect_errors']:>5} {stats['connect_errors']:>5} "
+                  f"{ramp:>7.1f} {len(latencies):>5} {errors:>4} {percentile(latencies, 50):>8.1f} "
+                  f"{percentile(latencies, 99):>8.1f} {max(latencies, default=float('nan')):>8.1f} "
+                  f"{threads:>7} {rss:>7.1f}")
+        finally:
+            proc.terminate()
+            try:
+                proc.wait(10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+
+if __name__ == '__main__':
+    main()
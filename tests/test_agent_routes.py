@@ -0,0 +1,29 @@
+import pytest
+from flask import Flask
+
+from app.routes import agent
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(agent, 'AGENT_TOKEN', 'sécret')
+    monkeypatch.setattr(agent, 'get_summary_metrics', lambda: {'cpu_percent': 1.0})
+    app = Flask(__name__)
+    app.register_blueprint(agent.agent_bp, url_prefix='/agent')
+    return app.test_client()
+
+
+@pytest.mark.parametrize('auth', ['', 'Basic x', 'Bearer wrong', 'Bearer ключ', 'Bearer sécret'.encode().decode('latin-1')])
+def test_bad_tokens_are_unauthorized(client, auth):
+    assert client.get('/agent/snapshot', headers={'Authorization': auth}).status_code == 401
+
+
+def test_token_gives_the_snapshot(client):
+    response = client.get('/agent/snapshot', headers={'Authorization': 'Bearer sécret'})
+    assert response.status_code == 200
+    assert response.get_json() == {'cpu_percent': 1.0}
+
+
+def test_agent_mode_is_off_without_a_token(client, monkeypatch):
+    monkeypatch.setattr(agent, 'AGENT_TOKEN', '')
+    assert client.get('/agent/snapshot').status_code == 404
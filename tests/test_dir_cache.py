@@ -0,0 +1,67 @@
+import pytest
+
+from app.utils import dir_cache as dir_cache_module
+from app.utils.dir_cache import DirCache
+
+
+class FakeWatcher:
+    def __init__(self):
+        self.watched = {}
+
+    def watch(self, path, callback):
+        self.watched[path] = callback
+        return True
+
+    def unwatch(self, path, callback):
+        self.watched.pop(path, None)
+
+
+@pytest.fixture
+def watcher(monkeypatch):
+    watcher = FakeWatcher()
+    monkeypatch.setattr(dir_cache_module, 'watcher', watcher)
+    return watcher
+
+
+def _names(entries):
+    return sorted(entry.name for entry, _ in entries)
+
+
+def test_listing_is_cached_until_the_directory_changes(tmp_path, watcher):
+    (tmp_path / 'a').write_text('')
+    cache = DirCache()
+    assert _names(cache.entries(tmp_path)) == ['a']
+    (tmp_path / 'b').write_text('')
+    assert _names(cache.entries(tmp_path)) == ['a']
+    assert cache.hits == 1
+
+    watcher.watched[str(tmp_path)](str(tmp_path), 'create', 'b')
+    assert str(tmp_path) not in watcher.watched
+    assert _names(cache.entries(tmp_path)) == ['a', 'b']
+    assert str(tmp_path) in watcher.watched
+
+
+@pytest.mark.parametrize('change', ['event', 'invalidate'])
+def test_change_during_the_scan_is_not_cached(tmp_path, watcher, monkeypatch, change):
+    (tmp_path / 'a').write_text('')
+    cache = DirCache()
+    scan = dir_cache_module._scan
+
+    def racing_scan(path):
+        entries = scan(path)
+        (tmp_path / 'b').write_text('')
+        if change == 'event':
+            watcher.watched[path](path, 'create', 'b')
+        else:
+            cache.invalidate(path)
+        return entries
+
+    monkeypatch.setattr(dir_cache_module, '_scan', racing_scan)
+    assert _names(cache.entries(tmp_path)) == ['a']
+    assert str(tmp_path) not in cache._cache
+    assert str(tmp_path) not in watcher.watched
+    assert cache._scanning == {}
+
+    monkeypatch.setattr(dir_cache_module, '_scan', scan)
+    assert _names(cache.entries(tmp_path)) == ['a', 'b']
+    assert str(tmp_path) in cache._cache
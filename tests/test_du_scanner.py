@@ -0,0 +1,72 @@
+import os
+import time
+import threading
+
+from app.utils.du_scanner import DuScanner
+
+
+def _tree(root, dirs=3):
+    for i in range(dirs):
+        os.makedirs(root / f'a{i}' / 'b')
+        (root / f'a{i}' / 'b' / 'f').write_bytes(b'x' * (i + 1))
+    return str(root)
+
+
+def test_totals(tmp_path):
+    root = _tree(tmp_path)
+    scanner = DuScanner()
+    state = scanner.scan(root)
+    assert state['dirs'] == 7
+    assert scanner.cached_size(root) == 1 + 2 + 3
+    assert scanner.tree(root, depth=1)['children'][0]['size'] == 3
+
+
+def test_rescan_does_not_change_published_entries(tmp_path):
+    root = _tree(tmp_path)
+    scanner = DuScanner()
+    scanner.scan(root)
+    before = scanner._cache[root]  # reused by the next scan: root's own mtime is unchanged
+    (tmp_path / 'a0' / 'b' / 'g').write_bytes(b'y' * 10)
+    scanner.scan(root)
+    assert before.total_size == 6
+    assert scanner.cached_size(root) == 16
+
+
+def test_cache_is_bounded_and_keeps_the_top(tmp_path):
+    root = _tree(tmp_path, dirs=10)
+    scanner = DuScanner(max_dirs=5)
+    scanner.scan(root)
+    assert len(scanner._cache) == 5
+    assert scanner.cached_size(root) == sum(range(1, 11))
+
+
+def test_entries_past_the_ttl_are_dropped(tmp_path):
+    root = _tree(tmp_path)
+    scanner = DuScanner(ttl=60)
+    scanner.scan(root)
+    for usage in scanner._cache.values():
+        usage.seen_at -= 120
+    scanner.scan(os.path.join(root, 'a0'))
+    assert root not in scanner._cache
+    assert scanner.cached_size(os.path.join(root, 'a0')) == 1
+
+
+def test_concurrent_starts_run_one_scan(tmp_path):
+    root = _tree(tmp_path)
+    scanner = DuScanner()
+    barrier = threading.Barrier(8)
+    started = []
+
+    def start():
+        barrier.wait()
+        started.append(scanner.start(root))
+    threads = [threading.Thread(target=start) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert started.count(True) == 1
+    deadline = time.time() + 5
+    while scanner.progress(root) is not None and time.time() < deadline:
+        time.sleep(0.01)
+    assert scanner.cached_size(root) == 6
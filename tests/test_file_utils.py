@@ -0,0 +1,72 @@
+import os
+import hashlib
+
+import pytest
+
+from app.utils import io_utils
+from app.utils.file_utils import apply_patch, write_text, file_version, VersionConflict
+
+
+def _version(path):
+    return file_version(os.stat(path))
+
+
+def _sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+@pytest.fixture(params=[True, False], ids=['pread', 'lseek'])
+def pread_mode(request, monkeypatch):
+    # False runs the lseek + read fallback used where os.pread is missing (Windows)
+    monkeypatch.setattr(io_utils, 'HAVE_PREAD', request.param)
+
+
+def test_patch_keeps_crlf_bytes(tmp_path, pread_mode):
+    path = tmp_path / 'crlf.txt'
+    path.write_bytes(b'a\r\nb\r\nc\r\n')
+    version, digest = apply_patch(str(path), _version(path),
+                                  [{'start': 3, 'end': 4, 'old': 'b', 'text': 'B\r\nX'}],
+                                  _sha256(b'a\r\nb\r\nc\r\n'))
+    assert path.read_bytes() == b'a\r\nB\r\nX\r\nc\r\n'
+    assert digest == _sha256(b'a\r\nB\r\nX\r\nc\r\n')
+    assert version == _version(path)
+
+
+def test_patch_rejects_a_slice_that_does_not_match(tmp_path):
+    path = tmp_path / 'a.txt'
+    path.write_bytes(b'\nfirst\n')
+    with pytest.raises(VersionConflict):
+        apply_patch(str(path), _version(path), [{'start': 0, 'end': 5, 'old': 'first', 'text': 'x'}])
+    assert path.read_bytes() == b'\nfirst\n'
+
+
+def test_patch_rejects_a_stale_hash(tmp_path, pread_mode):
+    path = tmp_path / 'a.txt'
+    path.write_bytes(b'one\n')
+    with pytest.raises(VersionConflict):
+        apply_patch(str(path), _version(path), [{'start': 0, 'end': 3, 'old': 'one', 'text': 'two'}],
+                    _sha256(b'other\n'))
+    assert path.read_bytes() == b'one\n'
+
+
+def test_write_follows_symlinks_and_keeps_mode(tmp_path):
+    target = tmp_path / 'real.txt'
+    target.write_bytes(b'one\n')
+    os.chmod(target, 0o640)
+    link = tmp_path / 'link.txt'
+    link.symlink_to(target)
+    write_text(str(link), 'two\n', _version(link))
+    assert link.is_symlink()
+    assert target.read_bytes() == b'two\n'
+    assert os.stat(target).st_mode & 0o777 == 0o640
+
+
+def test_write_keeps_hard_links_shared(tmp_path):
+    first = tmp_path / 'first.txt'
+    first.write_bytes(b'hello\n')
+    second = tmp_path / 'second.txt'
+    os.link(first, second)
+    write_text(str(first), 'bye\n', _version(first))
+    assert second.read_bytes() == b'bye\n'
+    assert os.stat(first).st_nlink == 2
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.tmp')]
@@ -0,0 +1,76 @@
+import os
+import errno
+
+from app.utils import job_queue
+from app.utils.job_queue import Job, JobQueue
+
+
+def _cross_device_rename(monkeypatch):
+    def rename(source, target):
+        raise OSError(errno.EXDEV, 'Invalid cross-device link')
+    monkeypatch.setattr(job_queue.os, 'rename', rename)
+
+
+def _make_tree(root):
+    source = root / 'src'
+    (source / 'sub').mkdir(parents=True)
+    (source / 'a.txt').write_text('a')
+    (source / 'sub' / 'b.txt').write_text('b')
+    dest = root / 'dest'
+    dest.mkdir()
+    return source, dest
+
+
+def test_cross_device_move_deletes_source_after_complete_copy(tmp_path, monkeypatch):
+    source, dest = _make_tree(tmp_path)
+    _cross_device_rename(monkeypatch)
+    job = Job('move', [str(source)], 'admin', dest=str(dest))
+    JobQueue()._run(job)
+
+    assert job.state == 'done'
+    assert job.errors == []
+    assert not source.exists()
+    assert (dest / 'src' / 'sub' / 'b.txt').read_text() == 'b'
+
+
+def test_cross_device_move_keeps_source_when_a_copy_fails(tmp_path, monkeypatch):
+    source, dest = _make_tree(tmp_path)
+    _cross_device_rename(monkeypatch)
+    copy_data = JobQueue._copy_data
+
+    def failing_copy_data(self, job, src, target):
+        if src.endswith('b.txt'):
+            raise OSError(errno.ENOSPC, 'No space left on device')
+        copy_data(self, job, src, target)
+    monkeypatch.setattr(JobQueue, '_copy_data', failing_copy_data)
+
+    job = Job('move', [str(source)], 'admin', dest=str(dest))
+    JobQueue()._run(job)
+
+    assert job.state == 'done'
+    assert [error['error'] for error in job.errors] == ['No space left on device', 'Copy incomplete, source kept']
+    assert (source / 'a.txt').read_text() == 'a'
+    assert (source / 'sub' / 'b.txt').read_text() == 'b'
+
+
+def test_copy_keeps_directory_times_and_modes(tmp_path):
+    source, dest = _make_tree(tmp_path)
+    (source / 'sub' / 'deeper').mkdir()
+    os.chmod(source / 'sub', 0o555)
+    for i, path in enumerate([source / 'sub' / 'deeper', source / 'sub', source]):
+        os.utime(path, (1000000000 + i, 1000000000 + i))
+    try:
+        job = Job('copy', [str(source)], 'admin', dest=str(dest))
+        JobQueue()._run(job)
+    finally:
+        os.chmod(source / 'sub', 0o755)
+
+    assert job.state == 'done'
+    assert job.errors == []
+    copy = dest / 'src'
+    assert os.stat(copy).st_mtime == 1000000002
+    assert os.stat(copy / 'sub').st_mtime == 1000000001
+    assert os.stat(copy / 'sub' / 'deeper').st_mtime == 1000000000
+    assert os.stat(copy / 'sub').st_mode & 0o777 == 0o555
+    assert (copy / 'sub' / 'b.txt').read_text() == 'b'
+    os.chmod(copy / 'sub', 0o755)
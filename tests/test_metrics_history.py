@@ -0,0 +1,66 @@
+import struct
+
+import pytest
+
+from app.utils import metrics_history
+from app.utils.metrics_history import MetricsHistory, RingBuffer
+
+
+@pytest.fixture(autouse=True)
+def leader(monkeypatch):
+    monkeypatch.setattr(metrics_history.leader, 'is_leader', True)
+
+
+def _history(path):
+    history = MetricsHistory(path=str(path), metrics=('cpu_percent', 'ram_percent'))
+    for i in range(5):
+        history.series['cpu_percent'].add(1000 + 2 * i, float(i))
+    return history
+
+
+def test_ring_wraps_and_round_trips():
+    ring = RingBuffer(3, ('value',))
+    for i in range(5):
+        ring.append(i, (i * 10,))
+    assert [ring.row(i) for i in range(ring.count)] == [(2, [20]), (3, [30]), (4, [40])]
+    copy = RingBuffer(3, ('value',))
+    assert copy.load(ring.dump(), 0) == len(ring.dump())
+    assert [copy.row(i) for i in range(copy.count)] == [(2, [20]), (3, [30]), (4, [40])]
+
+
+def test_ring_with_another_capacity_is_skipped():
+    ring = RingBuffer(3, ('value',))
+    ring.append(1, (1,))
+    other = RingBuffer(4, ('value',))
+    assert other.load(ring.dump(), 0) == len(ring.dump())
+    assert other.count == 0
+
+
+@pytest.mark.parametrize('header', [(3, 3, 1), (3, 0, 4)])
+def test_ring_position_outside_the_ring_is_rejected(header):
+    data = RingBuffer(3, ('value',)).dump()
+    with pytest.raises(ValueError):
+        RingBuffer(3, ('value',)).load(struct.pack('<III', *header) + data[12:], 0)
+
+
+def test_history_round_trips(tmp_path):
+    path = tmp_path / 'history.bin'
+    _history(path).save()
+    restored = MetricsHistory(path=str(path), metrics=('cpu_percent', 'ram_percent'))
+    restored.load()
+    raw = restored.series['cpu_percent'].tiers['raw']
+    assert [raw.row(i) for i in range(raw.count)] == [(1000 + 2 * i, [float(i)]) for i in range(5)]
+
+
+@pytest.mark.parametrize('cut', [1, 1000, 100000])
+def test_truncated_file_leaves_an_empty_history(tmp_path, cut):
+    path = tmp_path / 'history.bin'
+    _history(path).save()
+    data = path.read_bytes()
+    path.write_bytes(data[:-cut])
+    restored = MetricsHistory(path=str(path), metrics=('cpu_percent', 'ram_percent'))
+    restored.load()
+    assert all(ring.count == 0 for series in restored.series.values() for ring in series.tiers.values())
+    # Still usable afterwards
+    restored.series['cpu_percent'].add(2000, 1.0)
+    assert restored.query('cpu_percent', 1990, 2010, 1)['points']
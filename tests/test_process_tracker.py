@@ -0,0 +1,79 @@
+import contextlib
+import os
+from collections import namedtuple
+
+import psutil
+import pytest
+
+from app.utils import process_tracker
+from app.utils.process_tracker import ProcessTracker
+
+MemoryInfo = namedtuple('MemoryInfo', 'rss')
+
+
+class FakeProcess:
+    """Stands in for psutil.Process; table maps pid -> (create_time, name, cpu)"""
+    table = {}
+
+    def __init__(self, pid):
+        if pid not in self.table:
+            raise psutil.NoSuchProcess(pid)
+        self.pid = pid
+        self.created, self._name, self.cpu = self.table[pid]
+        self.primed = False
+
+    def create_time(self):
+        return self.created
+
+    def name(self):
+        return self._name
+
+    def cpu_percent(self, interval):
+        if self.table.get(self.pid, (None,))[0] != self.created:
+            raise psutil.NoSuchProcess(self.pid)
+        value, self.primed = (self.cpu if self.primed else 0.0), True
+        return value
+
+    def oneshot(self):
+        return contextlib.nullcontext()
+
+    def memory_info(self):
+        return MemoryInfo(1024)
+
+    def memory_percent(self):
+        return 1.0
+
+
+@pytest.fixture
+def table(monkeypatch):
+    table = {}
+    monkeypatch.setattr(FakeProcess, 'table', table)
+    monkeypatch.setattr(process_tracker.psutil, 'pids', lambda: list(table))
+    monkeypatch.setattr(process_tracker.psutil, 'Process', FakeProcess)
+    return table
+
+
+def test_processes_are_ranked_by_cpu(table):
+    table.update({1: (1.0, 'init', 1.0), 2: (2.0, 'busy', 50.0), 3: (3.0, 'idle', 0.0)})
+    tracker = ProcessTracker(limit=2, sort_key='cpu')
+    tracker.top()
+    assert [(row['pid'], row['name']) for row in tracker.top()] == [(2, 'busy'), (1, 'init')]
+
+
+def test_reused_pid_is_tracked_as_a_new_process(table):
+    table[10] = (1.0, 'old', 80.0)
+    tracker = ProcessTracker(sort_key='cpu')
+    tracker.top()
+    assert tracker.top()[0]['name'] == 'old'
+
+    # The old process exits and a new one gets its pid before the next cycle
+    table[10] = (5.0, 'new', 30.0)
+    rows = tracker.top()
+    assert [(row['pid'], row['name'], row['cpu_percent']) for row in rows] == [(10, 'new', 30.0)]
+    assert list(tracker._tracked) == [(10, 5.0)]
+
+
+def test_real_processes():
+    tracker = ProcessTracker(limit=500, sort_key='rss')
+    tracker.top()
+    assert os.getpid() in [row['pid'] for row in tracker.top()]
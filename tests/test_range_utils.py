@@ -0,0 +1,95 @@
+import os
+import threading
+import http.client
+
+import pytest
+from flask import Flask
+from werkzeug.http import http_date
+from werkzeug.serving import make_server
+
+from app.utils.range_utils import parse_ranges, send_ranged
+
+DATA = bytes(range(256)) * 8192  # 2 MB, more than one chunk
+MTIME = 1700000000
+
+
+@pytest.fixture
+def app(tmp_path):
+    path = tmp_path / 'data.bin'
+    path.write_bytes(DATA)
+    os.utime(path, (MTIME + 0.5, MTIME + 0.5))
+    app = Flask(__name__)
+    app.add_url_rule('/file', 'file', lambda: send_ranged(str(path)))
+    app.config['DATA_PATH'] = str(path)
+    return app
+
+
+def _multipart_parts(body, boundary):
+    parts = body.split(f'--{boundary}'.encode())[1:-1]
+    return [part.split(b'\r\n\r\n', 1)[1][:-2] for part in parts]
+
+
+def test_parse_ranges():
+    assert parse_ranges('bytes=0-9', 100) == [(0, 10)]
+    assert parse_ranges('bytes=-10', 100) == [(90, 100)]
+    assert parse_ranges('bytes=90-', 100) == [(90, 100)]
+    assert parse_ranges('bytes=0-9,5-20,50-59', 100) == [(0, 21), (50, 60)]
+    assert parse_ranges('bytes=200-300', 100) == []
+    assert parse_ranges('bytes=9-0', 100) is None
+    assert parse_ranges('items=0-9', 100) is None
+
+
+def test_single_and_multiple_ranges(app):
+    client = app.test_client()
+    response = client.get('/file', headers={'Range': 'bytes=10-19'})
+    assert response.status_code == 206
+    assert response.data == DATA[10:20]
+    assert response.headers['Content-Range'] == f'bytes 10-19/{len(DATA)}'
+
+    response = client.get('/file', headers={'Range': 'bytes=0-9,2000000-2000009'})
+    assert response.status_code == 206
+    boundary = response.headers['Content-Type'].split('boundary=')[1]
+    assert _multipart_parts(response.data, boundary) == [DATA[0:10], DATA[2000000:2000010]]
+    assert len(response.data) == int(response.headers['Content-Length'])
+
+
+def test_if_range_date_must_equal_last_modified(app):
+    client = app.test_client()
+    response = client.get('/file', headers={'Range': 'bytes=5-9', 'If-Range': http_date(MTIME)})
+    assert response.status_code == 206
+    response = client.get('/file', headers={'Range': 'bytes=5-9', 'If-Range': http_date(MTIME + 60)})
+    assert response.status_code == 200
+    assert response.data == DATA
+
+
+def test_truncated_file_ends_the_body_early(app):
+    with app.test_request_context():
+        response = send_ranged(app.config['DATA_PATH'])
+        chunks = iter(response.response)
+        first = next(chunks)
+        os.truncate(app.config['DATA_PATH'], 1500000)
+        assert len(first) + len(b''.join(chunks)) == 1500000
+
+
+def test_real_server_sends_ranges_with_sendfile(app):
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        def get(headers):
+            conn = http.client.HTTPConnection('127.0.0.1', server.port, timeout=10)
+            conn.request('GET', '/file', headers=headers)
+            response = conn.getresponse()
+            body = response.read()
+            conn.close()
+            return response, body
+
+        response, body = get({})
+        assert response.status == 200 and body == DATA
+        response, body = get({'Range': 'bytes=1000-1999999'})
+        assert response.status == 206 and body == DATA[1000:2000000]
+        response, body = get({'Range': 'bytes=0-9,100-109'})
+        boundary = response.getheader('Content-Type').split('boundary=')[1]
+        assert _multipart_parts(body, boundary) == [DATA[0:10], DATA[100:110]]
+    finally:
+        server.shutdown()
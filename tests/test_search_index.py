@@ -0,0 +1,67 @@
+import pytest
+
+from app.utils.search_index import SearchIndex, _literal_runs
+
+
+def _index(tmp_path, *names):
+    index = SearchIndex()
+    index.root = str(tmp_path)
+    for name in names:
+        (tmp_path / name).write_text('')
+        index._add(name, False)
+    return index
+
+
+def _names(index, query):
+    return sorted(match['name'] for match in index.search(query, regex=True))
+
+
+def test_literals_skip_optional_group():
+    assert _literal_runs(r'report(_old)*\.txt') == ['report', '.txt']
+
+
+def test_literals_of_alternation_are_unknown():
+    assert _literal_runs(r'access|error\.log') == []
+
+
+def test_regex_with_optional_group_matches_without_it(tmp_path):
+    index = _index(tmp_path, 'report.txt', 'report_old.txt', 'summary.txt')
+    assert _names(index, r'report(_old)*\.txt') == ['report.txt', 'report_old.txt']
+    assert _names(index, r'^report(_old)?\.txt$') == ['report.txt', 'report_old.txt']
+
+
+def test_regex_alternation_matches_either_side(tmp_path):
+    index = _index(tmp_path, 'access.log', 'error.log', 'debug.log')
+    assert _names(index, r'access|error') == ['access.log', 'error.log']
+    assert _names(index, r'(access|error)\.log') == ['access.log', 'error.log']
+
+
+def test_literals_of_escapes_are_what_they_match():
+    assert _literal_runs(r'foo\x2ebar') == ['foo.bar']
+    assert _literal_runs(r'x\x61bcd') == ['xabcd']
+    assert _literal_runs(r'\N{LATIN SMALL LETTER A}bcd') == ['abcd']
+    assert _literal_runs(r'\101bcd') == ['Abcd']
+    assert _literal_runs(r'(a)\1xyz') == ['xyz']
+
+
+def test_literals_skip_character_classes():
+    assert _literal_runs(r'[^]]abcd') == ['abcd']
+    assert _literal_runs(r'[]x]abcd') == ['abcd']
+    assert _literal_runs(r'hello[abc]world') == ['hello', 'world']
+
+
+def test_literals_of_repeats():
+    assert _literal_runs(r'abc+def') == ['abc', 'cdef']
+    assert _literal_runs(r'ab{2}cde') == ['abbcde']
+    assert _literal_runs(r'abc?def') == ['def']
+
+
+@pytest.mark.parametrize('query, name', [
+    (r'foo\x2ebar', 'foo.bar'),
+    (r'[^]]abcd', 'xabcd.txt'),
+    (r'x\x61bcd', 'xabcd.txt'),
+    (r'(?x) report \. txt', 'report.txt'),
+])
+def test_regex_with_escapes_finds_the_file(tmp_path, query, name):
+    index = _index(tmp_path, name, 'other.txt')
+    assert _names(index, query) == [name]
@@ -0,0 +1,114 @@
+import os
+import stat
+from datetime import timedelta
+
+import pytest
+from flask import Flask, session
+
+from app.utils.session_utils import MemorySessionInterface, init_sessions, read_only_session
+
+
+def _app(backend, interface=None):
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    app.config['SESSION_PERMANENT'] = True
+    app.permanent_session_lifetime = timedelta(hours=1)
+    if interface is None:
+        init_sessions(app, backend)
+    else:
+        app.session_interface = interface
+
+    @app.route('/login')
+    def login():
+        session['user'] = 'admin'
+        return 'ok'
+
+    @app.route('/page')
+    def page():
+        return session.get('user', '-')
+
+    @app.route('/poll')
+    @read_only_session
+    def poll():
+        return session.get('user', '-')
+
+    @app.route('/logout')
+    def logout():
+        session.pop('user', None)
+        return 'ok'
+    return app
+
+
+@pytest.fixture(params=['cookie', 'memory'])
+def app(request):
+    if request.param == 'memory':
+        return _app(request.param, MemorySessionInterface(snapshot_path=''))
+    return _app(request.param)
+
+
+def _cookie(response):
+    return [header for header in response.headers.getlist('Set-Cookie') if header.startswith('session=')]
+
+
+def test_login_persists_and_logout_clears(app):
+    client = app.test_client()
+    assert _cookie(client.get('/login'))
+    assert client.get('/page').text == 'admin'
+    client.get('/logout')
+    assert client.get('/page').text == '-'
+
+
+def test_read_only_views_do_not_refresh_the_session(app):
+    client = app.test_client()
+    client.get('/login')
+    response = client.get('/poll')
+    assert response.text == 'admin'
+    assert not _cookie(response)
+    # Other views still slide the expiry forward
+    assert _cookie(client.get('/page'))
+
+
+def test_memory_sessions_are_bounded_least_recently_used_first():
+    interface = MemorySessionInterface(max_sessions=2, snapshot_path='')
+    app = _app('memory', interface)
+    clients = [app.test_client() for _ in range(3)]
+    for client in clients:
+        client.get('/login')
+    assert len(interface._sessions) == 2
+    assert [client.get('/page').text for client in clients] == ['-', 'admin', 'admin']
+
+
+def test_expired_memory_session_is_not_opened():
+    interface = MemorySessionInterface(snapshot_path='')
+    app = _app('memory', interface)
+    client = app.test_client()
+    client.get('/login')
+    for entry in interface._sessions.values():
+        entry[1] = 0
+    assert client.get('/page').text == '-'
+
+
+def test_memory_snapshot_survives_a_restart(tmp_path):
+    path = str(tmp_path / 'sessions.json')
+    interface = MemorySessionInterface(snapshot_path=path)
+    client = _app('memory', interface).test_client()
+    client.get('/login')
+    interface.snapshot()
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+
+    restarted = MemorySessionInterface(snapshot_path=path)
+    restarted.load()
+    app = _app('memory', restarted)
+    new_client = app.test_client()
+    new_client.set_cookie('session', next(iter(restarted._sessions)))
+    assert new_client.get('/page').text == 'admin'
+
+
+@pytest.mark.parametrize('contents', ['{not json', '[1]', '{"sid": 1}', '{"sid": ["data"]}',
+                                      '{"sid": ["data", "soon"]}'])
+def test_corrupt_snapshot_is_ignored(tmp_path, contents):
+    path = tmp_path / 'sessions.json'
+    path.write_text(contents)
+    interface = MemorySessionInterface(snapshot_path=str(path))
+    interface.load()
+    assert not interface._sessions
@@ -0,0 +1,12 @@
+from app.routes import system
+
+
+def test_first_viewer_gets_a_snapshot_without_advancing_the_stream(monkeypatch):
+    monkeypatch.setattr(system, '_stream', system.MetricsStream())
+    monkeypatch.setattr(system, 'get_summary_metrics', lambda: {'cpu': 5})
+    assert system._full_message() == {'seq': 0, 'data': {'cpu': 5}}
+    assert system._stream.full() == {'seq': 0, 'data': None}
+
+    # The sampler's first push is still a full message, so viewers at seq 0 stay in sync
+    assert system._stream.push({'cpu': 7}) == {'seq': 1, 'full': True, 'data': {'cpu': 7}}
+    assert system._full_message() == {'seq': 1, 'data': {'cpu': 7}}
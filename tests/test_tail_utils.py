@@ -0,0 +1,56 @@
+import threading
+
+import pytest
+
+from app.utils import io_utils
+from app.utils.tail_utils import TailManager
+
+
+@pytest.fixture(params=[True, False], ids=['pread', 'lseek'])
+def pread_mode(request, monkeypatch):
+    monkeypatch.setattr(io_utils, 'HAVE_PREAD', request.param)
+
+
+@pytest.fixture
+def tails():
+    events = []
+    manager = TailManager()
+    manager.set_emitter(lambda event, data, room: events.append((event, data)))
+    manager.events = events
+    yield manager
+    for path in list(manager._readers):
+        manager._readers.pop(path).stop()
+
+
+def test_init_has_the_last_lines_and_data_follows(tmp_path, tails, pread_mode):
+    path = tmp_path / 'app.log'
+    path.write_text(''.join(f'line {i}\n' for i in range(10)))
+    init = tails.subscribe(str(path), 'sid', lines=3)
+    assert init['lines'] == ['line 7', 'line 8', 'line 9']
+
+    with open(path, 'a') as f:
+        f.write('line 10\n')
+    tails._readers[str(path)].poll()
+    assert tails.events == [('tail_data', {'path': str(path), 'data': 'line 10\n', 'offset': init['offset'] + 8})]
+
+
+def test_init_is_sent_before_data_appended_while_subscribing(tmp_path, tails):
+    path = tmp_path / 'app.log'
+    path.write_text('first\n')
+    sent = []
+
+    def on_init(init):
+        sent.append(('tail_init', init))
+        # Data appended and polled from another thread meanwhile must wait for the init
+        with open(path, 'a') as f:
+            f.write('second\n')
+        poller.start()
+        poller.join(0.2)
+        assert poller.is_alive()
+
+    tails.set_emitter(lambda event, data, room: sent.append((event, data)))
+    poller = threading.Thread(target=lambda: tails._readers[str(path)].poll())
+    tails.subscribe(str(path), 'sid', lines=5, on_init=on_init)
+    poller.join(5)
+    assert [event for event, _ in sent] == ['tail_init', 'tail_data']
+    assert sent[1][1]['data'] == 'second\n'
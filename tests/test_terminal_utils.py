@@ -0,0 +1,133 @@
+import os
+import time
+import socket
+import selectors
+
+import pytest
+
+from app.utils import terminal_utils
+from app.utils.terminal_utils import OutputRing, TerminalSession, TerminalManager, REAP_INTERVAL
+
+
+def test_ring_keeps_the_last_bytes_at_absolute_offsets():
+    ring = OutputRing(capacity=8)
+    ring.append(b'0123456')
+    ring.append(b'789ab')
+    assert (ring.start, ring.end) == (4, 12)
+    assert ring.read(6, 3) == (b'678', 6)
+    # Dropped offsets start at the oldest kept byte
+    assert ring.read(0, 3) == (b'456', 4)
+    assert ring.read(12, 3) == (b'', 12)
+
+
+def test_take_frame_reports_bytes_dropped_before_they_were_sent(monkeypatch):
+    monkeypatch.setattr(terminal_utils, 'FRAME_BYTES', 4)
+    session = TerminalSession('user')
+    session.scrollback = OutputRing(capacity=6)
+    session.scrollback.append(b'abcdefghij')
+    assert session.take_frame() == ('efgh', 4)
+    assert session.sent == 8
+    assert session.frame_started is not None  # 'ij' still pending
+    assert session.take_frame() == ('ij', 0)
+    assert session.frame_started is None
+
+
+def test_rewind_replays_from_offset_without_splitting_utf8():
+    session = TerminalSession('user')
+    session.scrollback.append('abécd'.encode('utf-8'))  # é is two bytes at offsets 2-3
+    session.rewind(3)
+    assert (session.sent, session.acked) == (4, 4)
+    assert session.take_frame() == ('cd', 0)
+    session.rewind(100)
+    assert session.sent == session.scrollback.end
+    session.rewind(0)
+    assert session.take_frame()[0] == 'abécd'
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    monkeypatch.setattr(terminal_utils, 'FRAME_BYTES', 4)
+    monkeypatch.setattr(terminal_utils, 'SEND_WINDOW', 8)
+    events = []
+    manager = TerminalManager()
+    manager.set_emitter(lambda event, data, room: events.append((event, data)))
+    manager.events = events
+    manager._selector = selectors.DefaultSelector()
+    manager._wakeup_r, manager._wakeup_w = socket.socketpair()
+    yield manager
+    manager._selector.close()
+    manager._wakeup_r.close()
+    manager._wakeup_w.close()
+
+
+@pytest.fixture
+def session(manager):
+    # A pipe stands in for the PTY master
+    read_fd, write_fd = os.pipe()
+    session = TerminalSession('user')
+    session.fd = read_fd
+    session.sid = 'sid'
+    manager._sessions[session.id] = session
+    manager._selector.register(read_fd, selectors.EVENT_READ, session)
+    yield session
+    os.close(write_fd)
+    if session.fd is not None:
+        os.close(session.fd)
+
+
+def _offsets(manager):
+    return [data['offset'] for event, data in manager.events if event == 'term_output']
+
+
+def test_output_pauses_at_the_window_and_resumes_on_ack(manager, session):
+    session.scrollback.append(b'x' * 20)
+    session.frame_started = time.time() - 1
+    manager._flush_frames()
+    assert _offsets(manager) == [4, 8]
+    assert session.paused
+    assert session.fd not in manager._selector.get_map()
+    # Paused sessions have nothing due, so the reader thread sleeps instead of spinning
+    assert session.frame_started is None
+    assert manager._next_deadline() == REAP_INTERVAL
+
+    manager.ack(session.id, 'user', 4)
+    assert _offsets(manager) == [4, 8, 12]
+    assert session.paused
+
+    manager.ack(session.id, 'user', 12)
+    assert _offsets(manager) == [4, 8, 12, 16, 20]
+    assert session.paused  # the window is full again
+
+    manager.ack(session.id, 'user', 20)
+    assert not session.paused
+    assert session.fd in manager._selector.get_map()
+    assert session.unacked == 0
+
+
+def test_ack_past_what_was_sent_is_clamped(manager, session):
+    session.scrollback.append(b'abcdef')
+    manager._flush(session)
+    manager.ack(session.id, 'user', 1000)
+    assert session.acked == session.sent == 6
+
+
+def test_detached_output_resumes_when_a_client_reattaches(manager, session):
+    session.scrollback.append(b'x' * 20)
+    manager._flush(session)
+    manager.detach('sid')
+    assert not session.paused
+    assert session.sid is None
+
+    manager.attach(session.id, 'user', 'sid2', offset=16)
+    assert session.frame_started is not None  # the rest is due on the next frame
+    manager.replay(session)
+    assert _offsets(manager)[-1] == 20
+
+
+def test_remove_kills_the_shell_outside_the_manager_lock(manager, session, monkeypatch):
+    held = []
+    monkeypatch.setattr(TerminalSession, 'kill',
+                        lambda self: held.append(manager._lock._is_owned()))
+    manager._remove(session)
+    assert held == [False]
+    assert session.id not in manager._sessions
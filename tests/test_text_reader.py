@@ -0,0 +1,51 @@
+import os
+
+import pytest
+
+from app.utils import io_utils
+from app.utils.text_reader import FileView, read_window
+
+
+@pytest.fixture(params=[True, False], ids=['pread', 'lseek'])
+def pread_mode(request, monkeypatch):
+    monkeypatch.setattr(io_utils, 'HAVE_PREAD', request.param)
+
+
+@pytest.fixture
+def log(tmp_path):
+    path = tmp_path / 'app.log'
+    # Lines of varying length so they straddle the 64 KB index blocks
+    lines = [f"line {i} " + 'x' * (i % 300) for i in range(5000)]
+    path.write_text('\n'.join(lines) + '\n')
+    return str(path), lines
+
+
+def test_window_by_line_number(log, pread_mode):
+    path, lines = log
+    window = read_window(path, start=4000, count=3, with_total=True)
+    assert window['lines'] == lines[4000:4003]
+    assert window['start_line'] == 4000
+    assert window['total_lines'] == len(lines)
+
+
+def test_window_from_the_end(log, pread_mode):
+    path, lines = log
+    window = read_window(path, tail=2)
+    assert window['lines'] == lines[-2:]
+    assert window['eof']
+
+
+def test_window_at_byte_offset_starts_at_the_line(log, pread_mode):
+    path, lines = log
+    window = read_window(path, offset=os.path.getsize(path) // 2, count=1)
+    assert window['lines'][0] == lines[window['start_line']]
+
+
+def test_view_of_a_truncated_file_reads_short(log, pread_mode):
+    path, _ = log
+    with open(path, 'rb') as f:
+        view = FileView(f.fileno(), os.fstat(f.fileno()).st_size)
+        os.truncate(path, 1000)
+        assert view[500000:500010] == b''
+        assert view.find(b'\n', 200000) == -1
+        assert 0 <= view.rfind(b'\n') < 1000
@@ -0,0 +1,77 @@
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from app.utils import thumbnail_utils
+from app.utils.thumbnail_utils import ThumbnailCache
+
+
+class FakePool:
+    """Executor whose futures end with a preset result or exception"""
+
+    def __init__(self, outcome):
+        self.outcome = outcome
+        self.is_shutdown = False
+
+    def submit(self, fn, path, tmp, size):
+        future = Future()
+        if isinstance(self.outcome, BaseException):
+            future.set_exception(self.outcome)
+        else:
+            with open(tmp, 'wb') as f:
+                f.write(b'thumbnail')
+            future.set_result(self.outcome)
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.is_shutdown = True
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(thumbnail_utils, 'Image', object())  # Pillow itself isn't needed
+    image = tmp_path / 'a.png'
+    image.write_bytes(b'not really a png')
+    cache = ThumbnailCache(directory=str(tmp_path / 'thumbs'))
+    cache.image = str(image)
+    return cache
+
+
+def _use_pools(cache, *pools):
+    pools = list(pools)
+
+    def get_pool():
+        if cache._pool is None:
+            cache._pool = pools.pop(0)
+        return cache._pool
+    cache._get_pool = get_pool
+
+
+def test_broken_pool_is_replaced(cache):
+    broken, fresh = FakePool(BrokenProcessPool('worker died')), FakePool('png')
+    _use_pools(cache, broken, fresh)
+    path, mimetype = cache.get(cache.image)
+    assert path.endswith('.png')
+    assert broken.is_shutdown
+    assert cache._pool is fresh
+
+
+def test_image_that_keeps_crashing_workers_is_unsupported(cache):
+    _use_pools(cache, FakePool(BrokenProcessPool()), FakePool(BrokenProcessPool()))
+    with pytest.raises(ValueError):
+        cache.get(cache.image)
+    assert cache._pool is None  # the next render starts a new pool
+
+
+def test_slow_render_is_a_timeout_not_an_unreadable_image(cache):
+    _use_pools(cache, FakePool(TimeoutError()))
+    with pytest.raises(TimeoutError):
+        cache.get(cache.image)
+
+
+def test_decompression_bomb_is_an_unreadable_image(cache):
+    pil_image = pytest.importorskip('PIL.Image')
+    _use_pools(cache, FakePool(pil_image.DecompressionBombError('too many pixels')))
+    with pytest.raises(ValueError):
+        cache.get(cache.image)
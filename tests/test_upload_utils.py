@@ -0,0 +1,104 @@
+import io
+import os
+import json
+import threading
+
+import pytest
+
+from app.utils import io_utils, upload_utils
+from app.utils.upload_utils import UploadRegistry, UploadError, UPLOAD_TTL
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    monkeypatch.setattr(upload_utils, 'UPLOAD_STATE_DIR', str(tmp_path / 'state'))
+    return UploadRegistry()
+
+
+class BlockingStream:
+    """Hands out its data only once released"""
+
+    def __init__(self, data):
+        self.data = io.BytesIO(data)
+        self.reading = threading.Event()
+        self.release = threading.Event()
+
+    def read(self, size):
+        self.reading.set()
+        self.release.wait(5)
+        return self.data.read(size)
+
+
+@pytest.mark.parametrize('have_pread', [True, False], ids=['pwrite', 'lseek'])
+def test_chunks_complete_the_file(tmp_path, registry, monkeypatch, have_pread):
+    monkeypatch.setattr(io_utils, 'HAVE_PREAD', have_pread)
+    upload = registry.create(str(tmp_path), 'a.bin', 10)
+    upload.write_chunk(5, io.BytesIO(b'56789'), 5)
+    upload.write_chunk(0, io.BytesIO(b'01234'), 5)
+    with open(upload.finalize(), 'rb') as f:
+        assert f.read() == b'0123456789'
+    with pytest.raises(UploadError):
+        upload.write_chunk(0, io.BytesIO(b'x'), 1)
+
+
+def test_abort_waits_for_a_chunk_being_written(tmp_path, registry):
+    upload = registry.create(str(tmp_path), 'a.bin', 4)
+    stream = BlockingStream(b'abcd')
+    errors = []
+
+    def write():
+        try:
+            upload.write_chunk(0, stream, 4)
+        except Exception as e:
+            errors.append(e)
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    assert stream.reading.wait(5)
+    aborter = threading.Thread(target=upload.abort)
+    aborter.start()
+    aborter.join(0.2)
+    assert aborter.is_alive()  # the fd is still in use
+
+    stream.release.set()
+    writer.join(5)
+    aborter.join(5)
+    assert errors == []
+    assert not os.path.exists(upload.part_path)
+
+
+def test_expiry_counts_from_the_last_chunk(tmp_path, registry):
+    upload = registry.create(str(tmp_path), 'a.bin', 10)
+    upload.created -= 2 * UPLOAD_TTL
+    upload.write_chunk(0, io.BytesIO(b'01234'), 5)
+    registry.expire()
+    assert registry.get(upload.id) is upload
+
+    upload.updated -= UPLOAD_TTL + 1
+    registry.expire()
+    assert not os.path.exists(upload.part_path)
+    with pytest.raises(UploadError):
+        registry.get(upload.id)
+
+
+def test_expire_sweeps_uploads_only_on_disk(tmp_path, registry):
+    old = registry.create(str(tmp_path), 'old.bin', 10)
+    fresh = registry.create(str(tmp_path), 'fresh.bin', 10)
+    with open(old._state_path) as f:
+        state = json.load(f)
+    state['updated'] = state['created'] = state['created'] - UPLOAD_TTL - 1
+    with open(old._state_path, 'w') as f:
+        json.dump(state, f)
+    corrupt = os.path.join(upload_utils.UPLOAD_STATE_DIR, 'corrupt.json')
+    with open(corrupt, 'w') as f:
+        f.write('{')
+    os.utime(corrupt, (0, 0))
+    for upload in (old, fresh):
+        upload.close()
+
+    # A new process: nothing is loaded, only the state directory is left
+    restarted = UploadRegistry()
+    restarted.expire()
+    assert not os.path.exists(old.part_path) and not os.path.exists(old._state_path)
+    assert not os.path.exists(corrupt)
+    assert restarted.get(fresh.id).status()['missing'] == [[0, 10]]